@@ -0,0 +1,149 @@
+import os
+import sys
+import time
+import argparse
+
+from touch_protocol import GestureRecording, TouchDatagramEncoder
+
+# 触摸板: 名称 -> 模块
+PADS = {
+    'mai2': 'mai2touch_pad',
+    'mai': 'maitouch_pad',
+}
+
+class EncodeOnlyClient:
+    """只编码数据报、不发送，测量触摸板自身的处理能力"""
+
+    def __init__(self):
+        self.encoder = TouchDatagramEncoder()
+
+    def send_touch_data(self, touched_points):
+        self.encoder.encode(touched_points)
+
+    def close(self):
+        pass
+
+class CountingClient:
+    """统计发送的帧数"""
+
+    def __init__(self, client):
+        self.client = client
+        self.frames = 0
+
+    def send_touch_data(self, touched_points):
+        self.client.send_touch_data(touched_points)
+        self.frames += 1
+
+    def close(self):
+        self.client.close()
+
+def percentile(sorted_values, p):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(p / 100 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+def replay(widget, recording, speed, repeat, app):
+    """
+    将手势记录逐个事件输入触摸板控件，经过与实际触摸相同的命中检测、显示更新和发送
+
+    参数:
+        speed: 回放倍速，0为不等待、尽快回放
+    返回: (每个事件的处理耗时列表（秒）, 总耗时)
+    """
+    costs = []
+    duration = recording.times[-1] - recording.times[0]
+    first = recording.times[0]
+    begin = time.perf_counter()
+    for round_index in range(repeat):
+        round_start = begin + round_index * duration / speed if speed else 0
+        for timestamp, touch_id, kind, x, y, width, height in recording.events():
+            if speed:
+                # 按绝对时间点回放，等待期间处理事件循环，合并发送的定时器照常触发
+                deadline = round_start + (timestamp - first) / speed
+                while True:
+                    remaining = deadline - time.perf_counter()
+                    if remaining <= 0:
+                        break
+                    time.sleep(min(remaining, 0.001))
+                    app.processEvents()
+            t = time.perf_counter()
+            widget.replay_event(kind, touch_id, x, y, width, height)
+            widget.update_touch_display()
+            costs.append(time.perf_counter() - t)
+        # 每轮结束后松开残留的触摸点，下一轮从相同状态开始
+        for touch_id in list(widget.touch_point_map):
+            widget.remove_touch(touch_id)
+        widget.update_touch_display()
+    app.processEvents()
+    return costs, time.perf_counter() - begin
+
+def main():
+    parser = argparse.ArgumentParser(description='无头回放触摸板的手势记录，统计事件处理速度和每个事件的耗时')
+    parser.add_argument('recording', help='手势记录文件（触摸板"录制手势"生成）')
+    parser.add_argument('--pad', choices=list(PADS), default='mai2',
+                        help='使用的触摸板（默认：mai2）')
+    parser.add_argument('-s', '--size', type=int, default=600,
+                        help='画布尺寸（默认：600）')
+    parser.add_argument('-x', '--speed', type=float, default=0,
+                        help='回放倍速，1为按记录的时间回放，0为尽快回放（默认：0）')
+    parser.add_argument('-n', '--repeat', type=int, default=1,
+                        help='重复回放次数（默认：1）')
+    parser.add_argument('--host', default='localhost',
+                        help='数据报发送地址（默认：localhost）')
+    parser.add_argument('-p', '--port', type=int, default=8888,
+                        help='数据报发送端口（默认：8888）')
+    parser.add_argument('--no-send', action='store_true',
+                        help='只编码数据报，不发送')
+    parser.add_argument('--serial', default=None,
+                        help='同时通过该串口发送（不等待STAT，直接激活）')
+    parser.add_argument('--rate', type=float, default=None,
+                        help='最高发送频率Hz（默认：按倍速回放时与触摸板相同，尽快回放时不限制）')
+    args = parser.parse_args()
+
+    try:
+        recording = GestureRecording.load(args.recording)
+    except (OSError, ValueError) as e:
+        print(f"无法读取记录: {e}")
+        return 1
+    if not len(recording):
+        print("记录为空")
+        return 1
+
+    os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+    from PyQt6.QtWidgets import QApplication
+    import importlib
+    app = QApplication.instance() or QApplication(sys.argv[:1])
+    pad = importlib.import_module(PADS[args.pad])
+
+    client = CountingClient(EncodeOnlyClient() if args.no_send else pad.TouchSocketClient(args.host, args.port))
+    bridge = None
+    if args.serial:
+        bridge = pad.SerialBridge(port=args.serial)
+        if not bridge.start():
+            return 1
+        bridge.active = True
+    widget = pad.TouchWidget(size_factor=args.size / 600, socket_client=client,
+                             socket_enabled=True, serial_bridge=bridge)
+    # 尽快回放时不经过事件循环，合并发送的定时器不会触发，因此默认不限制发送频率
+    if args.rate is not None:
+        widget.max_send_rate = args.rate
+    elif not args.speed:
+        widget.max_send_rate = float('inf')
+    widget.keepalive_timer.stop()
+
+    costs, elapsed = replay(widget, recording, args.speed, args.repeat, app)
+    client.close()
+    if bridge is not None:
+        bridge.stop()
+
+    costs_us = sorted(cost * 1e6 for cost in costs)
+    duration = recording.times[-1] - recording.times[0]
+    print(f"回放完成: {len(costs)} 个事件 (记录 {len(recording)} 个 x {args.repeat} 次, 时长 {duration:.1f}s), "
+          f"耗时 {elapsed:.2f}s, {len(costs) / elapsed if elapsed > 0 else 0:.0f} 事件/秒, 发送 {client.frames} 帧")
+    print(f"每事件处理耗时(us): 平均={sum(costs_us) / len(costs_us):.1f} p50={percentile(costs_us, 50):.1f} "
+          f"p90={percentile(costs_us, 90):.1f} p99={percentile(costs_us, 99):.1f} max={costs_us[-1]:.1f}")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
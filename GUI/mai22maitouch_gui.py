@@ -1,244 +1,316 @@
 import sys
+import math
 import time
 import socket
-import threading
-from collections import deque
+import argparse
+from array import array
 from PyQt6.QtWidgets import (QWidget, QApplication, QHBoxLayout, QVBoxLayout, 
-                             QComboBox, QPushButton, QLabel, QSizePolicy)
-from PyQt6.QtGui import QPainter, QColor, QFont, QPalette, QKeyEvent
-from PyQt6.QtCore import QTimer, Qt, QRectF
-from PyQt6.QtSvg import QSvgRenderer
+                             QComboBox, QPushButton, QLabel, QSlider,
+                             QFileDialog, QMessageBox, QGridLayout, QCheckBox)
+from PyQt6.QtGui import QPainter, QColor, QFont
+from PyQt6.QtCore import QTimer, Qt, QPointF, QEvent, QSocketNotifier
+from touch_sprites import (SpriteTouchWidget, MAI2_TOUCH_POINTS, MAI_TOUCH_POINTS,
+                           MAI2_SPRITE_SCALE, MAI_SPRITE_SCALE)
+from touch_protocol import (TouchHistory, TouchStreamStats, pack_zones, unpack_zones,
+                            decode_stats_request, encode_stats_reply)
+
+# 时间轴可回看的时长（分钟）
+TIMELINE_MINUTES = 5
+
+# 多机台网格模式下每个画布的初始尺寸
+GRID_CANVAS_SIZE = 300
+
+def format_stats(report):
+    """将TouchStreamStats.take_report()的结果格式化为显示文本，没有收到带序号的数据时返回空字符串"""
+    if report['received'] == 0:
+        return ""
+    text = f"丢包 {report['loss_rate'] * 100:.1f}%"
+    if report['recovered']:
+        text += f" (补回 {report['recovered']})"
+    text += f"  延迟 {report['latency_avg_ms']:.2f}/{report['latency_max_ms']:.2f}ms"
+    return text
+
+def screen_frame_interval(widget):
+    """按控件所在屏幕的刷新率计算一帧的时长（秒），无法获取时按60Hz"""
+    screen = widget.screen()
+    refresh_rate = screen.refreshRate() if screen else 0
+    return 1.0 / (refresh_rate if refresh_rate > 0 else 60)
 
 class TouchSocketServer:
-    def __init__(self, host='localhost', port=8888):
+    def __init__(self, host='localhost', port=8888, history_capacity=1 << 18):
         self.host = host
         self.port = port
         self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
         self.socket.bind((host, port))
-        self.touch_data_queue = deque()
+        # 由Qt事件循环通知可读，每次唤醒把缓冲区中的数据报全部读完
+        self.socket.setblocking(False)
+        # 定长的状态变化历史，供时间轴回看
+        self.history = TouchHistory(history_capacity)
+        # 带序号数据报的丢包和延迟统计
+        self.stats = TouchStreamStats()
         self.running = True
         self.current_touched_points = []  # 保存当前触摸状态
-        
-    def start_server(self):
-        """启动socket服务器线程"""
-        self.thread = threading.Thread(target=self._receive_data)
-        self.thread.daemon = True
-        self.thread.start()
+        # 上次取走显示状态以来出现过的所有触摸区域，保证一帧内按下又松开的短触也能显示出来
+        self.pending_points = set()
+        # 本帧第一个未显示状态的到达时间和最近一次收到数据的时间，用于性能统计
+        self.pending_since = None
+        self.last_receive_time = None
+        self.notifier = None
+        self.on_data = None
+        
+    def start_server(self, on_data=None):
+        """
+        将socket接入Qt事件循环
+        
+        参数:
+            on_data: 每次读完一批数据报后调用的回调
+        """
+        self.on_data = on_data
+        self.notifier = QSocketNotifier(self.socket.fileno(), QSocketNotifier.Type.Read)
+        self.notifier.activated.connect(self._receive_data)
+        print(f"Touch socket server listening on {self.host}:{self.port}")
         
     def _receive_data(self):
-        """接收数据线程"""
-        print(f"Touch socket server listening on {self.host}:{self.port}")
+        """socket可读时读取所有待处理的数据报"""
+        received = False
         while self.running:
             try:
                 data, addr = self.socket.recvfrom(1024)
-                self._process_data(data)
-            except Exception as e:
-                if self.running:  # 只在运行状态下打印错误
-                    print(f"Socket error: {e}")
+            except BlockingIOError:
+                break
+            except OSError as e:
+                print(f"Socket error: {e}")
+                break
+            self._process_data(data, addr)
+            received = True
+        if received:
+            self.last_receive_time = time.monotonic()
+            if self.on_data:
+                self.on_data()
                 
-    def _process_data(self, data):
+    def _process_data(self, data, addr=None):
         """处理接收到的二进制数据"""
-        touched_points = list(data)  # 直接将字节转换为整数列表
-        
+        # 压力测试的统计查询，回复累计统计
+        token = decode_stats_request(data)
+        if token is not None:
+            try:
+                self.socket.sendto(encode_stats_reply(token, self.stats.totals()), addr)
+            except OSError as e:
+                print(f"Socket error: {e}")
+            return
+        states = self.stats.accept(addr, data, time.monotonic_ns())
+        if states is None:
+            # 旧格式：每个字节是一个区域ID
+            self._apply_state(list(data))
+        else:
+            # 包括由冗余状态补回的丢失状态，过期的数据报不会产生状态
+            for mask in states:
+                self._apply_state(unpack_zones(mask))
+
+    def _apply_state(self, touched_points):
+        """应用一个触摸状态"""
         # 更新当前状态
+        now = time.monotonic()
         self.current_touched_points = touched_points
+        self.pending_points.update(touched_points)
+        if self.pending_since is None:
+            self.pending_since = now
         
-        # 将数据放入队列（如果需要历史数据可以保留，否则直接使用current_touched_points）
-        self.touch_data_queue.append(touched_points)
+        # 记录到历史，只保存状态变化
+        self.history.append(now, pack_zones(touched_points))
         
     def get_latest_data(self):
         """获取最新的触摸数据"""
         # 直接返回当前状态，不需要队列处理
         return self.current_touched_points
+
+    def take_frame_points(self):
+        """
+        取走下一帧要显示的触摸状态
+        
+        返回: (触摸区域集合, 是否已是当前状态)
+        两帧之间按下过的区域都会包含在内；若其中有已松开的区域，
+        第二个返回值为False，需要再显示一帧当前状态
+        """
+        frame_points = self.pending_points
+        current = set(self.current_touched_points)
+        self.pending_points = set(current)
+        self.pending_since = None
+        return frame_points, frame_points == current
         
     def stop_server(self):
         """停止服务器"""
+        if not self.running:
+            return
         self.running = False
+        if self.notifier is not None:
+            self.notifier.setEnabled(False)
         self.socket.close()
         
-class TouchWidget(QWidget):
-    def __init__(self, parent=None, points_data=None, svg_prefix="", size_factor=1.0):
+class RollingStats:
+    """
+    最近capacity个样本（秒）的滚动统计
+
+    样本存放在定长环形数组中，同时维护一个按对数分桶的直方图：加入新样本时
+    淘汰最旧的样本并更新对应的桶，每次更新都是O(1)；百分位数从固定数量的桶中读取
+    """
+    BUCKETS_PER_OCTAVE = 8
+    # 以微秒计，覆盖1us ~ 2^24us(约16秒)
+    BUCKET_COUNT = BUCKETS_PER_OCTAVE * 24 + 1
+
+    def __init__(self, capacity=512):
+        self.capacity = capacity
+        self.samples = array('d', bytes(8 * capacity))
+        self.sample_buckets = array('H', bytes(2 * capacity))
+        self.histogram = array('I', bytes(4 * self.BUCKET_COUNT))
+        self.count = 0
+        self.next = 0
+
+    def _bucket(self, value):
+        us = value * 1e6
+        if us < 1:
+            return 0
+        return min(self.BUCKET_COUNT - 1, int(math.log2(us) * self.BUCKETS_PER_OCTAVE) + 1)
+
+    def add(self, value):
+        if self.count == self.capacity:
+            self.histogram[self.sample_buckets[self.next]] -= 1
+        else:
+            self.count += 1
+        bucket = self._bucket(value)
+        self.samples[self.next] = value
+        self.sample_buckets[self.next] = bucket
+        self.histogram[bucket] += 1
+        self.next = (self.next + 1) % self.capacity
+
+    def percentile(self, p):
+        """返回第p百分位数所在桶的上界（秒），没有样本时返回None"""
+        if not self.count:
+            return None
+        target = max(1, math.ceil(p / 100 * self.count))
+        cumulative = 0
+        for bucket, n in enumerate(self.histogram):
+            cumulative += n
+            if cumulative >= target:
+                return 2 ** (bucket / self.BUCKETS_PER_OCTAVE) / 1e6
+        return None
+
+    def recent(self, n):
+        """按时间顺序返回最近n个样本"""
+        n = min(n, self.count)
+        start = (self.next - n) % self.capacity
+        if start + n <= self.capacity:
+            return self.samples[start:start + n]
+        return self.samples[start:] + self.samples[:start + n - self.capacity]
+
+class PerfOverlay(QWidget):
+    """监视器的性能浮层：重绘帧率、最新数据的时长、数据到绘制的延迟百分位和延迟走势"""
+    SPARKLINE_SAMPLES = 120
+
+    def __init__(self, window, parent=None):
         super().__init__(parent)
-        self.size_factor = size_factor
-        self.touch_points = points_data or {
-            1: (404, 73, 'A1'),
-            2: (528, 193, 'A2'),
-            3: (528, 404, 'A3'),
-            4: (403, 526, 'A4'),
-            5: (197, 528, 'A5'),
-            6: (72, 404, 'A6'),
-            7: (72, 193, 'A7'),
-            8: (197, 73, 'A8'),
-            11: (347, 184, 'B1'),
-            12: (418, 254, 'B2'),
-            13: (418, 346, 'B3'),
-            14: (347, 417, 'B4'),
-            15: (254, 417, 'B5'),
-            16: (186, 346, 'B6'),
-            17: (186, 254, 'B7'),
-            18: (254, 184, 'B8'),
-            21: (330, 300, 'C1'),
-            22: (271, 300, 'C2'),
-            31: (300, 50, 'D1'),
-            32: (481, 119, 'D2'),
-            33: (550, 300, 'D3'),
-            34: (477, 477, 'D4'),
-            35: (300, 550, 'D5'),
-            36: (118, 482, 'D6'),
-            37: (50, 300, 'D7'),
-            38: (123, 123, 'D8'),
-            41: (300, 130, 'E1'),
-            42: (421, 178, 'E2'),
-            43: (471, 300, 'E3'),
-            44: (421, 421, 'E4'),
-            45: (300, 471, 'E5'),
-            46: (178, 421, 'E6'),
-            47: (129, 300, 'E7'),
-            48: (179, 179, 'E8')
-        }
-        
-        # 应用尺寸因子并取整
-        self.touch_points = {k: (round(v[0]*size_factor), round(v[1]*size_factor), v[2]) 
-                           for k, v in self.touch_points.items()}
-        
-        self.svg_prefix = svg_prefix
-        self.default_svgs = {point: QSvgRenderer(f"{self.svg_prefix}touch/{label}.svg") for point, (x, y, label) in self.touch_points.items()}
-        self.touch_svgs = {point: QSvgRenderer(f"{self.svg_prefix}touch/{label}_touch.svg") for point, (x, y, label) in self.touch_points.items()}
-        self.current_svgs = self.default_svgs.copy()
+        self.main_window = window
+        self.setFixedSize(230, 96)
+        self.setAttribute(Qt.WidgetAttribute.WA_TransparentForMouseEvents)
+        self.overlay_font = QFont("Consolas", 9)
+        self.overlay_font.setStyleHint(QFont.StyleHint.Monospace)
+        self.fps = 0.0
+        self.last_frames = 0
+        self.last_time = time.monotonic()
+
+    def refresh(self):
+        """按定时器刷新，帧率按两次刷新之间的重绘次数计算"""
+        now = time.monotonic()
+        frames = self.main_window.painted_frames
+        if now > self.last_time:
+            self.fps = (frames - self.last_frames) / (now - self.last_time)
+        self.last_frames = frames
+        self.last_time = now
+        self.update()
 
     def paintEvent(self, event):
         painter = QPainter(self)
-        painter.setRenderHint(QPainter.RenderHint.Antialiasing)
-        
-        palette = self.palette()
-        painter.fillRect(self.rect(), palette.window())
-        
-        # 字体大小取整
-        font_size = max(8, round(12 * self.size_factor))
-        font = QFont("SEGA-Humming v2 B", font_size)
-        painter.setFont(font)
-        
-        for point, (center_x, center_y, label) in self.touch_points.items():
-            # 缩放因子取整处理
-            scale_factor = round(0.3 * self.size_factor * 100) / 100  # 保留两位小数
-            
-            renderer = self.current_svgs[point]
-            rect = renderer.viewBoxF()
-            # 尺寸取整
-            scaled_width = round(rect.width() * scale_factor)
-            scaled_height = round(rect.height() * scale_factor)
-            
-            # 位置取整
-            top_left_x = round(center_x - scaled_width / 2)
-            top_left_y = round(center_y - scaled_height / 2)
-            
-            painter.save()
-            painter.translate(top_left_x, top_left_y)
-            renderer.render(painter, QRectF(0, 0, scaled_width, scaled_height))
-            painter.restore()
-        
-        painter.setPen(QColor(255,255,255))
-        
-        for point, (center_x, center_y, label) in self.touch_points.items():
-            # 文本位置取整
-            text_x = round(center_x - 10 * self.size_factor)
-            text_y = round(center_y + 5 * self.size_factor)
-            painter.drawText(text_x, text_y, label)
-
-class TouchWidget_mai(QWidget):
+        painter.fillRect(self.rect(), QColor(0, 0, 0, 180))
+        painter.setFont(self.overlay_font)
+        painter.setPen(QColor(255, 255, 255))
+        
+        stats = self.main_window.paint_latency
+        received = self.main_window.socket_server.last_receive_time
+        age = f"{(time.monotonic() - received) * 1000:.0f}ms" if received is not None else "-"
+        lines = [f"重绘 {self.fps:5.1f} FPS   数据 {age}"]
+        if stats.count:
+            p50, p95, p99 = (stats.percentile(p) * 1000 for p in (50, 95, 99))
+            lines.append(f"延迟 p50 {p50:.2f} p95 {p95:.2f}")
+            lines.append(f"     p99 {p99:.2f} ms (n={stats.count})")
+        else:
+            lines.append("延迟 -")
+        for i, line in enumerate(lines):
+            painter.drawText(6, 14 + i * 14, line)
+        
+        # 最近的延迟走势，纵轴按p99与一帧时长中的较大者缩放
+        samples = stats.recent(self.SPARKLINE_SAMPLES)
+        if len(samples) > 1:
+            top, bottom = 58, self.height() - 4
+            scale = max(stats.percentile(99), self.main_window.frame_interval)
+            step = (self.width() - 12) / (self.SPARKLINE_SAMPLES - 1)
+            points = [QPointF(6 + i * step, bottom - min(1.0, value / scale) * (bottom - top))
+                      for i, value in enumerate(samples)]
+            painter.setPen(QColor(90, 90, 90))
+            frame_y = bottom - min(1.0, self.main_window.frame_interval / scale) * (bottom - top)
+            painter.drawLine(QPointF(6, frame_y), QPointF(self.width() - 6, frame_y))
+            painter.setPen(QColor(80, 220, 120))
+            painter.drawPolyline(points)
+        painter.end()
+
+class TouchWidget(SpriteTouchWidget):
+    sprite_scale = MAI2_SPRITE_SCALE
+
     def __init__(self, parent=None, points_data=None, svg_prefix="", size_factor=1.0):
-        super().__init__(parent)
-        self.size_factor = size_factor
-        self.touch_points = points_data or {
-            1: (407, 74, 'A1', -20, 10),
-            2: (525, 191, 'A2', -10, 20),
-            3: (525, 409, 'A3', -10, -15),
-            4: (407, 526, 'A4', -20, -5),
-            5: (193, 526, 'A5', 15, -5),
-            6: (75, 409, 'A6', 5, -15),
-            7: (75, 191, 'A7', 5, 20),
-            8: (193, 74, 'A8', 15, 10),
-            11: (350, 188, 'B1', -5, 0),
-            12: (412, 249, 'B2', 0, 5),
-            13: (412, 351, 'B3', 0, 0),
-            14: (350, 412, 'B4', -5, 5),
-            15: (250, 412, 'B5', 0, 5),
-            16: (188, 351, 'B6', -5, 0),
-            17: (188, 251, 'B7', -5, 5),
-            18: (250, 188, 'B8', 0, 0),
-            21: (300, 300, 'C', 2, 5)
-        }
-        
-        # 应用尺寸因子并取整
-        self.touch_points = {k: (
-            round(v[0]*size_factor), 
-            round(v[1]*size_factor), 
-            v[2], 
-            round(v[3]*size_factor), 
-            round(v[4]*size_factor)
-        ) for k, v in self.touch_points.items()}
-        
-        self.svg_prefix = svg_prefix
-        self.default_svgs = {point: QSvgRenderer(f"{self.svg_prefix}touch/mai_{label}.svg") for point, (x, y, label, prefix_x, prefix_y) in self.touch_points.items()}
-        self.touch_svgs = {point: QSvgRenderer(f"{self.svg_prefix}touch/mai_{label}_touch.svg") for point, (x, y, label, prefix_x, prefix_y) in self.touch_points.items()}
-        self.current_svgs = self.default_svgs.copy()
+        super().__init__(parent, svg_prefix, size_factor)
+        # 区域表基于600x600画布，按尺寸因子缩放后的坐标在布局中生成
+        self.base_points = points_data or MAI2_TOUCH_POINTS
+        
+        self.load_sprites()
 
-    def paintEvent(self, event):
-        painter = QPainter(self)
-        painter.setRenderHint(QPainter.RenderHint.Antialiasing)
-        
-        palette = self.palette()
-        painter.fillRect(self.rect(), palette.window())
-        
-        # 字体大小取整
-        font_size = max(8, round(12 * self.size_factor))
-        font = QFont("SEGA-Humming v2 B", font_size)
-        painter.setFont(font)
-        
-        for point, (center_x, center_y, label, prefix_x, prefix_y) in self.touch_points.items():
-            # 缩放因子取整处理
-            scale_factor = round(0.85 * self.size_factor * 100) / 100  # 保留两位小数
-            
-            renderer = self.current_svgs[point]
-            rect = renderer.viewBoxF()
-            # 尺寸取整
-            scaled_width = round(rect.width() * scale_factor)
-            scaled_height = round(rect.height() * scale_factor)
-            
-            # 位置取整
-            top_left_x = round(center_x - scaled_width / 2)
-            top_left_y = round(center_y - scaled_height / 2)
-            
-            painter.save()
-            painter.translate(top_left_x, top_left_y)
-            renderer.render(painter, QRectF(0, 0, scaled_width, scaled_height))
-            painter.restore()
-        
-        painter.setPen(QColor(255,255,255))
-        
-        for point, (center_x, center_y, label, prefix_x, prefix_y) in self.touch_points.items():
-            # 文本位置取整
-            text_x = round(center_x - 10 * self.size_factor + prefix_x)
-            text_y = round(center_y + prefix_y)
-            painter.drawText(text_x, text_y, label)
+class TouchWidget_mai(SpriteTouchWidget):
+    sprite_scale = MAI_SPRITE_SCALE
+    svg_name_prefix = "mai_"
+
+    def __init__(self, parent=None, points_data=None, svg_prefix="", size_factor=1.0):
+        super().__init__(parent, svg_prefix, size_factor)
+        # 区域表基于600x600画布，按尺寸因子缩放后的坐标在布局中生成
+        self.base_points = points_data or MAI_TOUCH_POINTS
+        
+        self.load_sprites()
+
+    def label_position(self, point):
+        # 文本位置取整
+        center_x, center_y, label, prefix_x, prefix_y = self.touch_points[point]
+        return round(center_x - 10 * self.size_factor + prefix_x), round(center_y + prefix_y)
+
+    def zone_touched(self, point, touched_points):
+        # 旧框只有一个C区，C1/C2任一触摸都显示为C
+        if point == 21:
+            return 21 in touched_points or 22 in touched_points
+        return point in touched_points
 
 class MainWindow(QWidget):
-    def __init__(self):
+    # 基础尺寸（默认尺寸）
+    base_window_width = 1280
+    base_window_height = 680
+    base_canvas_size = 600
+    
+    # 尺寸选项 - 现在基于基础尺寸进行缩放
+    size_options = {
+        "1280x680 (默认)": {"window": (base_window_width, base_window_height), "canvas": base_canvas_size, "factor": 1.0},
+        "1080x580": {"window": (1080, 580), "canvas": 500, "factor": 500/base_canvas_size},
+        "720x400": {"window": (720, 400), "canvas": 340, "factor": 340/base_canvas_size}
+    }
+
+    def __init__(self, host='localhost', port=8888):
         super().__init__()
         self.setWindowTitle("mai22maitouch GUI")
         
-        # 基础尺寸（默认尺寸）
-        self.base_window_width = 1280
-        self.base_window_height = 680
-        self.base_canvas_size = 600
-        
-        # 尺寸选项 - 现在基于基础尺寸进行缩放
-        self.size_options = {
-            "1280x680 (默认)": {"window": (self.base_window_width, self.base_window_height), "canvas": self.base_canvas_size, "factor": 1.0},
-            "1080x580": {"window": (1080, 580), "canvas": 500, "factor": 500/self.base_canvas_size},
-            "720x400": {"window": (720, 400), "canvas": 340, "factor": 340/self.base_canvas_size}
-        }
-        
         self.current_size = "1280x680 (默认)"
         
         # 创建主布局
@@ -269,7 +341,47 @@ class MainWindow(QWidget):
         self.control_layout.addWidget(self.size_label)
         self.control_layout.addWidget(self.size_combo)
         self.control_layout.addWidget(self.apply_button)
-        self.control_layout.addStretch()
+        
+        # 时间轴：拖动回看最近几分钟的触摸状态，前后按钮跳到相邻的状态变化
+        self.review_time = None   # 回看的时刻，None表示实时显示
+        self.review_end = 0.0     # 进入回看时的时刻，对应时间轴最右端
+        self.timeline_ms = TIMELINE_MINUTES * 60 * 1000
+        self.timeline_slider = QSlider(Qt.Orientation.Horizontal)
+        self.timeline_slider.setRange(0, self.timeline_ms)
+        self.timeline_slider.setValue(self.timeline_ms)
+        self.timeline_slider.setSingleStep(10)
+        self.timeline_slider.setPageStep(1000)
+        self.timeline_slider.valueChanged.connect(self.scrub_timeline)
+        self.prev_button = QPushButton("◀")
+        self.prev_button.setFixedWidth(30)
+        self.prev_button.clicked.connect(self.prev_change)
+        self.next_button = QPushButton("▶")
+        self.next_button.setFixedWidth(30)
+        self.next_button.clicked.connect(self.next_change)
+        self.live_button = QPushButton("实时")
+        self.live_button.clicked.connect(self.exit_review)
+        self.save_button = QPushButton("保存记录")
+        self.save_button.clicked.connect(self.save_recording)
+        self.timeline_label = QLabel("实时")
+        self.timeline_label.setMinimumWidth(120)
+        
+        self.control_layout.addSpacing(20)
+        self.control_layout.addWidget(self.timeline_slider, 1)
+        self.control_layout.addWidget(self.prev_button)
+        self.control_layout.addWidget(self.next_button)
+        self.control_layout.addWidget(self.live_button)
+        self.control_layout.addWidget(self.save_button)
+        
+        # 性能浮层，默认关闭
+        self.perf_checkbox = QCheckBox("性能")
+        self.perf_checkbox.toggled.connect(self.toggle_perf_overlay)
+        self.control_layout.addWidget(self.perf_checkbox)
+        self.control_layout.addWidget(self.timeline_label)
+        
+        # 丢包与单向延迟，每秒更新一次
+        self.stats_label = QLabel("")
+        self.stats_label.setMinimumWidth(200)
+        self.control_layout.addWidget(self.stats_label)
         
         # 控制面板固定高度
         self.control_panel.setFixedHeight(40)
@@ -284,86 +396,332 @@ class MainWindow(QWidget):
         # 设置初始尺寸
         self.apply_size()
         
-        # 初始化socket服务器
-        self.socket_server = TouchSocketServer()
-        self.socket_server.start_server()
-        
-        # 定时器
-        self.timer = QTimer(self)
-        self.timer.timeout.connect(self.update_data)
-        self.timer.start(50)
+        # 重绘按屏幕刷新率合并，两次显示之间至少间隔一帧
+        self.frame_interval = screen_frame_interval(self)
+        self.last_frame_time = 0.0
+        self.frame_timer = QTimer(self)
+        self.frame_timer.setSingleShot(True)
+        self.frame_timer.setTimerType(Qt.TimerType.PreciseTimer)
+        self.frame_timer.timeout.connect(self.update_data)
+        
+        # 性能统计：实际重绘的帧数和数据到达到绘制完成的延迟
+        self.painted_frames = 0
+        self.paint_pending_since = None
+        self.paint_latency = RollingStats()
+        self.left_widget.paint_listener = self.on_canvas_painted
+        self.right_widget.paint_listener = self.on_canvas_painted
+        self.perf_overlay = PerfOverlay(self, self.content_widget)
+        self.perf_overlay.hide()
+        self.content_widget.installEventFilter(self)
+        self.perf_timer = QTimer(self)
+        self.perf_timer.timeout.connect(self.perf_overlay.refresh)
+        
+        # 初始化socket服务器，收到数据时由事件循环直接通知
+        self.socket_server = TouchSocketServer(host, port)
+        self.socket_server.start_server(self.schedule_frame)
+        
+        self.stats_timer = QTimer(self)
+        self.stats_timer.timeout.connect(self.update_stats)
+        self.stats_timer.start(1000)
 
     def init_canvases(self):
-        """初始化画布"""
-        # 清除现有画布
-        if hasattr(self, 'left_widget'):
-            self.content_layout.removeWidget(self.left_widget)
-            self.left_widget.deleteLater()
-        if hasattr(self, 'right_widget'):
-            self.content_layout.removeWidget(self.right_widget)
-            self.right_widget.deleteLater()
-        
+        """初始化画布，画布随窗口自由缩放，只创建一次"""
         # 获取当前尺寸因子
         factor = self.size_options[self.current_size]["factor"]
-        canvas_size = self.size_options[self.current_size]["canvas"]
         
-        # 创建新画布
         self.left_widget = TouchWidget(self, size_factor=factor)
-        self.left_widget.setFixedSize(canvas_size, canvas_size)
         self.content_layout.addWidget(self.left_widget)
         
         self.right_widget = TouchWidget_mai(self, size_factor=factor)
-        self.right_widget.setFixedSize(canvas_size, canvas_size)
         self.content_layout.addWidget(self.right_widget)
 
     def apply_size(self):
-        """应用选择的窗口尺寸"""
+        """应用选择的窗口尺寸，画布在后台按新尺寸生成后自动切换"""
         self.current_size = self.size_combo.currentText()
         size_info = self.size_options[self.current_size]
         
         # 更新窗口尺寸
         self.resize(size_info["window"][0], size_info["window"][1])
-        
-        # 重新初始化画布
-        self.init_canvases()
-        
-        # 调整窗口最小尺寸，防止窗口过小
-        self.setMinimumSize(size_info["window"][0] // 2, size_info["window"][1] // 2)
+
+    def schedule_frame(self):
+        """有新数据时安排显示：距上一帧已超过一帧间隔则立即显示，否则等到下一帧"""
+        if self.frame_timer.isActive():
+            return
+        remaining = self.last_frame_time + self.frame_interval - time.monotonic()
+        if remaining <= 0:
+            self.update_data()
+        else:
+            self.frame_timer.start(max(1, round(remaining * 1000)))
 
     def update_data(self):
-        # 从socket获取当前触摸状态
+        # 取出本帧要显示的触摸状态
+        pending_since = self.socket_server.pending_since
+        touched_points, settled = self.socket_server.take_frame_points()
+        self.last_frame_time = time.monotonic()
+        
+        # 回看时新数据只记录到历史，不显示
+        if self.review_time is not None:
+            return
+        
+        # 左右两侧只重绘状态变化的区域
+        changed = self.left_widget.set_touched(touched_points)
+        changed = self.right_widget.set_touched(touched_points) or changed
+        if changed and pending_since is not None and self.paint_pending_since is None:
+            self.paint_pending_since = pending_since
+        
+        # 本帧显示了已松开的短触，下一帧再显示当前状态
+        if not settled:
+            self.frame_timer.start(max(1, round(self.frame_interval * 1000)))
+        
+    def on_canvas_painted(self):
+        """画布绘制完成：有等待显示的数据时记为一帧，并记录数据到达到绘制完成的延迟"""
+        if self.paint_pending_since is None:
+            return
+        self.painted_frames += 1
+        self.paint_latency.add(time.monotonic() - self.paint_pending_since)
+        self.paint_pending_since = None
+
+    def toggle_perf_overlay(self, enabled):
+        if enabled:
+            self.position_perf_overlay()
+            self.perf_overlay.show()
+            self.perf_overlay.raise_()
+            self.perf_overlay.refresh()
+            self.perf_timer.start(500)
+        else:
+            self.perf_timer.stop()
+            self.perf_overlay.hide()
+
+    def position_perf_overlay(self):
+        # 放在内容区右下角，旧框面板的这个角是空白
+        margin = 5
+        self.perf_overlay.move(self.content_widget.width() - self.perf_overlay.width() - margin,
+                               self.content_widget.height() - self.perf_overlay.height() - margin)
+
+    def eventFilter(self, obj, event):
+        if obj is self.content_widget and event.type() == QEvent.Type.Resize:
+            self.position_perf_overlay()
+        return super().eventFilter(obj, event)
+
+    def update_stats(self):
+        """显示最近一秒的丢包率和单向延迟"""
+        self.stats_label.setText(format_stats(self.socket_server.stats.take_report()))
+
+    def set_review_time(self, review_time):
+        """进入回看并显示指定时刻的状态，同步时间轴位置"""
+        if self.review_time is None:
+            self.review_end = time.monotonic()
+        self.review_time = review_time
+        value = self.timeline_ms - round((self.review_end - review_time) * 1000)
+        self.timeline_slider.blockSignals(True)
+        self.timeline_slider.setValue(max(0, min(self.timeline_ms, value)))
+        self.timeline_slider.blockSignals(False)
+        self.show_review_state()
+
+    def show_review_state(self):
+        """显示回看时刻的触摸状态"""
+        history = self.socket_server.history
+        touched_points = unpack_zones(history.state_at(self.review_time))
+        self.left_widget.set_touched(touched_points)
+        self.right_widget.set_touched(touched_points)
+        index = history.index_at(self.review_time)
+        self.timeline_label.setText(f"{self.review_time - self.review_end:+.3f}s  {index + 1}/{len(history)}")
+
+    def scrub_timeline(self, value):
+        """拖动时间轴"""
+        if self.review_time is None:
+            if value == self.timeline_ms:
+                return
+            self.review_end = time.monotonic()
+        self.set_review_time(self.review_end - (self.timeline_ms - value) / 1000)
+
+    def prev_change(self):
+        """跳到上一次状态变化"""
+        current = self.review_time if self.review_time is not None else time.monotonic()
+        target = self.socket_server.history.prev_change(current)
+        if target is not None:
+            self.set_review_time(target)
+
+    def next_change(self):
+        """跳到下一次状态变化，已是最新一次时回到实时显示"""
+        if self.review_time is None:
+            return
+        target = self.socket_server.history.next_change(self.review_time)
+        if target is None or target > self.review_end:
+            self.exit_review()
+        else:
+            self.set_review_time(target)
+
+    def exit_review(self):
+        """回到实时显示"""
+        self.review_time = None
+        self.timeline_slider.blockSignals(True)
+        self.timeline_slider.setValue(self.timeline_ms)
+        self.timeline_slider.blockSignals(False)
+        self.timeline_label.setText("实时")
         touched_points = self.socket_server.get_latest_data()
-        
-        # 左侧输出
-        for point in self.left_widget.touch_points.keys():
-            if point in touched_points:
-                self.left_widget.current_svgs[point] = self.left_widget.touch_svgs[point]
-            else:
-                self.left_widget.current_svgs[point] = self.left_widget.default_svgs[point]
-        
-        # 右侧输出
-        for point in self.right_widget.touch_points.keys():
-            if point in touched_points:
-                self.right_widget.current_svgs[point] = self.right_widget.touch_svgs[point]
-            elif 22 in touched_points:
-                self.right_widget.current_svgs[21] = self.right_widget.touch_svgs[21]
-            else:
-                self.right_widget.current_svgs[point] = self.right_widget.default_svgs[point]
-        
-        # 更新显示
-        self.left_widget.update()
-        self.right_widget.update()
-        
+        self.left_widget.set_touched(touched_points)
+        self.right_widget.set_touched(touched_points)
+
+    def save_recording(self):
+        """将触摸历史保存为记录文件，可用render_recording.py渲染为图片序列"""
+        path, _ = QFileDialog.getSaveFileName(self, "保存触摸记录", time.strftime("touch_%Y%m%d_%H%M%S.mtr"),
+                                              "触摸记录 (*.mtr)")
+        if not path:
+            return
+        try:
+            self.socket_server.history.save(path)
+        except OSError as e:
+            QMessageBox.warning(self, "保存失败", f"无法保存记录: {e}")
+
     def closeEvent(self, event):
         """窗口关闭时清理资源"""
         self.socket_server.stop_server()
         event.accept()
         
+class MonitorTile(QWidget):
+    """网格模式中的一个机台：标题、统计和一对mai2/旧框画布，对应一个数据源"""
+
+    def __init__(self, host, port, on_data, size_factor=GRID_CANVAS_SIZE / 600, parent=None):
+        super().__init__(parent)
+        layout = QVBoxLayout(self)
+        layout.setContentsMargins(0, 0, 0, 0)
+        layout.setSpacing(2)
+        
+        title_line = QHBoxLayout()
+        self.title_label = QLabel(f"{host}:{port}")
+        self.stats_label = QLabel("")
+        title_line.addWidget(self.title_label)
+        title_line.addStretch()
+        title_line.addWidget(self.stats_label)
+        layout.addLayout(title_line)
+        
+        canvases = QHBoxLayout()
+        canvases.setSpacing(5)
+        # 同尺寸的画布共用touch_sprites中缓存的布局和精灵
+        self.left_widget = TouchWidget(self, size_factor=size_factor)
+        self.right_widget = TouchWidget_mai(self, size_factor=size_factor)
+        canvases.addWidget(self.left_widget)
+        canvases.addWidget(self.right_widget)
+        layout.addLayout(canvases, 1)
+        
+        self.socket_server = TouchSocketServer(host, port)
+        self.socket_server.start_server(lambda: on_data(self))
+
+    def present(self):
+        """
+        显示下一帧的状态，只有状态变化的区域会重绘
+        
+        返回: 是否已显示到当前状态
+        """
+        touched_points, settled = self.socket_server.take_frame_points()
+        self.left_widget.set_touched(touched_points)
+        self.right_widget.set_touched(touched_points)
+        return settled
+
+    def update_stats(self):
+        self.stats_label.setText(format_stats(self.socket_server.stats.take_report()))
+
+class GridWindow(QWidget):
+    """
+    多机台网格：一个进程、一个窗口同时监视多个数据源
+    
+    所有socket都通过QSocketNotifier接入同一个Qt事件循环；只有收到数据的机台
+    被标记为待显示，由共用的帧定时器每帧处理一次，其余机台不产生任何开销。
+    """
+
+    def __init__(self, endpoints, columns=None):
+        super().__init__()
+        self.setWindowTitle(f"mai22maitouch GUI - {len(endpoints)} 台")
+        columns = columns or math.ceil(math.sqrt(len(endpoints)))
+        grid = QGridLayout(self)
+        grid.setSpacing(10)
+        grid.setContentsMargins(5, 5, 5, 5)
+        
+        self.frame_interval = screen_frame_interval(self)
+        self.last_frame_time = 0.0
+        self.frame_timer = QTimer(self)
+        self.frame_timer.setSingleShot(True)
+        self.frame_timer.setTimerType(Qt.TimerType.PreciseTimer)
+        self.frame_timer.timeout.connect(self.update_data)
+        # 有新数据、等待下一帧显示的机台
+        self.dirty_tiles = set()
+        
+        self.tiles = []
+        for i, (host, port) in enumerate(endpoints):
+            tile = MonitorTile(host, port, self.schedule_frame, parent=self)
+            grid.addWidget(tile, i // columns, i % columns)
+            self.tiles.append(tile)
+        
+        self.stats_timer = QTimer(self)
+        self.stats_timer.timeout.connect(self.update_stats)
+        self.stats_timer.start(1000)
+
+    def schedule_frame(self, tile):
+        """机台收到数据时调用：距上一帧已超过一帧间隔则立即显示，否则等到下一帧"""
+        self.dirty_tiles.add(tile)
+        if self.frame_timer.isActive():
+            return
+        remaining = self.last_frame_time + self.frame_interval - time.monotonic()
+        if remaining <= 0:
+            self.update_data()
+        else:
+            self.frame_timer.start(max(1, round(remaining * 1000)))
+
+    def update_data(self):
+        """只显示有新数据的机台"""
+        dirty, self.dirty_tiles = self.dirty_tiles, set()
+        self.last_frame_time = time.monotonic()
+        for tile in dirty:
+            # 本帧显示了已松开的短触，下一帧再显示当前状态
+            if not tile.present():
+                self.dirty_tiles.add(tile)
+        if self.dirty_tiles:
+            self.frame_timer.start(max(1, round(self.frame_interval * 1000)))
+
+    def update_stats(self):
+        for tile in self.tiles:
+            tile.update_stats()
+
+    def stop_servers(self):
+        for tile in self.tiles:
+            tile.socket_server.stop_server()
+
+    def closeEvent(self, event):
+        """窗口关闭时清理资源"""
+        self.stop_servers()
+        event.accept()
+
+def parse_endpoint(text, default_host='localhost'):
+    """解析数据源：'8888' 或 'host:8888'"""
+    host, sep, port = text.rpartition(':')
+    return (host if sep else default_host), int(port)
+
 if __name__ == "__main__":
-    app = QApplication(sys.argv)
-    window = MainWindow()
+    parser = argparse.ArgumentParser(description='mai22maitouch 触摸监视器')
+    parser.add_argument('endpoints', nargs='*', default=['8888'],
+                        help='监听的端口或 地址:端口，多于一个时以网格显示多个机台（默认：8888）')
+    parser.add_argument('-c', '--columns', type=int, default=None,
+                        help='网格模式的列数（默认：接近正方形）')
+    args = parser.parse_args()
+    try:
+        endpoints = [parse_endpoint(endpoint) for endpoint in args.endpoints]
+    except ValueError:
+        parser.error("端口必须是数字")
+    
+    app = QApplication(sys.argv[:1])
+    try:
+        if len(endpoints) == 1:
+            window = MainWindow(*endpoints[0])
+            stop = window.socket_server.stop_server
+        else:
+            window = GridWindow(endpoints, args.columns)
+            stop = window.stop_servers
+    except OSError as e:
+        print(f"无法监听端口: {e}")
+        sys.exit(1)
     window.show()
     try:
         sys.exit(app.exec())
     finally:
-        window.socket_server.stop_server()
+        stop()
@@ -1,15 +1,17 @@
 import sys
 import socket
+import argparse
 import serial
 import threading
 import time
 from PyQt6.QtWidgets import (
     QWidget, QApplication, QHBoxLayout, QVBoxLayout, QComboBox, QPushButton,
-    QLabel, QCheckBox, QLineEdit, QMessageBox
+    QLabel, QCheckBox, QLineEdit, QMessageBox, QFileDialog
 )
-from PyQt6.QtGui import QPainter, QColor, QFont, QPixmap, QImage
-from PyQt6.QtCore import QTimer, Qt, QRectF, QPointF
-from PyQt6.QtSvg import QSvgRenderer
+from PyQt6.QtGui import QEventPoint
+from PyQt6.QtCore import QTimer, Qt, QPointF, QEvent, pyqtSignal
+from touch_sprites import SpriteTouchWidget, MAI2_TOUCH_POINTS, MAI2_SPRITE_SCALE
+from touch_protocol import TouchDatagramEncoder, encode_mai2_serial, GestureRecording, GESTURE_CONTACT, GESTURE_RELEASE
 from datetime import datetime
 
 class TouchSocketClient:
@@ -17,10 +19,12 @@ class TouchSocketClient:
         self.host = host
         self.port = port
         self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        # 带序号、发送时间和冗余状态的数据报，监视器据此统计丢包和延迟
+        self.encoder = TouchDatagramEncoder()
         print(f"Touch socket client initialized, sending to {host}:{port}")
 
     def send_touch_data(self, touched_points):
-        data = bytes(touched_points)
+        data = self.encoder.encode(touched_points)
         self.socket.sendto(data, (self.host, self.port))
 
     def close(self):
@@ -30,23 +34,38 @@ class TouchSocketClient:
             print("Client closed")
 
 class SerialBridge:
-    def __init__(self, port='COM13', baud_rate=9600, touch_widget=None):
+    """
+    触摸板的串口输出
+
+    串口由单独的I/O线程独占：读取带超时阻塞等待游戏发来的命令，写入也在该线程完成；
+    GUI线程只把最新一帧交给I/O线程，不会因串口读写而阻塞。
+    stream为True时按波特率允许的最高频率持续发送当前状态（与实机控制器一致），
+    否则只在状态变化时发送
+    """
+    # 串口的读取超时（秒），打开时设置，之后不再改变
+    READ_TIMEOUT = 0.1
+
+    def __init__(self, port='COM13', baud_rate=9600, touch_widget=None, stream=False):
         self.port = port
         self.baud_rate = baud_rate
         self.serial = None
         self.active = False
         self.touch_widget = touch_widget
         self.key_mappings = {}
+        # 保护active和待发送的帧，串口本身只由I/O线程访问
         self.lock = threading.Lock()
-        self.receive_thread = None
+        self.io_thread = None
         self.running = False
+        self.stream = stream
+        self.frame = self._transform_touch_data([])
+        self.frame_pending = False
 
     def start(self):
         try:
-            self.serial = serial.Serial(self.port, self.baud_rate, timeout=1)
+            self.serial = serial.Serial(self.port, self.baud_rate, timeout=self.READ_TIMEOUT)
             self.running = True
-            self.receive_thread = threading.Thread(target=self._receive_loop, daemon=True)
-            self.receive_thread.start()
+            self.io_thread = threading.Thread(target=self._io_loop, daemon=True)
+            self.io_thread.start()
             print(f"Serial communication started on {self.port}")
             return True
         except Exception as e:
@@ -56,20 +75,74 @@ class SerialBridge:
     def stop(self):
         self.running = False
         self.active = False
+        self._wake()
+        if self.io_thread is not None and self.io_thread is not threading.current_thread():
+            self.io_thread.join(1)
+        self.io_thread = None
         if self.serial and self.serial.is_open:
             self.serial.close()
         self.serial = None
         print("Serial communication stopped")
 
-    def _receive_loop(self):
+    def set_stream(self, stream):
+        self.stream = stream
+        self._wake()
+
+    def _wake(self):
+        # 打断I/O线程中正在等待的读取，使其立即处理新的帧
+        try:
+            if self.serial and self.serial.is_open:
+                self.serial.cancel_read()
+        except Exception:
+            pass
+
+    def _io_loop(self):
+        buffer = b''
+        # 一帧在线路上的传输时间，连续发送时以此为间隔
+        frame_interval = 10 * len(self.frame) / self.baud_rate
+        next_frame = time.perf_counter()
         while self.running:
             try:
-                if self.serial and self.serial.in_waiting > 0:
-                    data = self.serial.read_until(b'}')
-                    if data:
-                        self._process_command(data)
+                with self.lock:
+                    frame = self.frame
+                    pending = self.frame_pending
+                    self.frame_pending = False
+                    active = self.active
+                if active and self.stream:
+                    # 按绝对时间点发送，落后超过一帧时重新对齐，不补发
+                    now = time.perf_counter()
+                    if now >= next_frame:
+                        self.serial.write(frame)
+                        next_frame = max(next_frame + frame_interval, now)
+                    # 只读取已到达的数据，不改变串口的读取超时，没有数据时等到下一帧的时间点
+                    waiting = self.serial.in_waiting
+                    if not waiting:
+                        time.sleep(max(0.0, next_frame - time.perf_counter()))
+                        continue
+                    data = self.serial.read(waiting)
+                else:
+                    if active and pending:
+                        self.serial.write(frame)
+                        timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S.%f")[:-3]
+                        print(f"[{timestamp}] Serial Data Sent: {frame.hex()}")
+                    next_frame = time.perf_counter()
+                    # 阻塞读取，超时固定为READ_TIMEOUT，有新帧要发送时由cancel_read唤醒
+                    data = self.serial.read(max(1, self.serial.in_waiting))
+                if not data:
+                    continue
+                # 按'}'切分命令，不完整的部分留到下次读取
+                buffer += data
+                end = buffer.find(b'}')
+                while end >= 0:
+                    start = buffer.rfind(b'{', 0, end)
+                    self._process_command(buffer[max(0, start):end + 1])
+                    buffer = buffer[end + 1:]
+                    end = buffer.find(b'}')
+                buffer = buffer[-64:]
             except Exception as e:
-                print(f"Error in serial receive loop: {e}")
+                if not self.running:
+                    break
+                print(f"Error in serial I/O loop: {e}")
                 time.sleep(0.1)
 
     def _process_command(self, data):
@@ -80,9 +153,7 @@ class SerialBridge:
             if data[3] == ord('k') or data[3] == ord('r'):  # 第三位是k或r
                 # 响应(xx?Y)
                 response = b'(' + data[1:5] + b')'
-                with self.lock:
-                    if self.serial and self.serial.is_open:
-                        self.serial.write(response)
+                self.serial.write(response)
                 print(f"Responded to mapping command: {data} -> {response}")
                 return
         
@@ -90,232 +161,165 @@ class SerialBridge:
         if b'{STAT}' in data:
             with self.lock:
                 self.active = True
-                print("Received STAT command, activating serial bridge")
+                # 激活后立即发送一次当前状态
+                self.frame_pending = True
+            print("Received STAT command, activating serial bridge")
         elif b'{HALT}' in data:
             with self.lock:
                 self.active = False
-                print("Received HALT command, deactivating serial bridge")
+            print("Received HALT command, deactivating serial bridge")
 
     def send_touch_data(self, touched_points):
-        if not self.active or not self.serial or not self.serial.is_open:
-            return
-        
-        # 将触摸点转换为mai2格式
-        mai2_data = self._transform_touch_data(touched_points)
+        """在GUI线程调用：编码后交给I/O线程发送，不等待串口"""
+        frame = self._transform_touch_data(touched_points)
         with self.lock:
-            try:
-                self.serial.write(mai2_data)
-                timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S.%f")[:-3]
-                print(f"[{timestamp}] Serial Data Sent: {mai2_data.hex()}")
-            except Exception as e:
-                print(f"Error sending serial data: {e}")
+            self.frame = frame
+            self.frame_pending = True
+            wake = self.active and not self.stream
+        if wake:
+            self._wake()
 
     def _transform_touch_data(self, touched_points):
         """
         将触摸点列表转换为mai2格式的字节序列
         格式: 9字节，以b'\x28'开头，b'\x29'结尾
         """
-        # 初始化mai2输出数据 (全初始化为0x00)
-        mai2_data = [0x00] * 9
-        mai2_data[0] = 0x28  # 起始字节 '('
-        mai2_data[8] = 0x29  # 结束字节 ')'
-        
-        # mai2的区域定义 (字节位置, 位位置): 触摸点ID
-        mai2_zone_mapping = {
-            (1, 0): 1,   # A1
-            (1, 1): 2,   # A2
-            (1, 2): 3,   # A3
-            (1, 3): 4,   # A4
-            (1, 4): 5,   # A5
-            (2, 0): 6,   # A6
-            (2, 1): 7,   # A7
-            (2, 2): 8,   # A8
-            (2, 3): 11,  # B1
-            (2, 4): 12,  # B2
-            (3, 0): 13,  # B3
-            (3, 1): 14,  # B4
-            (3, 2): 15,  # B5
-            (3, 3): 16,  # B6
-            (3, 4): 17,  # B7
-            (4, 0): 18,  # B8
-            (4, 1): 21,  # C1
-            (4, 2): 22,  # C2
-            (4, 3): 31,  # D1
-            (4, 4): 32,  # D2
-            (5, 0): 33,  # D3
-            (5, 1): 34,  # D4
-            (5, 2): 35,  # D5
-            (5, 3): 36,  # D6
-            (5, 4): 37,  # D7
-            (6, 0): 38,  # D8
-            (6, 1): 41,  # E1
-            (6, 2): 42,  # E2
-            (6, 3): 43,  # E3
-            (6, 4): 44,  # E4
-            (7, 0): 45,  # E5
-            (7, 1): 46,  # E6
-            (7, 2): 47,  # E7
-            (7, 3): 48,  # E8
-        }
-        
-        # 设置触摸位
-        for point in touched_points:
-            for (byte_pos, bit_pos), point_id in mai2_zone_mapping.items():
-                if point == point_id:
-                    mai2_data[byte_pos] |= (1 << bit_pos)
-        
-        return bytes(mai2_data)
+        return encode_mai2_serial(touched_points)
 
-class TouchWidget(QWidget):
+class TouchWidget(SpriteTouchWidget):
     MAX_TOUCH_POINTS = 10
-
-    def __init__(self, parent=None, points_data=None, svg_prefix="", size_factor=1.0, socket_client=None, socket_enabled_func=None, serial_bridge=None):
-        super().__init__(parent)
-        self.size_factor = size_factor
-        self.touch_points = points_data or {
-            1: (404, 73, 'A1'), 2: (528, 193, 'A2'), 3: (528, 404, 'A3'), 4: (403, 526, 'A4'),
-            5: (197, 528, 'A5'), 6: (72, 404, 'A6'), 7: (72, 193, 'A7'), 8: (197, 73, 'A8'),
-            11: (347, 184, 'B1'), 12: (418, 254, 'B2'), 13: (418, 346, 'B3'), 14: (347, 417, 'B4'),
-            15: (254, 417, 'B5'), 16: (186, 346, 'B6'), 17: (186, 254, 'B7'), 18: (254, 184, 'B8'),
-            21: (330, 300, 'C1'), 22: (271, 300, 'C2'),
-            31: (300, 50, 'D1'), 32: (481, 119, 'D2'), 33: (550, 300, 'D3'), 34: (477, 477, 'D4'),
-            35: (300, 550, 'D5'), 36: (118, 482, 'D6'), 37: (50, 300, 'D7'), 38: (123, 123, 'D8'),
-            41: (300, 130, 'E1'), 42: (421, 178, 'E2'), 43: (471, 300, 'E3'), 44: (421, 421, 'E4'),
-            45: (300, 471, 'E5'), 46: (178, 421, 'E6'), 47: (129, 300, 'E7'), 48: (179, 179, 'E8')
-        }
-        self.touch_points = {k: (round(v[0]*size_factor), round(v[1]*size_factor), v[2]) 
-                           for k, v in self.touch_points.items()}
-        self.svg_prefix = svg_prefix
-        self.default_svgs = {point: QSvgRenderer(f"{self.svg_prefix}touch/{label}.svg") for point, (x, y, label) in self.touch_points.items()}
-        self.touch_svgs = {point: QSvgRenderer(f"{self.svg_prefix}touch/{label}_touch.svg") for point, (x, y, label) in self.touch_points.items()}
-        self.current_svgs = self.default_svgs.copy()
+    hit_testing = True
+    # 触摸按接触面积检测：区域覆盖接触矩形的比例不低于此值时算作触摸，可按设备调整
+    contact_coverage = 0.25
+    # 触摸状态变化时立即发送，连续变化时最高按此频率(Hz)合并发送
+    max_send_rate = 500
+    # 状态不变时每隔此时间(秒)重发一次当前状态，接收端丢包后也能恢复
+    keepalive_interval = 0.5
+
+    # 输入线程处理触摸后通知GUI线程重绘
+    _input_changed = pyqtSignal()
+    sprite_scale = MAI2_SPRITE_SCALE
+
+    def __init__(self, parent=None, points_data=None, svg_prefix="", size_factor=1.0, socket_client=None, socket_enabled=True, serial_bridge=None):
+        super().__init__(parent, svg_prefix, size_factor)
+        # 区域表基于600x600画布，按尺寸因子缩放后的坐标在布局中生成
+        self.base_points = points_data or MAI2_TOUCH_POINTS
         self.active_touches = set()
+        # 触摸点ID -> 覆盖的区域，区域 -> 覆盖它的触摸点数
         self.touch_point_map = {}
+        self.zone_counts = {}
+        # 触摸点ID -> 上次检测时的(x, y, 接触宽, 接触高)
+        self.touch_contacts = {}
+        # 触摸状态变化、等待重绘的区域
+        self.dirty_zones = set()
+        # 录制手势时为GestureRecording，见apply_contact和remove_touch
+        self.recorder = None
+        # 触摸状态和发送状态可能同时被GUI线程和输入线程（见touch_input.py）修改
+        self.lock = threading.RLock()
+        # 直接读取触摸设备的输入源，启用后忽略Qt的触摸事件
+        self.input_source = None
+        # 屏幕左上角在画布坐标中的位置和屏幕尺寸，供输入线程换算设备坐标
+        self.input_geometry = (0, 0, 0, 0)
+        self._input_changed.connect(self.update_touch_display)
         self.mouse_pressed = False
         self.mouse_touch_id = -1
         self.setAttribute(Qt.WidgetAttribute.WA_AcceptTouchEvents, True)
-        self.svg_bounds = {}
-        self.svg_images = {}
-        self.calculate_svg_bounds_and_images()
+        # 命中检测栅格随布局一起生成和替换
+        self.load_sprites()
         self.socket_client = socket_client
-        self.socket_enabled_func = socket_enabled_func
+        # 是否通过socket发送，由GUI线程设置，发送时（可能在输入线程）在锁内读取
+        self.socket_enabled = socket_enabled
         self.serial_bridge = serial_bridge
         self.last_sent_touches = None
+        # 上次发送后出现过的区域，一次合并发送内按下又松开的短触也会被发送
+        self.pending_touches = set()
+        self.last_send_time = 0.0
+        self.send_pending = False
+        self.send_timer = QTimer(self)
+        self.send_timer.setSingleShot(True)
+        self.send_timer.setTimerType(Qt.TimerType.PreciseTimer)
+        self.send_timer.timeout.connect(self.flush_touch_data)
+        self.keepalive_timer = QTimer(self)
+        self.keepalive_timer.timeout.connect(self.send_keepalive)
+        self.keepalive_timer.start(round(self.keepalive_interval * 1000))
 
     def set_socket_client(self, client):
-        self.socket_client = client
-        self.last_sent_touches = None
+        with self.lock:
+            self.socket_client = client
+            self.last_sent_touches = None
+            self.schedule_send()
 
-    def set_serial_bridge(self, bridge):
-        self.serial_bridge = bridge
-        self.last_sent_touches = None
+    def set_socket_enabled(self, enabled):
+        with self.lock:
+            self.socket_enabled = enabled
 
-    def calculate_svg_bounds_and_images(self):
-        for point, (center_x, center_y, label) in self.touch_points.items():
-            renderer = self.default_svgs[point]
-            rect = renderer.viewBoxF()
-            scale_factor = 0.3 * self.size_factor
-            scaled_width = round(rect.width() * scale_factor)
-            scaled_height = round(rect.height() * scale_factor)
-            top_left_x = round(center_x - scaled_width / 2)
-            top_left_y = round(center_y - scaled_height / 2)
-            self.svg_bounds[point] = QRectF(top_left_x, top_left_y, scaled_width, scaled_height)
-            image = QImage(scaled_width, scaled_height, QImage.Format.Format_ARGB32)
-            image.fill(Qt.GlobalColor.transparent)
-            painter = QPainter(image)
-            painter.setRenderHint(QPainter.RenderHint.Antialiasing)
-            renderer.render(painter, QRectF(0, 0, scaled_width, scaled_height))
-            painter.end()
-            self.svg_images[point] = image
-
-    def is_point_in_svg(self, point_id, pos):
-        if point_id not in self.svg_bounds:
-            return False
-        bounds = self.svg_bounds[point_id]
-        if bounds.contains(pos):
-            local_x = int(pos.x() - bounds.x())
-            local_y = int(pos.y() - bounds.y())
-            if (0 <= local_x < self.svg_images[point_id].width() and 
-                0 <= local_y < self.svg_images[point_id].height()):
-                pixel_color = self.svg_images[point_id].pixelColor(local_x, local_y)
-                return pixel_color.alpha() > 10
-        return False
+    def set_serial_bridge(self, bridge):
+        with self.lock:
+            self.serial_bridge = bridge
+            self.last_sent_touches = None
+            self.schedule_send()
 
     def find_touched_points(self, pos):
-        touched = []
-        for point_id in self.touch_points.keys():
-            if self.is_point_in_svg(point_id, pos):
-                touched.append(point_id)
-        return touched
-
-    def paintEvent(self, event):
-        painter = QPainter(self)
-        painter.setRenderHint(QPainter.RenderHint.Antialiasing)
-        painter.fillRect(self.rect(), self.palette().window())
-        font_size = max(8, round(12 * self.size_factor))
-        font = QFont("SEGA-Humming v2 B", font_size)
-        painter.setFont(font)
-        for point, (center_x, center_y, label) in self.touch_points.items():
-            scale_factor = round(0.3 * self.size_factor * 100) / 100
-            renderer = self.current_svgs[point]
-            rect = renderer.viewBoxF()
-            scaled_width = round(rect.width() * scale_factor)
-            scaled_height = round(rect.height() * scale_factor)
-            top_left_x = round(center_x - scaled_width / 2)
-            top_left_y = round(center_y - scaled_height / 2)
-            painter.save()
-            painter.translate(top_left_x, top_left_y)
-            renderer.render(painter, QRectF(0, 0, scaled_width, scaled_height))
-            painter.restore()
-        painter.setPen(QColor(255,255,255))
-        for point, (center_x, center_y, label) in self.touch_points.items():
-            text_x = round(center_x - 10 * self.size_factor)
-            text_y = round(center_y + 5 * self.size_factor)
-            painter.drawText(text_x, text_y, label)
+        # 查表得到覆盖该位置的区域，与区域数量无关
+        return self.layout.zones_at(pos.x(), pos.y())
 
     def mousePressEvent(self, event):
         self.mouse_pressed = True
         pos = event.position()
-        self.mouse_touch_id = -1
-        touched_points = self.find_touched_points(pos)
-        self.touch_point_map[self.mouse_touch_id] = set(touched_points)
-        self.update_active_touches()
+        self.apply_contact(self.mouse_touch_id, pos.x(), pos.y())
         self.update_touch_display()
         event.accept()
 
     def mouseMoveEvent(self, event):
         if self.mouse_pressed and (event.buttons() & Qt.MouseButton.LeftButton):
-            current_pos = event.position()
             if self.mouse_touch_id in self.touch_point_map:
-                self.touch_point_map[self.mouse_touch_id].clear()
-                touched_points = self.find_touched_points(current_pos)
-                self.touch_point_map[self.mouse_touch_id].update(touched_points)
-                self.update_active_touches()
+                pos = event.position()
+                self.apply_contact(self.mouse_touch_id, pos.x(), pos.y())
                 self.update_touch_display()
         event.accept()
 
     def mouseReleaseEvent(self, event):
         self.mouse_pressed = False
-        if self.mouse_touch_id in self.touch_point_map:
-            del self.touch_point_map[self.mouse_touch_id]
-        self.update_active_touches()
+        self.remove_touch(self.mouse_touch_id)
         self.update_touch_display()
         event.accept()
 
     def leaveEvent(self, event):
         if self.mouse_pressed:
-            if self.mouse_touch_id in self.touch_point_map:
-                del self.touch_point_map[self.mouse_touch_id]
-            self.update_active_touches()
+            self.remove_touch(self.mouse_touch_id)
             self.update_touch_display()
         event.accept()
 
     def event(self, event):
         if event.type() in (event.Type.TouchBegin, event.Type.TouchUpdate, event.Type.TouchEnd, event.Type.TouchCancel):
-            self.touchEvent(event)
+            # 使用直接读取设备的输入源时，同一次触摸经由Qt再到达一次，忽略
+            if self.input_source is None:
+                self.touchEvent(event)
+            else:
+                event.accept()
             return True
         return super().event(event)
 
+    def update_input_geometry(self):
+        screen = self.screen()
+        if screen is None:
+            return
+        geometry = screen.geometry()
+        origin = self.mapToGlobal(QPointF(0, 0))
+        self.input_geometry = (geometry.x() - origin.x(), geometry.y() - origin.y(),
+                               geometry.width(), geometry.height())
+
+    def showEvent(self, event):
+        # 窗口移动时控件本身收不到moveEvent，由顶层窗口的事件更新
+        self.window().installEventFilter(self)
+        self.update_input_geometry()
+        super().showEvent(event)
+
+    def eventFilter(self, obj, event):
+        if event.type() in (QEvent.Type.Move, QEvent.Type.Resize):
+            self.update_input_geometry()
+        return super().eventFilter(obj, event)
+
     def touchEvent(self, event):
         event_type = event.type()
         if event_type == event.Type.TouchBegin:
@@ -329,88 +333,188 @@ class TouchWidget(QWidget):
         event.accept()
 
     def handle_touch_begin(self, event):
-        points = event.points()[:self.MAX_TOUCH_POINTS]
-        keys_to_remove = [k for k in self.touch_point_map.keys() if k != self.mouse_touch_id]
-        for k in keys_to_remove:
-            del self.touch_point_map[k]
-        for point in points:
-            touch_id = point.id()
-            pos = point.position()
-            touched_points = self.find_touched_points(pos)
-            self.touch_point_map[touch_id] = set(touched_points)
-        self.update_active_touches()
-        self.update_touch_display()
-    
+        # 新的触摸序列开始，清除上一序列残留的触摸点
+        for touch_id in [k for k in list(self.touch_point_map) if k != self.mouse_touch_id]:
+            self.remove_touch(touch_id)
+        self.handle_touch_update(event)
+
     def handle_touch_update(self, event):
-        points = event.points()[:self.MAX_TOUCH_POINTS]
-        keys_to_remove = [k for k in self.touch_point_map.keys() if k != self.mouse_touch_id]
-        for k in keys_to_remove:
-            del self.touch_point_map[k]
-        for point in points:
+        # 只重新检测位置或接触范围变化的触摸点，静止的触摸点保持原有区域
+        for point in event.points()[:self.MAX_TOUCH_POINTS]:
             touch_id = point.id()
+            state = point.state()
+            if state == QEventPoint.State.Released:
+                self.remove_touch(touch_id)
+                continue
+            if state == QEventPoint.State.Stationary and touch_id in self.touch_point_map:
+                continue
             pos = point.position()
-            touched_points = self.find_touched_points(pos)
-            self.touch_point_map[touch_id] = set(touched_points)
-        self.update_active_touches()
+            diameters = point.ellipseDiameters()
+            self.apply_contact(touch_id, pos.x(), pos.y(), diameters.width(), diameters.height())
         self.update_touch_display()
 
     def handle_touch_end(self, event):
         for point in event.points():
-            touch_id = point.id()
-            if touch_id in self.touch_point_map:
-                del self.touch_point_map[touch_id]
-        self.update_active_touches()
+            self.remove_touch(point.id())
         self.update_touch_display()
 
     def handle_touch_cancel(self, event):
-        self.touch_point_map.clear()
-        self.update_active_touches()
+        for touch_id in list(self.touch_point_map):
+            self.remove_touch(touch_id)
         self.update_touch_display()
 
-    def update_active_touches(self):
-        self.active_touches.clear()
-        keys = [k for k in self.touch_point_map.keys() if k != self.mouse_touch_id][:self.MAX_TOUCH_POINTS]
-        for key in keys:
-            self.active_touches.update(self.touch_point_map[key])
-        if self.mouse_touch_id in self.touch_point_map:
-            self.active_touches.update(self.touch_point_map[self.mouse_touch_id])
+    def apply_contact(self, touch_id, x, y, width=0.0, height=0.0):
+        """
+        触摸点按下或移动到(x, y)，接触范围为width x height
 
-    def update_touch_display(self):
-        for point_id in self.touch_points.keys():
-            if point_id in self.active_touches:
-                self.current_svgs[point_id] = self.touch_svgs[point_id]
+        按接触面积检测覆盖的区域，手指压在区域边界上时不会在两个区域间来回跳；
+        位置和接触范围都没有变化时跳过。回放手势记录也通过此方法输入
+        """
+        contact = (x, y, width, height)
+        with self.lock:
+            if self.touch_contacts.get(touch_id) == contact:
+                return
+            self.touch_contacts[touch_id] = contact
+            if self.recorder is not None:
+                f = self.size_factor
+                self.recorder.append(time.monotonic(), touch_id, GESTURE_CONTACT, x / f, y / f, width / f, height / f)
+            self.set_touch_zones(touch_id, self.layout.zones_in_area(x, y, width, height, self.contact_coverage))
+
+    def set_touch_zones(self, touch_id, zones):
+        """
+        更新一个触摸点覆盖的区域
+
+        每个区域记录覆盖它的触摸点数，计数从0变为1或从1变为0时才改变区域的触摸状态，
+        并记入dirty_zones等待重绘
+        """
+        old_zones = self.touch_point_map.get(touch_id, frozenset())
+        new_zones = frozenset(zones)
+        # 没有覆盖任何区域的触摸点也要记录，之后移动到区域上时才能继续跟踪
+        self.touch_point_map[touch_id] = new_zones
+        if new_zones == old_zones:
+            return
+        for zone in old_zones - new_zones:
+            count = self.zone_counts[zone] - 1
+            if count:
+                self.zone_counts[zone] = count
             else:
-                self.current_svgs[point_id] = self.default_svgs[point_id]
-        self.update()
+                del self.zone_counts[zone]
+                self.active_touches.discard(zone)
+                self.dirty_zones.add(zone)
+        for zone in new_zones - old_zones:
+            count = self.zone_counts.get(zone, 0)
+            self.zone_counts[zone] = count + 1
+            if not count:
+                self.active_touches.add(zone)
+                self.dirty_zones.add(zone)
+
+    def remove_touch(self, touch_id):
+        with self.lock:
+            if touch_id in self.touch_point_map:
+                if self.recorder is not None:
+                    self.recorder.append(time.monotonic(), touch_id, GESTURE_RELEASE)
+                self.set_touch_zones(touch_id, ())
+                del self.touch_point_map[touch_id]
+            self.touch_contacts.pop(touch_id, None)
+
+    def replay_event(self, kind, touch_id, x, y, width, height):
+        """输入一个手势记录中的事件，坐标按当前尺寸缩放"""
+        if kind == GESTURE_RELEASE:
+            self.remove_touch(touch_id)
+        else:
+            f = self.size_factor
+            self.apply_contact(touch_id, x * f, y * f, width * f, height * f)
+
+    def update_touch_display(self):
+        # 只重绘状态变化的区域，并立即安排发送
+        with self.lock:
+            if not self.dirty_zones:
+                return
+            dirty, self.dirty_zones = self.dirty_zones, set()
+            active = set(self.active_touches)
+            self.pending_touches.update(active)
+            self.send_pending = True
+        self.update_zones(dirty, active)
+        if not self.send_timer.isActive():
+            self.flush_touch_data()
+
+    def schedule_send(self):
+        """距上次发送超过最小间隔时立即发送，否则在间隔结束时合并发送"""
+        with self.lock:
+            self.send_pending = True
+        if not self.send_timer.isActive():
+            self.flush_touch_data()
 
-    def send_socket_touch_data(self):
-        if self.socket_client is not None and self.socket_enabled_func is not None and self.socket_enabled_func():
-            current_touches = sorted(self.active_touches)
-            if current_touches != self.last_sent_touches:
-                self.socket_client.send_touch_data(current_touches)
-                self.last_sent_touches = current_touches
+    def flush_touch_data(self):
+        delay = self.poll_send()
+        if delay is not None:
+            self.send_timer.start(max(1, round(delay * 1000)))
+
+    def poll_send(self):
+        """
+        发送到期的帧，可以在输入线程中调用
+
+        发送上次发送以来出现过的所有区域；与当前状态不同时（短触已松开），之后还要再发送一次当前状态。
+        返回距下次需要发送的时间（秒，大于0），没有待发送的帧时返回None
+        """
+        with self.lock:
+            if not self.send_pending:
+                return None
+            interval = 1 / self.max_send_rate
+            remaining = self.last_send_time + interval - time.perf_counter()
+            if remaining > 0:
+                return remaining
+            while True:
+                frame = sorted(self.pending_touches | self.active_touches)
+                self.pending_touches = set(self.active_touches)
+                if frame != self.last_sent_touches:
+                    self.send_touch_data(frame)
+                self.send_pending = frame != sorted(self.active_touches)
+                if not self.send_pending:
+                    return None
+                if interval > 0:
+                    return interval
+                # 不限制发送频率时（如尽快回放）直接接着发送当前状态
+
+    def input_frame_done(self):
+        """
+        输入线程处理完一帧触摸后调用：立即发送（受最高发送频率限制），并通知GUI线程重绘，
+        GUI线程忙于绘制时发送不受影响。返回值同poll_send
+        """
+        with self.lock:
+            if self.dirty_zones:
+                self.pending_touches.update(self.active_touches)
+                self.send_pending = True
+                self._input_changed.emit()
+        return self.poll_send()
+
+    def send_keepalive(self):
+        with self.lock:
+            if time.perf_counter() - self.last_send_time >= self.keepalive_interval and not self.send_pending:
+                self.send_touch_data(sorted(self.active_touches))
 
-    def send_serial_touch_data(self):
+    def send_touch_data(self, touches):
+        if self.socket_client is not None and self.socket_enabled:
+            self.socket_client.send_touch_data(touches)
         if self.serial_bridge is not None:
-            current_touches = sorted(self.active_touches)
-            if current_touches != self.last_sent_touches:
-                self.serial_bridge.send_touch_data(current_touches)
-                self.serial_bridge.send_touch_data(current_touches)
-                self.last_sent_touches = current_touches
+            self.serial_bridge.send_touch_data(touches)
+        self.last_sent_touches = touches
+        self.last_send_time = time.perf_counter()
 
 class MainWindow(QWidget):
+    base_window_width = 600
+    base_window_height = 700
+    base_canvas_size = 600
+    size_options = {
+        "600x700 (默认)": {"window": (base_window_width, base_window_height), "canvas": base_canvas_size, "factor": 1.0},
+        "1080x1180": {"window": (1080, 1180), "canvas": 1080, "factor": 1080/base_canvas_size},
+        "300x400": {"window": (300, 400), "canvas": 300, "factor": 300/base_canvas_size},
+        "540x600": {"window": (540, 600), "canvas": 540, "factor": 540/base_canvas_size}
+    }
+
     def __init__(self):
         super().__init__()
         self.setWindowTitle("mai2touch PAD")
-        self.base_window_width = 600
-        self.base_window_height = 700
-        self.base_canvas_size = 600
-        self.size_options = {
-            "600x700 (默认)": {"window": (self.base_window_width, self.base_window_height), "canvas": self.base_canvas_size, "factor": 1.0},
-            "1080x1180": {"window": (1080, 1180), "canvas": 1080, "factor": 1080/self.base_canvas_size},
-            "300x400": {"window": (300, 400), "canvas": 300, "factor": 300/self.base_canvas_size},
-            "540x600": {"window": (540, 600), "canvas": 540, "factor": 540/self.base_canvas_size}
-        }
         self.current_size = "600x700 (默认)"
         self.main_layout = QVBoxLayout(self)
         self.main_layout.setSpacing(0)
@@ -466,6 +570,10 @@ class MainWindow(QWidget):
         serial_line.addWidget(self.serial_port_label)
         serial_line.addWidget(self.serial_port_edit)
         serial_line.addWidget(self.serial_port_apply_btn)
+        self.serial_stream_checkbox = QCheckBox("连续发送")
+        self.serial_stream_checkbox.setToolTip("按波特率允许的最高频率持续发送当前状态，与实机控制器一致")
+        self.serial_stream_checkbox.toggled.connect(self.on_serial_stream_toggled)
+        serial_line.addWidget(self.serial_stream_checkbox)
         serial_line.addStretch()
 
         # serial复选框状态变化处理
@@ -487,9 +595,14 @@ class MainWindow(QWidget):
 
         # 第四行：触摸状态
         self.status_label = QLabel("触摸状态: 无")
+        # 录制原始触摸事件，可用gesture_replay.py回放
+        self.record_button = QPushButton("录制手势")
+        self.record_button.setCheckable(True)
+        self.record_button.toggled.connect(self.toggle_recording)
         status_line = QHBoxLayout()
         status_line.addWidget(self.status_label)
         status_line.addStretch()
+        status_line.addWidget(self.record_button)
 
         # 添加到控制面板
         self.control_layout.addLayout(socket_line)
@@ -508,37 +621,31 @@ class MainWindow(QWidget):
         self.main_layout.addWidget(self.content_widget)
         self.main_layout.addWidget(self.control_panel)
         self.apply_size()
+        # 触摸数据在触摸事件中直接发送，这里只定时刷新状态显示
         self.timer = QTimer(self)
         self.timer.timeout.connect(self.update_data)
         self.timer.start(50)
 
-    def is_socket_enabled(self):
-        return self.socket_checkbox.isChecked()
-
     def is_serial_enabled(self):
         return self.serial_checkbox.isChecked()
 
     def init_canvas(self):
-        if hasattr(self, 'touch_widget'):
-            self.content_layout.removeWidget(self.touch_widget)
-            self.touch_widget.deleteLater()
         factor = self.size_options[self.current_size]["factor"]
-        canvas_size = self.size_options[self.current_size]["canvas"]
+        # 画布随窗口自由缩放，控件只创建一次
         self.touch_widget = TouchWidget(
             self, size_factor=factor,
             socket_client=self.socket_client,
-            socket_enabled_func=self.is_socket_enabled,
+            socket_enabled=self.socket_checkbox.isChecked(),
             serial_bridge=self.serial_bridge
         )
-        self.touch_widget.setFixedSize(canvas_size, canvas_size)
+        self.socket_checkbox.toggled.connect(self.touch_widget.set_socket_enabled)
         self.content_layout.addWidget(self.touch_widget)
 
     def apply_size(self):
+        # 预设尺寸只调整窗口大小，画布在后台按新尺寸生成后自动切换
         self.current_size = self.size_combo.currentText()
         size_info = self.size_options[self.current_size]
         self.resize(size_info["window"][0], size_info["window"][1])
-        self.init_canvas()
-        self.setMinimumSize(size_info["window"][0], size_info["window"][1])
 
     def get_touch_data(self):
         if hasattr(self, 'touch_widget'):
@@ -551,9 +658,6 @@ class MainWindow(QWidget):
             self.status_label.setText(f"触摸状态: {sorted(touched_points)}")
         else:
             self.status_label.setText("触摸状态: 无")
-        if hasattr(self, 'touch_widget'):
-            self.touch_widget.send_socket_touch_data()
-            self.touch_widget.send_serial_touch_data()
 
     def apply_socket_port(self):
         port_text = self.socket_port_edit.text().strip()
@@ -565,8 +669,10 @@ class MainWindow(QWidget):
             QMessageBox.warning(self, "端口错误", "请输入有效的端口号 (1~65535)")
             self.socket_port_edit.setText(str(self.socket_port))
             return
-        # 关闭旧socket
+        # 关闭旧socket，先从触摸控件上摘下，输入线程不会再用它发送
         if hasattr(self, 'socket_client') and self.socket_client is not None:
+            if hasattr(self, 'touch_widget'):
+                self.touch_widget.set_socket_client(None)
             self.socket_client.close()
         self.socket_port = port
         self.socket_client = TouchSocketClient(host='localhost', port=port)
@@ -588,7 +694,8 @@ class MainWindow(QWidget):
         self.serial_port = port_text
         if self.serial_checkbox.isChecked():
             # 如果复选框已勾选，重新启动串口
-            self.serial_bridge = SerialBridge(port=self.serial_port, touch_widget=self.touch_widget)
+            self.serial_bridge = SerialBridge(port=self.serial_port, touch_widget=self.touch_widget,
+                                              stream=self.serial_stream_checkbox.isChecked())
             if not self.serial_bridge.start():
                 self.serial_checkbox.setChecked(False)
                 QMessageBox.warning(self, "串口错误", f"无法打开串口 {self.serial_port}")
@@ -599,11 +706,12 @@ class MainWindow(QWidget):
     def on_socket_checkbox_state_changed(self, state):
         # 取消勾选时立刻关闭socket
         if not self.socket_checkbox.isChecked():
+            # 先从触摸控件上摘下（在控件的锁内完成，输入线程不会再用它发送），再关闭
+            if hasattr(self, 'touch_widget'):
+                self.touch_widget.set_socket_client(None)
             if hasattr(self, 'socket_client') and self.socket_client is not None:
                 self.socket_client.close()
                 self.socket_client = None
-            if hasattr(self, 'touch_widget'):
-                self.touch_widget.set_socket_client(None)
         else:
             # 勾选时重启socket（使用当前端口）
             if self.socket_client is None:
@@ -618,10 +726,15 @@ class MainWindow(QWidget):
                 if hasattr(self, 'touch_widget'):
                     self.touch_widget.set_socket_client(self.socket_client)
 
+    def on_serial_stream_toggled(self, checked):
+        if self.serial_bridge is not None:
+            self.serial_bridge.set_stream(checked)
+
     def on_serial_checkbox_state_changed(self, state):
         if self.serial_checkbox.isChecked():
             # 启用串口通信
-            self.serial_bridge = SerialBridge(port=self.serial_port, touch_widget=self.touch_widget)
+            self.serial_bridge = SerialBridge(port=self.serial_port, touch_widget=self.touch_widget,
+                                              stream=self.serial_stream_checkbox.isChecked())
             if not self.serial_bridge.start():
                 self.serial_checkbox.setChecked(False)
                 QMessageBox.warning(self, "串口错误", f"无法打开串口 {self.serial_port}")
@@ -636,7 +749,37 @@ class MainWindow(QWidget):
             if hasattr(self, 'touch_widget'):
                 self.touch_widget.set_serial_bridge(None)
 
+    def toggle_recording(self, recording):
+        if recording:
+            self.touch_widget.recorder = GestureRecording()
+            self.record_button.setText("停止录制")
+            return
+        recorder = self.touch_widget.recorder
+        self.touch_widget.recorder = None
+        self.record_button.setText("录制手势")
+        if recorder is None or not len(recorder):
+            return
+        path, _ = QFileDialog.getSaveFileName(self, "保存手势记录", time.strftime("gesture_%Y%m%d_%H%M%S.mtg"),
+                                              "手势记录 (*.mtg)")
+        if not path:
+            return
+        try:
+            recorder.save(path)
+        except OSError as e:
+            QMessageBox.warning(self, "保存失败", f"无法保存记录: {e}")
+
+    def start_input_source(self, source):
+        """启用直接读取触摸设备的输入源，见touch_input.py"""
+        if not source.start():
+            QMessageBox.warning(self, "触摸输入错误", f"无法打开触摸输入 {source.path}")
+            return False
+        self.touch_widget.input_source = source
+        return True
+
     def closeEvent(self, event):
+        if self.touch_widget.input_source is not None:
+            self.touch_widget.input_source.stop()
+            self.touch_widget.input_source = None
         if hasattr(self, 'socket_client') and self.socket_client is not None:
             self.socket_client.close()
         if hasattr(self, 'serial_bridge') and self.serial_bridge is not None and self.serial_bridge.running:
@@ -644,7 +787,22 @@ class MainWindow(QWidget):
         event.accept()
 
 if __name__ == "__main__":
-    app = QApplication(sys.argv)
+    parser = argparse.ArgumentParser(description='mai2触摸板')
+    parser.add_argument('--evdev', metavar='DEVICE',
+                        help='直接读取Linux多点触摸设备（如 /dev/input/event5），不经过窗口系统')
+    parser.add_argument('--evdev-file', metavar='FILE',
+                        help='回放touch_input.py记录的触摸事件文件，代替触摸设备')
+    parser.add_argument('--evdev-speed', type=float, default=1.0,
+                        help='回放事件文件的倍速，0为尽快回放（默认：1）')
+    args, qt_args = parser.parse_known_args()
+    app = QApplication(sys.argv[:1] + qt_args)
     window = MainWindow()
     window.show()
+    if args.evdev or args.evdev_file:
+        from touch_input import EvdevTouchSource, EventFileSource
+        if args.evdev_file:
+            source = EventFileSource(window.touch_widget, args.evdev_file, speed=args.evdev_speed)
+        else:
+            source = EvdevTouchSource(window.touch_widget, args.evdev)
+        window.start_input_source(source)
     sys.exit(app.exec())
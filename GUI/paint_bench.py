@@ -0,0 +1,165 @@
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import subprocess
+
+# 测试的控件: 名称 -> (模块, 控件类, 提供size_options的窗口类)
+WIDGETS = {
+    'monitor-mai2': ('mai22maitouch_gui', 'TouchWidget', 'MainWindow'),
+    'monitor-mai': ('mai22maitouch_gui', 'TouchWidget_mai', 'MainWindow'),
+    'pad-mai2': ('mai2touch_pad', 'TouchWidget', 'MainWindow'),
+    'pad-mai': ('maitouch_pad', 'TouchWidget', 'MainWindow'),
+}
+
+# 60Hz下一帧的时间预算（毫秒）
+FRAME_BUDGET_MS = 1000 / 60
+
+def generate_states(zone_ids, frames, seed=0):
+    """
+    生成合成的触摸状态序列，每帧一个状态
+
+    混合了单点/多点短触、沿外圈滑动、全部按下/松开三种模式
+    """
+    rng = random.Random(seed)
+    ring = [zone for zone in zone_ids if zone < 10]
+    states = []
+    while len(states) < frames:
+        pattern = rng.random()
+        if pattern < 0.5:
+            # 短触：1~3个区域按下若干帧后松开
+            touched = rng.sample(zone_ids, rng.randint(1, 3))
+            states.extend([touched] * rng.randint(1, 6))
+            states.extend([[]] * rng.randint(1, 4))
+        elif pattern < 0.9:
+            # 滑动：相邻两个区域重叠着沿外圈移动
+            start = rng.randrange(len(ring))
+            for i in range(len(ring)):
+                states.append([ring[(start + i) % len(ring)], ring[(start + i + 1) % len(ring)]])
+        else:
+            # 全部按下再松开，重绘面积最大的情况
+            states.append(list(zone_ids))
+            states.append([])
+    return states[:frames]
+
+def percentile(sorted_values, p):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(p / 100 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+def peak_rss_mb():
+    """当前进程的峰值常驻内存（MB）"""
+    try:
+        import resource
+    except ImportError:
+        # Windows没有resource模块，通过psapi读取峰值工作集
+        import ctypes
+        from ctypes import wintypes
+
+        class PROCESS_MEMORY_COUNTERS(ctypes.Structure):
+            _fields_ = [('cb', wintypes.DWORD), ('PageFaultCount', wintypes.DWORD),
+                        ('PeakWorkingSetSize', ctypes.c_size_t), ('WorkingSetSize', ctypes.c_size_t),
+                        ('QuotaPeakPagedPoolUsage', ctypes.c_size_t), ('QuotaPagedPoolUsage', ctypes.c_size_t),
+                        ('QuotaPeakNonPagedPoolUsage', ctypes.c_size_t), ('QuotaNonPagedPoolUsage', ctypes.c_size_t),
+                        ('PagefileUsage', ctypes.c_size_t), ('PeakPagefileUsage', ctypes.c_size_t)]
+
+        counters = PROCESS_MEMORY_COUNTERS()
+        counters.cb = ctypes.sizeof(counters)
+        ctypes.windll.psapi.GetProcessMemoryInfo(ctypes.windll.kernel32.GetCurrentProcess(),
+                                                 ctypes.byref(counters), counters.cb)
+        return counters.PeakWorkingSetSize / (1024 * 1024)
+    usage = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # macOS单位为字节，Linux为KB
+    return usage / (1024 * 1024) if sys.platform == 'darwin' else usage / 1024
+
+def run_worker(name, frames):
+    """
+    子进程：在offscreen平台上逐个尺寸创建控件并回放触摸状态序列
+
+    每个尺寸输出一行JSON结果，最后一行为进程峰值内存
+    """
+    start = time.perf_counter()
+    from PyQt6.QtWidgets import QApplication
+    app = QApplication.instance() or QApplication(sys.argv[:1])
+    import importlib
+    import touch_sprites
+    from touch_protocol import ZONE_IDS
+    module_name, widget_name, window_name = WIDGETS[name]
+    module = importlib.import_module(module_name)
+    widget_class = getattr(module, widget_name)
+    size_options = getattr(module, window_name).size_options
+    import_ms = (time.perf_counter() - start) * 1000
+    print(json.dumps({'type': 'import', 'ms': import_ms}), flush=True)
+
+    states = generate_states(ZONE_IDS, frames)
+    for option, size_info in size_options.items():
+        # 每个尺寸都从冷缓存开始，得到真实的启动耗时
+        touch_sprites.clear_caches()
+        t = time.perf_counter()
+        widget = widget_class(size_factor=size_info['factor'])
+        widget.resize(size_info['canvas'], size_info['canvas'])
+        widget.show()
+        app.processEvents()
+        startup_ms = (time.perf_counter() - t) * 1000
+
+        # 每帧更新状态后处理事件，等同于一次实际重绘（绘制和提交到后备缓冲区）
+        frame_ms = []
+        for touched_points in states:
+            t = time.perf_counter()
+            widget.set_touched(touched_points)
+            app.processEvents()
+            frame_ms.append((time.perf_counter() - t) * 1000)
+        widget.close()
+        widget.deleteLater()
+        app.processEvents()
+        print(json.dumps({'type': 'size', 'option': option, 'canvas': size_info['canvas'],
+                          'startup_ms': startup_ms, 'frame_ms': frame_ms}), flush=True)
+    print(json.dumps({'type': 'rss', 'peak_mb': peak_rss_mb()}), flush=True)
+
+def report(name, lines):
+    print(f"\n{name}")
+    for result in lines:
+        if result['type'] == 'import':
+            print(f"  导入和QApplication: {result['ms']:.1f}ms")
+        elif result['type'] == 'size':
+            frame_ms = sorted(result['frame_ms'])
+            over = sum(1 for ms in frame_ms if ms > FRAME_BUDGET_MS)
+            print(f"  {result['option']} (画布{result['canvas']}): 启动 {result['startup_ms']:.1f}ms  "
+                  f"每帧(ms) p50={percentile(frame_ms, 50):.3f} p90={percentile(frame_ms, 90):.3f} "
+                  f"p99={percentile(frame_ms, 99):.3f} max={frame_ms[-1]:.3f}  超出一帧: {over}/{len(frame_ms)}")
+        elif result['type'] == 'rss':
+            print(f"  峰值内存: {result['peak_mb']:.1f}MB")
+
+def main():
+    parser = argparse.ArgumentParser(description='无头绘制测试：在各size_options尺寸下回放合成触摸状态，统计每帧绘制耗时')
+    parser.add_argument('-f', '--frames', type=int, default=600,
+                        help='每个尺寸回放的帧数（默认：600）')
+    parser.add_argument('-w', '--widgets', nargs='+', choices=list(WIDGETS), default=list(WIDGETS),
+                        help='要测试的控件（默认：全部）')
+    parser.add_argument('--worker', choices=list(WIDGETS), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        run_worker(args.worker, args.frames)
+        return
+
+    # 每个控件在独立的子进程中测试，启动耗时和峰值内存互不影响
+    env = dict(os.environ, QT_QPA_PLATFORM='offscreen')
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+    for name in args.widgets:
+        result = subprocess.run([sys.executable, os.path.abspath(__file__), '--worker', name, '-f', str(args.frames)],
+                                cwd=script_dir, env=env, capture_output=True, text=True)
+        lines = []
+        for line in result.stdout.splitlines():
+            if line.startswith('{'):
+                lines.append(json.loads(line))
+        if result.returncode != 0:
+            print(f"\n{name} 测试失败:\n{result.stderr}")
+            continue
+        report(name, lines)
+
+if __name__ == '__main__':
+    main()
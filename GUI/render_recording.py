@@ -0,0 +1,197 @@
+import os
+import sys
+import math
+import time
+import zlib
+import struct
+import argparse
+from array import array
+from bisect import bisect_right
+from concurrent.futures import ProcessPoolExecutor
+
+from touch_protocol import load_recording, unpack_zones
+
+GUI_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# 两个面板之间的间隔，与监视器窗口一致
+PANEL_SPACING = 10
+
+# 每段帧中记住的已写出状态数（状态位掩码 -> 帧文件）
+ENCODED_CACHE_SIZE = 256
+
+_app = None
+_panels = None
+_canvas_size = None
+_compress_level = 1
+
+def frame_states(times, states, fps, start, end):
+    """
+    计算每帧要显示的状态位掩码
+
+    与监视器一致：帧内出现过的触摸区域都会显示，一帧内按下又松开的短触不会丢失
+
+    参数:
+        times, states: 记录中的时间戳和状态位掩码
+        start, end: 渲染的时间范围（与times同一时间基准）
+    返回: array('Q')
+    """
+    frame_count = max(1, math.floor((end - start) * fps) + 1)
+    masks = array('Q', bytes(8 * frame_count))
+    j = bisect_right(times, start)
+    current = states[j - 1] if j > 0 else 0
+    for i in range(frame_count):
+        frame_time = start + i / fps
+        shown = current
+        while j < len(times) and times[j] <= frame_time:
+            current = states[j]
+            shown |= current
+            j += 1
+        masks[i] = shown
+    return masks
+
+def encode_png(image, compress_level=1):
+    """
+    将QImage编码为RGB格式的PNG
+
+    不使用行过滤，直接以指定级别zlib压缩；低压缩级别下比QImage.save快数倍，
+    面板图片颜色大块连续，文件大小相差不大
+    """
+    from PyQt6.QtGui import QImage
+    image = image.convertToFormat(QImage.Format.Format_RGB888)
+    width, height, stride = image.width(), image.height(), image.bytesPerLine()
+    raw = image.constBits().asstring(image.sizeInBytes())
+    row_bytes = width * 3
+    # 每行前加过滤类型字节0
+    rows = b''.join(b'\x00' + raw[y * stride:y * stride + row_bytes] for y in range(height))
+
+    def chunk(kind, data):
+        return struct.pack('>I', len(data)) + kind + data + struct.pack('>I', zlib.crc32(kind + data))
+
+    return (b'\x89PNG\r\n\x1a\n' +
+            chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, 8, 2, 0, 0, 0)) +
+            chunk(b'IDAT', zlib.compress(rows, compress_level)) +
+            chunk(b'IEND', b''))
+
+def _init_worker(canvas_size, compress_level):
+    """子进程初始化：创建offscreen的QApplication和两个面板控件"""
+    global _app, _panels, _canvas_size, _compress_level
+    os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+    sys.path.insert(0, GUI_DIR)
+    from PyQt6.QtWidgets import QApplication
+    from mai22maitouch_gui import TouchWidget, TouchWidget_mai
+    _app = QApplication.instance() or QApplication([])
+    # 直接使用监视器的控件，区域位置和精灵与监视器完全一致，精灵来自预渲染图集
+    factor = canvas_size / 600
+    prefix = GUI_DIR + os.sep
+    _panels = [TouchWidget(svg_prefix=prefix, size_factor=factor),
+               TouchWidget_mai(svg_prefix=prefix, size_factor=factor)]
+    for panel in _panels:
+        panel.resize(canvas_size, canvas_size)
+    _canvas_size = canvas_size
+    _compress_level = compress_level
+
+def _encode_frame(mask):
+    from PyQt6.QtGui import QImage, QPainter, QRegion
+    from PyQt6.QtCore import QRect
+    canvas = _canvas_size
+    image = QImage(canvas * 2 + PANEL_SPACING, canvas, QImage.Format.Format_RGB32)
+    image.fill(_panels[0].palette().window().color())
+    painter = QPainter(image)
+    touched_points = unpack_zones(mask)
+    full = QRect(0, 0, canvas, canvas)
+    for i, panel in enumerate(_panels):
+        panel.set_touched(touched_points)
+        painter.save()
+        painter.translate(i * (canvas + PANEL_SPACING), 0)
+        panel.draw(painter, QRegion(full), full)
+        painter.restore()
+    painter.end()
+    return encode_png(image, _compress_level)
+
+def render_chunk(first_index, masks, output_dir):
+    """
+    渲染一段连续的帧
+
+    状态相同的帧不再重复绘制，直接硬链接到已写出的同状态帧，
+    文件系统不支持硬链接时写入已编码的PNG数据
+    返回: (帧数, 实际绘制的帧数)
+    """
+    written = {}   # 状态位掩码 -> (文件路径, PNG数据)
+    rendered = 0
+    for offset, mask in enumerate(masks):
+        path = os.path.join(output_dir, f"frame_{first_index + offset:06d}.png")
+        if os.path.lexists(path):
+            os.remove(path)
+        entry = written.get(mask)
+        if entry is not None:
+            try:
+                os.link(entry[0], path)
+                continue
+            except OSError:
+                data = entry[1]
+        else:
+            data = _encode_frame(mask)
+            rendered += 1
+            if len(written) >= ENCODED_CACHE_SIZE:
+                written.pop(next(iter(written)))
+            written[mask] = (path, data)
+        with open(path, 'wb') as f:
+            f.write(data)
+    return len(masks), rendered
+
+def main():
+    parser = argparse.ArgumentParser(description='将触摸记录渲染为监视器mai2/mai面板的PNG图片序列')
+    parser.add_argument('recording', help='触摸记录文件（监视器"保存记录"生成）')
+    parser.add_argument('-o', '--output', default='frames',
+                        help='输出目录（默认：frames）')
+    parser.add_argument('-r', '--fps', type=float, default=60,
+                        help='帧率（默认：60）')
+    parser.add_argument('-s', '--size', type=int, default=600,
+                        help='每个面板的画布尺寸（默认：600）')
+    parser.add_argument('--start', type=float, default=0,
+                        help='从记录开始后第几秒开始渲染（默认：0）')
+    parser.add_argument('--duration', type=float, default=None,
+                        help='渲染时长，秒（默认：到记录结束）')
+    parser.add_argument('-j', '--jobs', type=int, default=None,
+                        help='并行进程数（默认：CPU核心数）')
+    parser.add_argument('-c', '--compress-level', type=int, default=1, choices=range(10), metavar='0-9',
+                        help='PNG的zlib压缩级别，越高文件越小、编码越慢（默认：1）')
+    args = parser.parse_args()
+
+    try:
+        times, states = load_recording(args.recording)
+    except (OSError, ValueError) as e:
+        print(f"无法读取记录: {e}")
+        return 1
+    if not times:
+        print("记录为空")
+        return 1
+
+    start = times[0] + args.start
+    end = times[-1] if args.duration is None else start + args.duration
+    masks = frame_states(times, states, args.fps, start, end)
+    os.makedirs(args.output, exist_ok=True)
+
+    # 按连续的帧段分给各进程，段内相同状态的帧可以复用编码结果
+    jobs = args.jobs or os.cpu_count() or 1
+    chunk_size = max(1, math.ceil(len(masks) / (jobs * 4)))
+    chunks = [(i, masks[i:i + chunk_size]) for i in range(0, len(masks), chunk_size)]
+
+    begin = time.perf_counter()
+    total = rendered = 0
+    with ProcessPoolExecutor(max_workers=jobs, initializer=_init_worker,
+                             initargs=(args.size, args.compress_level)) as pool:
+        futures = [pool.submit(render_chunk, first, chunk, args.output) for first, chunk in chunks]
+        for future in futures:
+            count, unique = future.result()
+            total += count
+            rendered += unique
+    elapsed = time.perf_counter() - begin
+
+    duration = (len(masks) - 1) / args.fps
+    print(f"渲染完成: {total} 帧 (实际绘制 {rendered} 帧), 记录时长 {duration:.1f}s, "
+          f"耗时 {elapsed:.1f}s, {duration / elapsed if elapsed > 0 else 0:.1f}倍实时")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,11 +1,20 @@
+import os
 import socket
 import time
+import random
+import asyncio
+import argparse
+from array import array
+from touch_protocol import (TouchDatagramEncoder, SEQ_MASK, ZONE_IDS, encode_mai2_serial,
+                            encode_stats_request, decode_stats_reply)
 
 class TouchSocketClient:
-    def __init__(self, host='localhost', port=8888):
+    def __init__(self, host='localhost', port=8888, verbose=True):
         self.host = host
         self.port = port
+        self.verbose = verbose
         self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.encoder = TouchDatagramEncoder()
         print(f"Touch socket client initialized, sending to {host}:{port}")
         
     def send_touch_data(self, touched_points):
@@ -13,10 +22,11 @@ class TouchSocketClient:
         发送触摸数据
         touched_points: 被触摸的点ID列表，如 [1, 2, 11, 12]
         """
-        # 直接将整数列表转换为字节数组
-        data = bytes(touched_points)
+        # 编码为带序号和发送时间的数据报
+        data = self.encoder.encode(touched_points)
         self.socket.sendto(data, (self.host, self.port))
-        print(f"Sent data: {touched_points}")
+        if self.verbose:
+            print(f"Sent data #{(self.encoder.seq - 1) & SEQ_MASK}: {touched_points}")
         
     def close(self):
         self.socket.close()
@@ -43,6 +53,13 @@ def parse_input(input_str):
         print("错误: 输入包含非数字字符")
         return None
 
+# auto模式循环的触摸点序列
+AUTO_SEQUENCE = [
+    31,1,32,2,33,3,34,4,35,5,36,6,37,7,38,8,
+    41,11,42,12,43,13,44,14,45,15,46,16,47,17,48,18,
+    21,22
+]
+
 def auto_mode_single(client, interval=0.1, reverse=False):
     """
     自动模式：依次发送单个触摸点
@@ -50,25 +67,10 @@ def auto_mode_single(client, interval=0.1, reverse=False):
     mode_name = "倒序单点" if reverse else "顺序单点"
     print(f"进入{mode_name}模式，按Ctrl+C中断")
     
-    # 定义要循环的触摸点序列
-    touch_sequence = [
-        31,1,32,2,33,3,34,4,35,5,36,6,37,7,38,8,
-        41,11,42,12,43,13,44,14,45,15,46,16,47,17,48,18,
-        21,22
-    ]
-    
-    if reverse:
-        touch_sequence = touch_sequence[::-1]  # 反转序列
-    
-    try:
-        while True:
-            for point in touch_sequence:
-                client.send_touch_data([point])
-                time.sleep(interval)
-                    
-    except KeyboardInterrupt:
-        print(f"\n{mode_name}模式已中断")
-        client.send_touch_data([])  # 清空所有触摸点
+    touch_sequence = AUTO_SEQUENCE[::-1] if reverse else AUTO_SEQUENCE
+    timeline = [(i * interval, [point]) for i, point in enumerate(touch_sequence)]
+    play_timeline(timeline, len(timeline) * interval, [client], loops=0)
+    print(f"{mode_name}模式已中断")
 
 def auto_mode_double(client, interval=0.1, reverse=False):
     """
@@ -77,28 +79,11 @@ def auto_mode_double(client, interval=0.1, reverse=False):
     mode_name = "倒序重叠双点" if reverse else "顺序重叠双点"
     print(f"进入{mode_name}模式，按Ctrl+C中断")
     
-    # 定义要循环的触摸点序列
-    touch_sequence = [
-        31,1,32,2,33,3,34,4,35,5,36,6,37,7,38,8,
-        41,11,42,12,43,13,44,14,45,15,46,16,47,17,48,18,
-        21,22
-    ]
-    
-    if reverse:
-        touch_sequence = touch_sequence[::-1]  # 反转序列
-    
-    try:
-        while True:
-            # 重叠双点模式: [31,1] -> [1,32] -> [32,2] -> ...
-            for i in range(len(touch_sequence) - 1):
-                point1 = touch_sequence[i]
-                point2 = touch_sequence[i + 1]
-                client.send_touch_data([point1, point2])
-                time.sleep(interval)
-                    
-    except KeyboardInterrupt:
-        print(f"\n{mode_name}模式已中断")
-        client.send_touch_data([])  # 清空所有触摸点
+    touch_sequence = AUTO_SEQUENCE[::-1] if reverse else AUTO_SEQUENCE
+    timeline = [(i * interval, [touch_sequence[i], touch_sequence[i + 1]])
+                for i in range(len(touch_sequence) - 1)]
+    play_timeline(timeline, len(timeline) * interval, [client], loops=0)
+    print(f"{mode_name}模式已中断")
 
 def parse_auto_command(command):
     """
@@ -124,14 +109,397 @@ def parse_auto_command(command):
         print("错误: 无效的auto模式参数")
         return None, None
 
+# 谱面脚本中的区域名 -> 触摸点ID，如 A1 -> 1、B1 -> 11、D1 -> 31；C为C1和C2
+ZONE_NAMES = {f"{'ABCDE'[point // 10]}{point % 10}": point for point in ZONE_IDS}
+
+def parse_zones(text):
+    """解析逗号分隔的区域名或触摸点ID，如 "A1,B1"、"C"、"31" """
+    points = []
+    for name in text.upper().split(','):
+        if name == 'C':
+            points.extend((21, 22))
+        elif name in ZONE_NAMES:
+            points.append(ZONE_NAMES[name])
+        elif name.isdigit() and int(name) in ZONE_IDS:
+            points.append(int(name))
+        else:
+            raise ValueError(f"未知的触摸区域: {name}")
+    return points
+
+def parse_beats(text):
+    """解析拍数，支持小数和分数，如 0.5、1/4"""
+    if '/' in text:
+        numerator, denominator = text.split('/', 1)
+        value = float(numerator) / float(denominator)
+    else:
+        value = float(text)
+    if value < 0:
+        raise ValueError(f"拍数不能为负: {text}")
+    return value
+
+def compile_chart(text):
+    """
+    将谱面脚本编译为按时间排列的触摸状态
+
+    脚本每行一条指令，#之后为注释，同一行中用分号分隔同时开始的音符：
+        bpm 150              之后的拍数按该BPM换算（默认120）
+        taplen 50            tap的按下时长，毫秒（默认50）
+        rest 1/2             当前时间前进若干拍（也可写作wait）
+        tap A1,B1            在当前时间点按区域
+        hold A1 2            按住区域若干拍
+        slide A1>A2>A3 1     在若干拍内依次划过各区域，相邻区域按下时间重叠，不会出现全部松开的间隙
+    音符不推进时间，连续的音符之间用rest分隔
+
+    返回: ([(秒, 触摸点ID列表)], 总时长秒)，只包含状态变化的时间点，最后一个状态为全部松开
+    """
+    bpm = 120.0
+    tap_length = 0.05
+    cursor = 0.0
+    end = 0.0
+    changes = []   # (秒, +1/-1, 触摸点ID)
+    for line_number, line in enumerate(text.splitlines(), 1):
+        line = line.split('#', 1)[0].strip()
+        if not line:
+            continue
+        try:
+            for note in line.split(';'):
+                parts = note.split()
+                if not parts:
+                    continue
+                command = parts[0].lower()
+                args = parts[1:]
+                expected = {'bpm': 1, 'taplen': 1, 'rest': 1, 'wait': 1, 'tap': 1, 'hold': 2, 'slide': 2}.get(command)
+                if expected is None:
+                    raise ValueError(f"未知的指令: {parts[0]}")
+                if len(args) != expected:
+                    raise ValueError(f"{command} 需要 {expected} 个参数")
+                if command == 'bpm':
+                    bpm = float(args[0])
+                    if bpm <= 0:
+                        raise ValueError("BPM必须大于0")
+                elif command == 'taplen':
+                    tap_length = float(args[0]) / 1000
+                    if tap_length <= 0:
+                        raise ValueError("taplen必须大于0")
+                elif command in ('rest', 'wait'):
+                    cursor += parse_beats(args[0]) * 60 / bpm
+                elif command == 'slide':
+                    points = [parse_zones(name) for name in args[0].split('>')]
+                    length = parse_beats(args[1]) * 60 / bpm
+                    step = length / len(points)
+                    for i, group in enumerate(points):
+                        for point in group:
+                            changes.append((cursor + i * step, 1, point))
+                            changes.append((cursor + min(length, (i + 1.5) * step), -1, point))
+                    end = max(end, cursor + length)
+                else:
+                    length = tap_length if command == 'tap' else parse_beats(args[1]) * 60 / bpm
+                    for point in parse_zones(args[0]):
+                        changes.append((cursor, 1, point))
+                        changes.append((cursor + length, -1, point))
+                    end = max(end, cursor + length)
+        except ValueError as e:
+            raise ValueError(f"第{line_number}行: {e}") from None
+    end = max(end, cursor)
+
+    # 按引用计数合并重叠的音符，同一时刻的变化合并为一个状态
+    changes.sort()
+    counts = {}
+    timeline = []
+    i = 0
+    while i < len(changes):
+        t = changes[i][0]
+        while i < len(changes) and changes[i][0] == t:
+            _, delta, point = changes[i]
+            counts[point] = counts.get(point, 0) + delta
+            i += 1
+        state = sorted(point for point, count in counts.items() if count > 0)
+        if not timeline or timeline[-1][1] != state:
+            timeline.append((t, state))
+    return timeline, end
+
+# 距截止时间小于此值（秒）时不再sleep，改为忙等，避免sleep的唤醒延迟
+SPIN_THRESHOLD = 0.002
+
+def wait_until(deadline):
+    remaining = deadline - time.perf_counter()
+    if remaining > SPIN_THRESHOLD:
+        time.sleep(remaining - SPIN_THRESHOLD)
+    while time.perf_counter() < deadline:
+        pass
+
+class SerialSink:
+    """将触摸状态编码为mai2串口格式写入串口（不等待STAT，直接发送）"""
+
+    def __init__(self, port, baudrate=9600):
+        import serial
+        self.serial = serial.Serial(port, baudrate)
+        print(f"Serial output on {port} @ {baudrate}")
+
+    def send_touch_data(self, touched_points):
+        self.serial.write(encode_mai2_serial(touched_points))
+
+    def close(self):
+        self.serial.close()
+
+class PtySink:
+    """
+    创建伪终端，将mai2串口格式写入主端，转换程序可以打开从端当作串口；
+    从端没有被读取时丢弃写不下的帧，不阻塞播放
+    """
+
+    def __init__(self):
+        import tty
+        self.master, self.slave = os.openpty()
+        tty.setraw(self.slave)
+        os.set_blocking(self.master, False)
+        self.dropped = 0
+        print(f"Pty output on {os.ttyname(self.slave)}")
+
+    def send_touch_data(self, touched_points):
+        try:
+            os.write(self.master, encode_mai2_serial(touched_points))
+        except BlockingIOError:
+            self.dropped += 1
+
+    def close(self):
+        if self.dropped:
+            print(f"Pty: 丢弃了 {self.dropped} 帧（从端未被读取）")
+        os.close(self.master)
+        os.close(self.slave)
+
+def play_timeline(timeline, duration, sinks, loops=1):
+    """
+    按绝对截止时间播放触摸状态：第k轮第i个状态在 开始时间 + k*时长 + 时间点 发送，
+    每次的误差不会累积；落后于计划时立即发送，不跳过状态。按Ctrl+C中断
+
+    参数:
+        loops: 播放轮数，0为无限循环
+    返回: 每次发送相对截止时间的延迟（秒），array('d')
+    """
+    lateness = array('d')
+    if not timeline or (loops == 0 and duration <= 0):
+        return lateness
+    start = time.perf_counter() + 0.01
+    loop = 0
+    try:
+        while loops == 0 or loop < loops:
+            base = start + loop * duration
+            for t, state in timeline:
+                deadline = base + t
+                wait_until(deadline)
+                lateness.append(time.perf_counter() - deadline)
+                for sink in sinks:
+                    sink.send_touch_data(state)
+            loop += 1
+    except KeyboardInterrupt:
+        print()
+        for sink in sinks:
+            sink.send_touch_data([])  # 清空所有触摸点
+    report_jitter(lateness)
+    return lateness
+
+def report_jitter(lateness):
+    """输出发送时刻相对截止时间的延迟统计"""
+    if not lateness:
+        return
+    values = sorted(lateness)
+    count = len(values)
+    def at(p):
+        return values[min(count - 1, int(round(p / 100 * (count - 1))))] * 1e6
+    late = sum(1 for value in values if value > 0.001)
+    print(f"发送 {count} 次, 相对截止时间的延迟(us): 平均={sum(values) / count * 1e6:.1f} "
+          f"p50={at(50):.1f} p99={at(99):.1f} max={values[-1] * 1e6:.1f}, 超过1ms {late} 次")
+
+def play_chart(path, sinks, loops=1):
+    """读取谱面脚本并播放"""
+    try:
+        with open(path, encoding='utf-8') as f:
+            timeline, duration = compile_chart(f.read())
+    except (OSError, ValueError) as e:
+        print(f"无法读取谱面: {e}")
+        return False
+    print(f"播放 {path}: {len(timeline)} 个状态, 时长 {duration:.2f}s, "
+          f"{'无限循环' if loops == 0 else f'{loops} 轮'}，按Ctrl+C中断")
+    play_timeline(timeline, duration, sinks, loops)
+    return True
+
+# 压力测试的触摸状态模式
+LOAD_PATTERNS = ('random', 'ring', 'tap')
+
+def load_states(pattern, rng):
+    """
+    无限生成压力测试用的触摸状态
+
+    random: 随机0~3个区域
+    ring: 相邻两个区域重叠着沿外圈移动，同auto 2
+    tap: 随机单个区域按下、松开交替
+    """
+    ring = [31, 1, 32, 2, 33, 3, 34, 4, 35, 5, 36, 6, 37, 7, 38, 8]
+    i = rng.randrange(len(ring))
+    while True:
+        if pattern == 'random':
+            yield rng.sample(ZONE_IDS, rng.randint(0, 3))
+        elif pattern == 'ring':
+            yield [ring[i % len(ring)], ring[(i + 1) % len(ring)]]
+            i += 1
+        else:
+            yield [rng.choice(ZONE_IDS)]
+            yield []
+
+class LoadSenderProtocol(asyncio.DatagramProtocol):
+    """压力测试中一个发送端的数据报端点，同时接收统计回复"""
+
+    def __init__(self):
+        self.transport = None
+        self.errors = 0
+        self.replies = {}   # 令牌 -> Future
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def datagram_received(self, data, addr):
+        reply = decode_stats_reply(data)
+        if reply is not None:
+            future = self.replies.pop(reply[0], None)
+            if future is not None and not future.done():
+                future.set_result(reply[1])
+
+    def error_received(self, exc):
+        # 接收端未监听时会收到ICMP端口不可达
+        self.errors += 1
+
+async def query_stats(protocol, token, timeout=1.0):
+    """向接收端查询累计统计，接收端不支持或无响应时返回None"""
+    future = asyncio.get_running_loop().create_future()
+    protocol.replies[token] = future
+    protocol.transport.sendto(encode_stats_request(token))
+    try:
+        return await asyncio.wait_for(future, timeout)
+    except asyncio.TimeoutError:
+        protocol.replies.pop(token, None)
+        return None
+
+async def run_sender(protocol, encoder, states, rate, start, end, counter):
+    """
+    按固定速率发送，发送时刻由绝对截止时间决定，不会因为sleep精度累积误差；
+    落后于计划时一次补发所有到期的数据报
+    """
+    loop = asyncio.get_running_loop()
+    interval = 1.0 / rate
+    sent = 0
+    while True:
+        now = loop.time()
+        if now >= end:
+            break
+        due = min(int((now - start) / interval) + 1, int((end - start) / interval) + 1)
+        while sent < due:
+            protocol.transport.sendto(encoder.encode(next(states)))
+            sent += 1
+        await asyncio.sleep(max(0.0, start + sent * interval - loop.time()))
+    counter[0] += sent
+
+async def run_load(host, port, senders, rate, duration, pattern, redundancy, seed):
+    """
+    模拟多个并发发送端，每个发送端使用独立的socket（独立的源端口和序号）
+
+    返回: 统计字典
+    """
+    loop = asyncio.get_running_loop()
+    endpoints = []
+    for _ in range(senders):
+        transport, protocol = await loop.create_datagram_endpoint(LoadSenderProtocol, remote_addr=(host, port))
+        endpoints.append(protocol)
+
+    before = await query_stats(endpoints[0], 1)
+    counter = [0]
+    start = loop.time() + 0.05
+    end = start + duration
+    tasks = []
+    for i, protocol in enumerate(endpoints):
+        rng = random.Random(seed + i)
+        # 各发送端错开起始时间，避免所有数据报同时到达
+        offset = rng.random() / (rate / senders)
+        tasks.append(run_sender(protocol, TouchDatagramEncoder(redundancy), load_states(pattern, rng),
+                                rate / senders, start + offset, end, counter))
+    await asyncio.gather(*tasks)
+    elapsed = loop.time() - start
+
+    # 等接收端处理完缓冲区中的数据再查询
+    await asyncio.sleep(0.2)
+    after = await query_stats(endpoints[0], 2)
+    errors = sum(protocol.errors for protocol in endpoints)
+    for protocol in endpoints:
+        protocol.transport.close()
+
+    result = {'sent': counter[0], 'elapsed': elapsed, 'errors': errors, 'receiver': None}
+    if before is not None and after is not None:
+        result['receiver'] = {field: after[field] - before[field] for field in after}
+    return result
+
+def load_mode(host, port, senders, rate, duration, pattern, redundancy=0, seed=0):
+    """压力测试模式：输出实际发送速率，接收端回复统计时输出处理与丢弃数量"""
+    print(f"压力测试: {senders} 个发送端, 目标 {rate:.0f} 包/秒, {duration:.1f}秒, 模式 {pattern}")
+    result = asyncio.run(run_load(host, port, senders, rate, duration, pattern, redundancy, seed))
+    print(f"已发送: {result['sent']} 包, 实际速率 {result['sent'] / result['elapsed']:.0f} 包/秒")
+    if result['errors']:
+        print(f"发送错误: {result['errors']} (接收端可能未监听)")
+    receiver = result['receiver']
+    if receiver is None:
+        print("接收端未回复统计")
+        return
+    dropped = result['sent'] - receiver['received']
+    print(f"接收端收到: {receiver['received']} 包, 应用状态 {receiver['applied']} 个")
+    print(f"丢弃: {dropped} 包 ({dropped / result['sent'] * 100 if result['sent'] else 0:.2f}%), "
+          f"其中冗余补回 {receiver['recovered']} 个状态, 未能补回 {receiver['lost']} 个, 过期 {receiver['late']} 包")
+
 # 使用示例
 if __name__ == "__main__":
-    client = TouchSocketClient()
+    parser = argparse.ArgumentParser(description='触摸点测试客户端，不带参数时进入交互模式')
+    parser.add_argument('--host', default='localhost', help='接收端地址（默认：localhost）')
+    parser.add_argument('-p', '--port', type=int, default=8888, help='接收端端口（默认：8888）')
+    parser.add_argument('--load', action='store_true', help='压力测试模式')
+    parser.add_argument('-n', '--senders', type=int, default=16, help='压力测试的并发发送端数（默认：16）')
+    parser.add_argument('-r', '--rate', type=float, default=2000, help='压力测试的总发送速率，包/秒（默认：2000）')
+    parser.add_argument('-d', '--duration', type=float, default=5, help='压力测试时长，秒（默认：5）')
+    parser.add_argument('--pattern', choices=LOAD_PATTERNS, default='random', help='压力测试的触摸状态模式（默认：random）')
+    parser.add_argument('--redundancy', type=int, default=0,
+                        help='压力测试中每个数据报附带的历史状态数（默认：0，便于观察丢包）')
+    parser.add_argument('--play', metavar='SCRIPT', default=None, help='播放谱面脚本后退出')
+    parser.add_argument('--loop', type=int, default=1, help='谱面播放轮数，0为无限循环（默认：1）')
+    parser.add_argument('--serial', default=None, help='谱面以mai2串口格式从该串口输出，代替数据报')
+    parser.add_argument('--pty', action='store_true', help='谱面以mai2串口格式从新建的伪终端输出，代替数据报')
+    parser.add_argument('--baud', type=int, default=9600, help='串口波特率（默认：9600）')
+    args = parser.parse_args()
+
+    if args.load:
+        load_mode(args.host, args.port, args.senders, args.rate, args.duration, args.pattern, args.redundancy)
+        raise SystemExit
+
+    if args.play:
+        sinks = []
+        try:
+            if args.serial:
+                sinks.append(SerialSink(args.serial, args.baud))
+            if args.pty:
+                sinks.append(PtySink())
+        except Exception as e:
+            print(f"无法打开输出: {e}")
+            raise SystemExit(1)
+        if not sinks:
+            sinks.append(TouchSocketClient(host=args.host, port=args.port, verbose=False))
+        ok = play_chart(args.play, sinks, args.loop)
+        for sink in sinks:
+            sink.close()
+        raise SystemExit(0 if ok else 1)
+
+    client = TouchSocketClient(host=args.host, port=args.port)
     
     print("触摸点测试客户端")
     print("输入格式说明:")
     print("- 输入数字，用逗号或空格分隔，如: 1,2,3 或 1 2 3")
     print("- 输入'auto': 自动测试")
+    print("- 输入'play 文件': 播放谱面脚本")
     print("- 输入空行或'clear': 清空所有触摸点")
     print("- 输入'q': 退出程序")
     print("- 输入'help': 显示帮助")
@@ -151,6 +519,7 @@ if __name__ == "__main__":
                 print("    auto -1: 倒序单点")
                 print("    auto 2: 重叠双点 ([31,1]→[1,32]→[32,2])")
                 print("    auto -2: 倒序重叠双点")
+                print("  谱面: play 文件 [轮数]")
                 print("  清空: clear, c, 或直接回车")
                 print("  退出: q, quit, exit")
                 continue
@@ -173,6 +542,17 @@ if __name__ == "__main__":
                 else:
                     print("错误: 不支持的auto模式，支持1或2")
                 continue
+            elif user_input.lower().startswith('play '):
+                parts = user_input.split()
+                try:
+                    loops = int(parts[2]) if len(parts) > 2 else 1
+                except ValueError:
+                    print("错误: 无效的轮数")
+                    continue
+                client.verbose = False
+                play_chart(parts[1], [client], loops)
+                client.verbose = True
+                continue
             
             # 解析用户输入
             points = parse_input(user_input)
@@ -0,0 +1,168 @@
+import os
+import sys
+import json
+import math
+import zlib
+import time
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+
+# touch_sprites位于上一级GUI目录
+SVG_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(SVG_DIR))
+
+from touch_sprites import (MAI2_TOUCH_POINTS, MAI_TOUCH_POINTS, MAI2_SPRITE_SCALE, MAI_SPRITE_SCALE,
+                           ATLAS_DIR, ATLAS_MANIFEST, ATLAS_VERSION, BASE_CANVAS_SIZE, scale_touch_points, zone_rect)
+
+# 各GUI和触摸板size_options中用到的画布尺寸
+DEFAULT_SIZES = [300, 340, 500, 540, 600, 1080]
+
+# 精灵组: 名称 -> (区域表, 缩放比例, 文件名格式)
+SPRITE_SETS = {
+    'mai2': (MAI2_TOUCH_POINTS, MAI2_SPRITE_SCALE, '{label}{suffix}.svg'),
+    'mai': (MAI_TOUCH_POINTS, MAI_SPRITE_SCALE, 'mai_{label}{suffix}.svg'),
+}
+
+# 图集中精灵之间的间隔（像素）
+PADDING = 1
+
+_app = None
+
+def _init_worker():
+    """子进程初始化：渲染SVG需要QGuiApplication，构建时不需要显示窗口"""
+    global _app
+    os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+    from PyQt6.QtGui import QGuiApplication
+    _app = QGuiApplication.instance() or QGuiApplication([])
+
+def pack_sprites(sizes):
+    """
+    按高度排序后逐行摆放精灵
+
+    参数:
+        sizes: [(宽, 高)] 列表
+    返回: (图集宽, 图集高, [(x, y)])，顺序与输入一致
+    """
+    total_area = sum((w + PADDING) * (h + PADDING) for w, h in sizes)
+    atlas_width = max(max(w for w, h in sizes) + PADDING, math.ceil(math.sqrt(total_area) / 64) * 64)
+    order = sorted(range(len(sizes)), key=lambda i: sizes[i][1], reverse=True)
+    positions = [None] * len(sizes)
+    x = y = row_height = 0
+    for i in order:
+        w, h = sizes[i]
+        if x + w > atlas_width:
+            x = 0
+            y += row_height + PADDING
+            row_height = 0
+        positions[i] = (x, y)
+        x += w + PADDING
+        row_height = max(row_height, h)
+    return atlas_width, y + row_height, positions
+
+def build_canvas_atlas(canvas_size, output_dir):
+    """渲染一个画布尺寸下所有精灵组的未触摸/触摸精灵，写入一张图集，返回清单条目"""
+    from PyQt6.QtGui import QImage, QPainter
+    from PyQt6.QtCore import Qt, QRectF
+    from PyQt6.QtSvg import QSvgRenderer
+
+    size_factor = canvas_size / BASE_CANVAS_SIZE
+    renderers = {}
+    view_boxes = {}
+    sprites = {}
+    zones = {}
+    for set_name, (touch_points, sprite_scale, name_format) in SPRITE_SETS.items():
+        zones[set_name] = []
+        for point, (center_x, center_y, label, *_) in scale_touch_points(touch_points, size_factor).items():
+            files = [name_format.format(label=label, suffix=suffix) for suffix in ('', '_touch')]
+            for name in files:
+                if name not in renderers:
+                    renderers[name] = QSvgRenderer(os.path.join(SVG_DIR, name))
+                    view_box = renderers[name].viewBoxF()
+                    view_boxes[name] = [view_box.width(), view_box.height()]
+            rect = zone_rect(center_x, center_y, view_boxes[files[0]], sprite_scale, size_factor)
+            for name in files:
+                sprites[(name, rect[2], rect[3])] = None
+            zones[set_name].append({'id': point, 'label': label, 'center': [center_x, center_y], 'rect': list(rect)})
+
+    keys = list(sprites)
+    atlas_width, atlas_height, positions = pack_sprites([(w, h) for name, w, h in keys])
+    atlas = QImage(atlas_width, atlas_height, QImage.Format.Format_ARGB32_Premultiplied)
+    assert atlas.bytesPerLine() == atlas_width * 4
+    atlas.fill(Qt.GlobalColor.transparent)
+    painter = QPainter(atlas)
+    painter.setRenderHint(QPainter.RenderHint.Antialiasing)
+    for (name, w, h), (x, y) in zip(keys, positions):
+        # 与运行时渲染方式一致：每个精灵单独裁剪，避免越界绘制到相邻精灵
+        painter.save()
+        painter.setClipRect(x, y, w, h)
+        renderers[name].render(painter, QRectF(x, y, w, h))
+        painter.restore()
+    painter.end()
+
+    # 图集保存为zlib压缩的预乘ARGB32原始像素，运行时解压后即可直接使用，
+    # 比解码PNG再转换像素格式更快
+    image_name = f"atlas_{canvas_size}.bin"
+    with open(os.path.join(output_dir, image_name), 'wb') as f:
+        f.write(zlib.compress(atlas.constBits().asstring(atlas.sizeInBytes()), 9))
+    return {
+        'canvas': canvas_size,
+        'image': image_name,
+        'width': atlas_width,
+        'height': atlas_height,
+        'sprites': [{'file': name, 'width': w, 'height': h, 'x': x, 'y': y}
+                    for (name, w, h), (x, y) in zip(keys, positions)],
+        'zones': zones,
+    }, view_boxes
+
+def recolor_sources():
+    """
+    使用svg.py/mai_svg.py重新生成各区域的触摸状态SVG
+
+    返回: 是否所有区域都生成成功，有区域没有匹配到要替换的颜色时为False
+    """
+    import svg
+    import mai_svg
+    ok = True
+    for set_name, (touch_points, sprite_scale, name_format) in SPRITE_SETS.items():
+        module = mai_svg if set_name == 'mai' else svg
+        processed = sum(module.replace_svg_color(os.path.join(SVG_DIR, name_format.format(label=label, suffix='')))
+                        for center_x, center_y, label, *_ in touch_points.values())
+        if processed != len(touch_points):
+            print(f"错误：{set_name} 的 {len(touch_points)} 个区域中只有 {processed} 个生成了触摸状态SVG")
+            ok = False
+    return ok
+
+def main():
+    parser = argparse.ArgumentParser(description='将各触摸区域SVG预渲染为图集，供GUI和触摸板启动时直接读取')
+    parser.add_argument('-s', '--sizes', type=int, nargs='+', default=DEFAULT_SIZES,
+                        help=f'需要预渲染的画布尺寸（默认：{" ".join(map(str, DEFAULT_SIZES))}）')
+    parser.add_argument('-j', '--jobs', type=int, default=None,
+                        help='并行进程数（默认：CPU核心数）')
+    parser.add_argument('--recolor', action='store_true',
+                        help='构建前先用svg.py/mai_svg.py重新生成触摸状态SVG')
+    args = parser.parse_args()
+
+    if args.recolor and not recolor_sources():
+        return 1
+
+    output_dir = os.path.join(SVG_DIR, ATLAS_DIR)
+    os.makedirs(output_dir, exist_ok=True)
+
+    start = time.perf_counter()
+    sizes = sorted(set(args.sizes))
+    with ProcessPoolExecutor(max_workers=args.jobs, initializer=_init_worker) as pool:
+        results = list(pool.map(build_canvas_atlas, sizes, [output_dir] * len(sizes)))
+
+    manifest = {'version': ATLAS_VERSION, 'base_canvas': BASE_CANVAS_SIZE, 'view_boxes': {}, 'atlases': []}
+    for atlas, view_boxes in results:
+        manifest['view_boxes'].update(view_boxes)
+        manifest['atlases'].append(atlas)
+        print(f"{atlas['image']}: {len(atlas['sprites'])} 个精灵, {atlas['width']}x{atlas['height']}")
+
+    with open(os.path.join(output_dir, ATLAS_MANIFEST), 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, separators=(',', ':'))
+
+    print(f"\n构建完成！共 {len(results)} 张图集，耗时 {time.perf_counter() - start:.2f}s")
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -5,7 +5,11 @@ from pathlib import Path
 
 def replace_svg_color(input_path, output_suffix="_touch"):
     """
-    处理SVG文件：将fill:#000000替换为fill:#00ff00
+    处理SVG文件：将黑色填充改为绿色
+    fill:#000000替换为fill:#00ff00，没有fill属性（默认黑色）的path加上fill="#0f0"
+    
+    Returns:
+        成功处理的文件数
     
     Args:
         input_path: 输入路径（文件或文件夹）
@@ -21,11 +25,11 @@ def replace_svg_color(input_path, output_suffix="_touch"):
                     if f.lower().endswith('.svg')]
     else:
         print(f"错误：{input_path} 不是有效的文件或文件夹")
-        return
+        return 0
     
     if not svg_files:
         print("未找到SVG文件")
-        return
+        return 0
     
     processed_count = 0
     
@@ -39,6 +43,8 @@ def replace_svg_color(input_path, output_suffix="_touch"):
             # 匹配 fill:#000000 或 fill: #000000（可能有空格）
             pattern = r'fill:\s*#000000'
             new_content = re.sub(pattern, 'fill:#00ff00', content)
+            # 旧框SVG中的触摸区域是没有fill属性的path
+            new_content = re.sub(r'<path d="([^"]*)"/>', r'<path d="\1" fill="#0f0"/>', new_content)
             
             # 如果内容有变化，则保存新文件
             if new_content != content:
@@ -59,6 +65,7 @@ def replace_svg_color(input_path, output_suffix="_touch"):
             print(f"处理文件 {svg_file} 时出错：{str(e)}")
     
     print(f"\n处理完成！共成功处理 {processed_count} 个文件")
+    return processed_count
 
 def main():
     parser = argparse.ArgumentParser(description='批量替换SVG文件中的颜色代码')
@@ -21,11 +21,11 @@ def replace_svg_color(input_path, output_suffix="_touch"):
                     if f.lower().endswith('.svg')]
     else:
         print(f"错误：{input_path} 不是有效的文件或文件夹")
-        return
+        return 0
     
     if not svg_files:
         print("未找到SVG文件")
-        return
+        return 0
     
     processed_count = 0
     
@@ -59,6 +59,7 @@ def replace_svg_color(input_path, output_suffix="_touch"):
             print(f"处理文件 {svg_file} 时出错：{str(e)}")
     
     print(f"\n处理完成！共成功处理 {processed_count} 个文件")
+    return processed_count
 
 def main():
     parser = argparse.ArgumentParser(description='批量替换SVG文件中的颜色代码')
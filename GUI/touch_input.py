@@ -0,0 +1,315 @@
+import os
+import sys
+import time
+import select
+import struct
+import argparse
+import threading
+
+# linux/input-event-codes.h
+EV_SYN = 0x00
+EV_ABS = 0x03
+SYN_REPORT = 0
+SYN_DROPPED = 3
+ABS_MT_SLOT = 0x2f
+ABS_MT_TOUCH_MAJOR = 0x30
+ABS_MT_TOUCH_MINOR = 0x31
+ABS_MT_POSITION_X = 0x35
+ABS_MT_POSITION_Y = 0x36
+ABS_MT_TRACKING_ID = 0x39
+
+# struct input_event: 时间(timeval，本机字长) 类型(2) 代码(2) 值(4)
+INPUT_EVENT = struct.Struct('llHHi')
+# struct input_absinfo: 当前值 最小 最大 fuzz flat resolution
+ABS_INFO = struct.Struct('6i')
+
+def EVIOCGABS(axis):
+    # _IOR('E', 0x40 + axis, struct input_absinfo)
+    return (2 << 30) | (ABS_INFO.size << 16) | (ord('E') << 8) | (0x40 + axis)
+
+# 事件记录文件格式:
+#   魔数(4) 版本(2) 单个事件字节数(2) x最小(4) x最大(4) y最小(4) y最大(4)，小端
+#   之后为设备读出的原始input_event，按本机格式保存
+EVENT_FILE_MAGIC = b'MTEV'
+EVENT_FILE_VERSION = 1
+EVENT_FILE_HEADER = struct.Struct('<4sHHiiii')
+
+# 输入线程中的触摸点ID为此值加槽位号，与Qt的触摸点ID和鼠标(-1)区分
+TOUCH_ID_BASE = 1 << 16
+
+# 没有待发送的帧时，读取等待的最长时间（秒），用于检查是否需要退出
+POLL_INTERVAL = 0.1
+
+class MultitouchDecoder:
+    """
+    解析多点触摸协议B(slot)的事件，SYN_REPORT时给出一帧内变化的槽位
+
+    slots: 槽位 -> [x, y, 接触长轴, 接触短轴]，只包含正在触摸的槽位
+    """
+
+    def __init__(self):
+        self.slots = {}
+        self.slot = 0
+        self.values = {}
+        self.changed = set()
+        self.released = set()
+        self.dropped = False
+
+    def feed(self, event_type, code, value):
+        """处理一个事件，一帧结束时返回True"""
+        if event_type == EV_SYN:
+            if code == SYN_DROPPED:
+                # 内核缓冲区溢出，丢弃到下一个SYN_REPORT，之后松开所有触摸点重新开始
+                self.dropped = True
+                return False
+            if code != SYN_REPORT:
+                return False
+            if self.dropped:
+                self.dropped = False
+                self.released.update(self.slots)
+                self.slots.clear()
+                self.changed.clear()
+            return True
+        if event_type != EV_ABS or self.dropped:
+            return False
+        if code == ABS_MT_SLOT:
+            self.slot = value
+        elif code == ABS_MT_TRACKING_ID:
+            if value < 0:
+                if self.slots.pop(self.slot, None) is not None:
+                    self.released.add(self.slot)
+                self.changed.discard(self.slot)
+            else:
+                # 新的触摸点沿用该槽位上次的坐标，坐标没变时设备不会再次发送
+                self.slots[self.slot] = list(self.values.get(self.slot, (0, 0, 0, 0)))
+                self.released.discard(self.slot)
+                self.changed.add(self.slot)
+        elif code in (ABS_MT_POSITION_X, ABS_MT_POSITION_Y, ABS_MT_TOUCH_MAJOR, ABS_MT_TOUCH_MINOR):
+            index = (ABS_MT_POSITION_X, ABS_MT_POSITION_Y, ABS_MT_TOUCH_MAJOR, ABS_MT_TOUCH_MINOR).index(code)
+            values = self.values.setdefault(self.slot, [0, 0, 0, 0])
+            values[index] = value
+            contact = self.slots.get(self.slot)
+            if contact is not None:
+                contact[index] = value
+                self.changed.add(self.slot)
+        return False
+
+    def take_frame(self):
+        """返回并清空本帧的(变化的槽位, 松开的槽位)"""
+        changed, released = self.changed, self.released
+        self.changed, self.released = set(), set()
+        return changed, released
+
+class EvdevTouchSource:
+    """
+    直接读取Linux evdev多点触摸设备的输入源
+
+    在独立线程中阻塞读取 /dev/input/event*，不经过窗口系统和Qt的事件分发；
+    每帧(SYN_REPORT)的触摸点直接进入触摸板控件的命中检测和发送流程（见apply_contact、
+    input_frame_done），GUI线程只负责重绘，忙于绘制时也不影响发送。
+    设备坐标按整个屏幕映射，与触摸屏和显示器一一对应的常见配置一致
+    """
+
+    def __init__(self, widget, path):
+        self.widget = widget
+        self.path = path
+        self.fd = None
+        self.ranges = None
+        self.thread = None
+        self.running = False
+        self.decoder = MultitouchDecoder()
+        self.buffer = b''
+
+    def open(self):
+        import fcntl
+        self.fd = os.open(self.path, os.O_RDONLY | os.O_NONBLOCK)
+        ranges = []
+        for axis in (ABS_MT_POSITION_X, ABS_MT_POSITION_Y):
+            info = bytearray(ABS_INFO.size)
+            fcntl.ioctl(self.fd, EVIOCGABS(axis), info)
+            value, minimum, maximum, fuzz, flat, resolution = ABS_INFO.unpack(info)
+            ranges.extend((minimum, maximum))
+        self.ranges = tuple(ranges)
+
+    def close(self):
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
+
+    def start(self):
+        try:
+            self.open()
+        except OSError as e:
+            print(f"Failed to open touch input {self.path}: {e}")
+            return False
+        self.running = True
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+        print(f"Touch input started on {self.path}, range {self.ranges}")
+        return True
+
+    def stop(self):
+        self.running = False
+        if self.thread is not None and self.thread is not threading.current_thread():
+            self.thread.join(1)
+        self.thread = None
+        self.close()
+
+    def read_events(self, timeout):
+        """等待最多timeout秒，返回读到的(类型, 代码, 值)列表"""
+        readable, _, _ = select.select([self.fd], [], [], timeout)
+        if not readable:
+            return []
+        try:
+            data = os.read(self.fd, INPUT_EVENT.size * 64)
+        except BlockingIOError:
+            return []
+        return self._unpack(data)
+
+    def _unpack(self, data):
+        data = self.buffer + data
+        end = len(data) - len(data) % INPUT_EVENT.size
+        self.buffer = data[end:]
+        return [event[2:] for event in INPUT_EVENT.iter_unpack(data[:end])]
+
+    def _run(self):
+        deadline = None
+        while self.running:
+            timeout = POLL_INTERVAL if deadline is None else min(POLL_INTERVAL, max(0.0, deadline - time.perf_counter()))
+            try:
+                events = self.read_events(timeout)
+            except OSError as e:
+                print(f"Error reading touch input: {e}")
+                break
+            # 发送失败（如socket正被关闭）只影响这一帧，输入线程继续运行
+            try:
+                for event_type, code, value in events:
+                    if self.decoder.feed(event_type, code, value):
+                        delay = self._apply_frame()
+                        deadline = None if delay is None else time.perf_counter() + delay
+                if deadline is not None and time.perf_counter() >= deadline:
+                    # 合并发送的间隔已到，直接在本线程发送
+                    delay = self.widget.poll_send()
+                    deadline = None if delay is None else time.perf_counter() + delay
+            except OSError as e:
+                print(f"Error sending touch data: {e}")
+                # 未发出的帧仍在等待发送，稍后重试
+                deadline = time.perf_counter() + POLL_INTERVAL
+        self.running = False
+
+    def _apply_frame(self):
+        widget = self.widget
+        changed, released = self.decoder.take_frame()
+        offset_x, offset_y, screen_width, screen_height = widget.input_geometry
+        x_min, x_max, y_min, y_max = self.ranges
+        scale_x = screen_width / max(1, x_max - x_min + 1)
+        scale_y = screen_height / max(1, y_max - y_min + 1)
+        with widget.lock:
+            for slot in released:
+                widget.remove_touch(TOUCH_ID_BASE + slot)
+            for slot in changed:
+                x, y, major, minor = self.decoder.slots[slot]
+                widget.apply_contact(TOUCH_ID_BASE + slot,
+                                     offset_x + (x - x_min) * scale_x, offset_y + (y - y_min) * scale_y,
+                                     major * scale_x, (minor or major) * scale_y)
+        return widget.input_frame_done()
+
+class EventFileSource(EvdevTouchSource):
+    """
+    从事件记录文件读取的输入源，按记录中的时间戳回放，用于没有触摸屏时测试
+
+    参数:
+        speed: 回放倍速，0为尽快回放
+        loop: 到达文件末尾后从头重新回放
+    """
+
+    def __init__(self, widget, path, speed=1.0, loop=False):
+        super().__init__(widget, path)
+        self.speed = speed
+        self.loop = loop
+        self.events = []
+        self.index = 0
+        self.start_time = None
+
+    def open(self):
+        with open(self.path, 'rb') as f:
+            header = f.read(EVENT_FILE_HEADER.size)
+            data = f.read()
+        if len(header) != EVENT_FILE_HEADER.size:
+            raise OSError(f"{self.path}: 不是事件记录文件")
+        magic, version, event_size, *ranges = EVENT_FILE_HEADER.unpack(header)
+        if magic != EVENT_FILE_MAGIC or version != EVENT_FILE_VERSION or event_size != INPUT_EVENT.size:
+            raise OSError(f"{self.path}: 不是事件记录文件或格式不支持")
+        self.ranges = tuple(ranges)
+        self.events = [(sec + usec / 1e6, event_type, code, value)
+                       for sec, usec, event_type, code, value in INPUT_EVENT.iter_unpack(data[:len(data) - len(data) % event_size])]
+
+    def close(self):
+        pass
+
+    def read_events(self, timeout):
+        if self.index >= len(self.events):
+            if not self.loop or not self.events:
+                time.sleep(timeout)
+                return []
+            self.index = 0
+            self.start_time = None
+        now = time.perf_counter()
+        first = self.events[0][0]
+        if self.start_time is None:
+            self.start_time = now
+        events = []
+        while self.index < len(self.events):
+            timestamp, event_type, code, value = self.events[self.index]
+            if self.speed:
+                due = self.start_time + (timestamp - first) / self.speed
+                if due > now:
+                    if not events:
+                        time.sleep(min(timeout, due - now))
+                    break
+            events.append((event_type, code, value))
+            self.index += 1
+            # 尽快回放时每次最多处理一帧，期间仍能按时处理合并发送
+            if not self.speed and event_type == EV_SYN and code == SYN_REPORT:
+                break
+        return events
+
+def record(device, output):
+    """将设备的原始事件保存为事件记录文件，直到Ctrl+C"""
+    source = EvdevTouchSource(None, device)
+    source.open()
+    x_min, x_max, y_min, y_max = source.ranges
+    count = 0
+    with open(output, 'wb') as f:
+        f.write(EVENT_FILE_HEADER.pack(EVENT_FILE_MAGIC, EVENT_FILE_VERSION, INPUT_EVENT.size,
+                                       x_min, x_max, y_min, y_max))
+        print(f"正在记录 {device} (x: {x_min}~{x_max}, y: {y_min}~{y_max})，按Ctrl+C结束")
+        try:
+            while True:
+                readable, _, _ = select.select([source.fd], [], [])
+                try:
+                    data = os.read(source.fd, INPUT_EVENT.size * 64)
+                except BlockingIOError:
+                    continue
+                f.write(data)
+                count += len(data) // INPUT_EVENT.size
+        except KeyboardInterrupt:
+            pass
+    source.close()
+    print(f"\n已保存 {count} 个事件到 {output}")
+
+def main():
+    parser = argparse.ArgumentParser(description='记录evdev多点触摸设备的原始事件，供触摸板的--evdev-file回放')
+    parser.add_argument('device', help='触摸设备，如 /dev/input/event5')
+    parser.add_argument('-o', '--output', default='touch_events.mtev',
+                        help='输出文件（默认：touch_events.mtev）')
+    args = parser.parse_args()
+    try:
+        record(args.device, args.output)
+    except OSError as e:
+        print(f"无法读取设备: {e}")
+        return 1
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,518 @@
+import sys
+import time
+import struct
+from array import array
+from collections import deque
+
+# 34个触摸区域的固定顺序，区域在此列表中的下标即其在状态位掩码中的位
+ZONE_IDS = (
+    [1, 2, 3, 4, 5, 6, 7, 8] +          # A1-A8
+    [11, 12, 13, 14, 15, 16, 17, 18] +  # B1-B8
+    [21, 22] +                          # C1, C2
+    [31, 32, 33, 34, 35, 36, 37, 38] +  # D1-D8
+    [41, 42, 43, 44, 45, 46, 47, 48]    # E1-E8
+)
+
+# 区域ID -> 位掩码
+ZONE_BITS = {zone: 1 << i for i, zone in enumerate(ZONE_IDS)}
+
+# 打包后的状态字节数
+STATE_BYTES = (len(ZONE_IDS) + 7) // 8
+
+# 数据报格式（小端）:
+#   魔数(1) 版本(1) 冗余状态数n(1) 序号(4) 发送时间(8, time.monotonic_ns)
+#   当前状态(5) 前n个状态(5*n，由近到远)
+# 旧格式是每个区域ID一个字节（均不大于48），首字节为魔数即可区分
+DATAGRAM_MAGIC = 0xA5
+DATAGRAM_VERSION = 1
+DATAGRAM_HEADER = struct.Struct('<BBBIQ')
+SEQ_MASK = 0xFFFFFFFF
+
+# 默认随每个数据报附带的历史状态数
+DEFAULT_REDUNDANCY = 3
+
+# 统计查询: 发送端发送请求，接收端回复自启动以来的累计统计，用于压力测试
+#   请求: 魔数(1) 版本(1) 令牌(4)
+#   回复: 魔数(1) 版本(1) 令牌(4) 收到(8) 应用的状态(8) 丢失(8) 补回(8) 过期(8)
+STATS_REQUEST_MAGIC = 0xA6
+STATS_REPLY_MAGIC = 0xA7
+STATS_REQUEST = struct.Struct('<BBI')
+STATS_REPLY = struct.Struct('<BBIQQQQQ')
+STATS_FIELDS = ('received', 'applied', 'lost', 'recovered', 'late')
+
+# 触摸记录文件格式（小端）:
+#   魔数(4) 版本(2) 保留(2) 记录数n(8)
+#   时间戳 n*8 (double，秒)  状态位掩码 n*8 (uint64)
+RECORDING_MAGIC = b'MTRC'
+RECORDING_VERSION = 1
+RECORDING_HEADER = struct.Struct('<4sHHQ')
+
+# 手势记录文件格式（小端），记录触摸板收到的原始触摸事件:
+#   魔数(4) 版本(2) 保留(2) 事件数n(8)
+#   时间戳 n*8 (double，秒)  触摸点ID n*4 (int32)  类型 n*1
+#   x n*4  y n*4  接触宽 n*4  接触高 n*4 (float，基于600x600画布的坐标)
+GESTURE_MAGIC = b'MTGS'
+GESTURE_VERSION = 1
+GESTURE_HEADER = struct.Struct('<4sHHQ')
+# 事件类型：按下或移动（含接触范围变化）、松开
+GESTURE_CONTACT = 0
+GESTURE_RELEASE = 1
+
+# mai2串口格式（9字节，以'('开头、')'结尾）中各触摸点的(字节位置, 位掩码)
+MAI2_ZONE_BITS = {
+    1: (1, 1 << 0),   # A1
+    2: (1, 1 << 1),   # A2
+    3: (1, 1 << 2),   # A3
+    4: (1, 1 << 3),   # A4
+    5: (1, 1 << 4),   # A5
+    6: (2, 1 << 0),   # A6
+    7: (2, 1 << 1),   # A7
+    8: (2, 1 << 2),   # A8
+    11: (2, 1 << 3),  # B1
+    12: (2, 1 << 4),  # B2
+    13: (3, 1 << 0),  # B3
+    14: (3, 1 << 1),  # B4
+    15: (3, 1 << 2),  # B5
+    16: (3, 1 << 3),  # B6
+    17: (3, 1 << 4),  # B7
+    18: (4, 1 << 0),  # B8
+    21: (4, 1 << 1),  # C1
+    22: (4, 1 << 2),  # C2
+    31: (4, 1 << 3),  # D1
+    32: (4, 1 << 4),  # D2
+    33: (5, 1 << 0),  # D3
+    34: (5, 1 << 1),  # D4
+    35: (5, 1 << 2),  # D5
+    36: (5, 1 << 3),  # D6
+    37: (5, 1 << 4),  # D7
+    38: (6, 1 << 0),  # D8
+    41: (6, 1 << 1),  # E1
+    42: (6, 1 << 2),  # E2
+    43: (6, 1 << 3),  # E3
+    44: (6, 1 << 4),  # E4
+    45: (7, 1 << 0),  # E5
+    46: (7, 1 << 1),  # E6
+    47: (7, 1 << 2),  # E7
+    48: (7, 1 << 3),  # E8
+}
+
+def pack_zones(touched_points):
+    """将触摸区域ID集合打包为位掩码整数，未知ID被忽略"""
+    mask = 0
+    for point in touched_points:
+        mask |= ZONE_BITS.get(point, 0)
+    return mask
+
+def unpack_zones(mask):
+    """将位掩码整数还原为触摸区域ID列表（按ZONE_IDS顺序）"""
+    points = []
+    while mask:
+        low = mask & -mask
+        points.append(ZONE_IDS[low.bit_length() - 1])
+        mask ^= low
+    return points
+
+class TouchHistory:
+    """
+    固定容量的触摸状态历史，只记录状态变化
+
+    时间戳和打包状态分别存放在两个预分配的array中，作为环形缓冲区使用，
+    写满后覆盖最旧的记录，内存占用不随会话时长增长。
+    时间戳单调递增，按时间查找使用二分查找。
+    """
+
+    def __init__(self, capacity=1 << 18):
+        self.capacity = capacity
+        self.times = array('d', bytes(8 * capacity))
+        self.states = array('Q', bytes(8 * capacity))
+        self.start = 0   # 最旧记录的物理下标
+        self.count = 0
+
+    def __len__(self):
+        return self.count
+
+    def _physical(self, index):
+        return (self.start + index) % self.capacity
+
+    def append(self, timestamp, mask):
+        """记录一个状态，与上一条记录相同时忽略；返回是否记录"""
+        if self.count:
+            last = self._physical(self.count - 1)
+            if self.states[last] == mask:
+                return False
+            # 时间戳必须单调递增，二分查找依赖这一点
+            timestamp = max(timestamp, self.times[last])
+        if self.count < self.capacity:
+            i = self._physical(self.count)
+            self.count += 1
+        else:
+            i = self.start
+            self.start = (self.start + 1) % self.capacity
+        self.times[i] = timestamp
+        self.states[i] = mask
+        return True
+
+    def clear(self):
+        self.start = 0
+        self.count = 0
+
+    def to_arrays(self):
+        """按时间顺序返回(时间戳array, 状态array)副本"""
+        end = self.start + self.count
+        if end <= self.capacity:
+            return self.times[self.start:end], self.states[self.start:end]
+        wrap = end - self.capacity
+        return (self.times[self.start:] + self.times[:wrap],
+                self.states[self.start:] + self.states[:wrap])
+
+    def save(self, path):
+        """将历史保存为触摸记录文件"""
+        save_recording(path, *self.to_arrays())
+
+    @classmethod
+    def load(cls, path):
+        """读取触摸记录文件，容量等于记录数"""
+        times, states = load_recording(path)
+        history = cls(max(1, len(times)))
+        history.times[:len(times)] = times
+        history.states[:len(states)] = states
+        history.count = len(times)
+        return history
+
+    def get(self, index):
+        """按逻辑下标（0为最旧）返回(时间戳, 位掩码)"""
+        if not 0 <= index < self.count:
+            raise IndexError(index)
+        i = self._physical(index)
+        return self.times[i], self.states[i]
+
+    def first_time(self):
+        return self.times[self.start] if self.count else None
+
+    def last_time(self):
+        return self.times[self._physical(self.count - 1)] if self.count else None
+
+    def _bisect(self, timestamp, inclusive):
+        """返回时间戳早于（inclusive时为不晚于）timestamp的记录数"""
+        lo, hi = 0, self.count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            t = self.times[self._physical(mid)]
+            if t < timestamp or (inclusive and t == timestamp):
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def index_at(self, timestamp):
+        """返回时间戳不晚于timestamp的最后一条记录的逻辑下标，没有则返回-1"""
+        return self._bisect(timestamp, True) - 1
+
+    def state_at(self, timestamp):
+        """返回timestamp时刻的位掩码，早于所有记录时为0"""
+        index = self.index_at(timestamp)
+        return self.states[self._physical(index)] if index >= 0 else 0
+
+    def prev_change(self, timestamp):
+        """返回早于timestamp的最近一次状态变化的时间戳，没有则返回None"""
+        index = self._bisect(timestamp, False) - 1
+        return self.times[self._physical(index)] if index >= 0 else None
+
+    def next_change(self, timestamp):
+        """返回晚于timestamp的最近一次状态变化的时间戳，没有则返回None"""
+        index = self.index_at(timestamp) + 1
+        return self.times[self._physical(index)] if index < self.count else None
+
+
+def encode_mai2_serial(touched_points):
+    """将触摸区域ID列表编码为mai2串口格式的一帧，未知ID被忽略"""
+    frame = bytearray(9)
+    frame[0] = 0x28  # 起始字节 '('
+    frame[8] = 0x29  # 结束字节 ')'
+    for point in touched_points:
+        bit = MAI2_ZONE_BITS.get(point)
+        if bit is not None:
+            frame[bit[0]] |= bit[1]
+    return bytes(frame)
+
+def encode_datagram(seq, send_ns, mask, previous=()):
+    """
+    编码一个数据报
+
+    参数:
+        seq: 序号，按32位回绕
+        send_ns: 发送时的time.monotonic_ns()
+        mask: 当前状态位掩码
+        previous: 之前的状态位掩码，由近到远
+    """
+    parts = [DATAGRAM_HEADER.pack(DATAGRAM_MAGIC, DATAGRAM_VERSION, len(previous), seq & SEQ_MASK, send_ns),
+             mask.to_bytes(STATE_BYTES, 'little')]
+    parts.extend(state.to_bytes(STATE_BYTES, 'little') for state in previous)
+    return b''.join(parts)
+
+def decode_datagram(data):
+    """
+    解码数据报
+
+    返回: (序号, 发送时间ns, [当前状态, 前一状态, ...])；不是本格式或长度不符时返回None
+    """
+    if len(data) < DATAGRAM_HEADER.size or data[0] != DATAGRAM_MAGIC:
+        return None
+    magic, version, redundancy, seq, send_ns = DATAGRAM_HEADER.unpack_from(data)
+    if version != DATAGRAM_VERSION or len(data) != DATAGRAM_HEADER.size + (redundancy + 1) * STATE_BYTES:
+        return None
+    states = [int.from_bytes(data[i:i + STATE_BYTES], 'little')
+              for i in range(DATAGRAM_HEADER.size, len(data), STATE_BYTES)]
+    return seq, send_ns, states
+
+class TouchDatagramEncoder:
+    """为一个发送端生成带序号的数据报，附带最近几个状态以便接收端补回丢失的数据报"""
+
+    def __init__(self, redundancy=DEFAULT_REDUNDANCY):
+        self.seq = 0
+        self.previous = deque(maxlen=redundancy)
+
+    def encode(self, touched_points):
+        mask = pack_zones(touched_points)
+        data = encode_datagram(self.seq, time.monotonic_ns(), mask, self.previous)
+        self.previous.appendleft(mask)
+        self.seq = (self.seq + 1) & SEQ_MASK
+        return data
+
+class TouchStreamStats:
+    """
+    接收端按发送地址跟踪序号，统计丢包、乱序和单向延迟
+
+    单向延迟直接用接收时间减去发送时间，两端的time.monotonic_ns()
+    只有在同一台机器上才可比较，跨机器时延迟数值无意义。
+    """
+
+    # 序号倒退超过此值视为发送端重启
+    RESTART_WINDOW = 1 << 16
+
+    def __init__(self):
+        self.last_seq = {}   # 地址 -> 最近接收的序号
+        self.total_received = 0
+        self.total_lost = 0
+        self.total_recovered = 0
+        self.total_late = 0
+        self.total_applied = 0
+        self._reset_window()
+
+    def _reset_window(self):
+        self.received = 0
+        self.lost = 0
+        self.recovered = 0
+        self.late = 0
+        self.latency_count = 0
+        self.latency_sum = 0
+        self.latency_min = None
+        self.latency_max = None
+
+    def accept(self, addr, data, recv_ns):
+        """
+        处理一个数据报
+
+        返回: 按时间顺序需要应用的状态位掩码列表（包括由冗余状态补回的），
+        过期或重复的数据报返回空列表；不是本格式时返回None
+        """
+        decoded = decode_datagram(data)
+        if decoded is None:
+            return None
+        seq, send_ns, states = decoded
+        self.received += 1
+        self.total_received += 1
+
+        latency = recv_ns - send_ns
+        self.latency_count += 1
+        self.latency_sum += latency
+        if self.latency_min is None or latency < self.latency_min:
+            self.latency_min = latency
+        if self.latency_max is None or latency > self.latency_max:
+            self.latency_max = latency
+
+        applied = self._accept_states(addr, seq, states)
+        self.total_applied += len(applied)
+        return applied
+
+    def _accept_states(self, addr, seq, states):
+        last = self.last_seq.get(addr)
+        if last is None:
+            self.last_seq[addr] = seq
+            return states[:1]
+        gap = (seq - last) & SEQ_MASK
+        if gap == 0 or gap > SEQ_MASK - self.RESTART_WINDOW:
+            # 重复或迟到的数据报，其状态已经过时
+            self.late += 1
+            self.total_late += 1
+            return []
+        if gap > self.RESTART_WINDOW:
+            self.last_seq[addr] = seq
+            return states[:1]
+        self.last_seq[addr] = seq
+
+        missing = gap - 1
+        recoverable = min(missing, len(states) - 1)
+        self.lost += missing - recoverable
+        self.total_lost += missing - recoverable
+        self.recovered += recoverable
+        self.total_recovered += recoverable
+        # 冗余状态由近到远排列，补回的状态按时间顺序放在当前状态之前
+        return states[recoverable::-1]
+
+    def totals(self):
+        """返回自创建以来的累计统计 {'received', 'applied', 'lost', 'recovered', 'late'}"""
+        return {'received': self.total_received, 'applied': self.total_applied, 'lost': self.total_lost,
+                'recovered': self.total_recovered, 'late': self.total_late}
+
+    def take_report(self):
+        """
+        返回自上次调用以来的统计并重新计数
+
+        返回: {'received', 'lost', 'recovered', 'late', 'loss_rate',
+               'latency_avg_ms', 'latency_min_ms', 'latency_max_ms'}，无延迟样本时延迟为None
+        """
+        expected = self.received + self.lost
+        report = {
+            'received': self.received,
+            'lost': self.lost,
+            'recovered': self.recovered,
+            'late': self.late,
+            'loss_rate': self.lost / expected if expected else 0.0,
+            'latency_avg_ms': self.latency_sum / self.latency_count / 1e6 if self.latency_count else None,
+            'latency_min_ms': self.latency_min / 1e6 if self.latency_count else None,
+            'latency_max_ms': self.latency_max / 1e6 if self.latency_count else None,
+        }
+        self._reset_window()
+        return report
+
+def encode_stats_request(token):
+    return STATS_REQUEST.pack(STATS_REQUEST_MAGIC, DATAGRAM_VERSION, token & SEQ_MASK)
+
+def decode_stats_request(data):
+    """返回请求令牌，不是统计查询时返回None"""
+    if len(data) != STATS_REQUEST.size or data[0] != STATS_REQUEST_MAGIC:
+        return None
+    magic, version, token = STATS_REQUEST.unpack(data)
+    return token if version == DATAGRAM_VERSION else None
+
+def encode_stats_reply(token, totals):
+    """totals: TouchStreamStats.totals()的结果"""
+    return STATS_REPLY.pack(STATS_REPLY_MAGIC, DATAGRAM_VERSION, token & SEQ_MASK,
+                            *(totals[field] for field in STATS_FIELDS))
+
+def decode_stats_reply(data):
+    """返回(令牌, 统计字典)，不是统计回复时返回None"""
+    if len(data) != STATS_REPLY.size or data[0] != STATS_REPLY_MAGIC:
+        return None
+    magic, version, token, *values = STATS_REPLY.unpack(data)
+    if version != DATAGRAM_VERSION:
+        return None
+    return token, dict(zip(STATS_FIELDS, values))
+
+def save_recording(path, times, states):
+    """
+    保存触摸记录
+
+    参数:
+        times: 时间戳array('d')，单调递增
+        states: 状态位掩码array('Q')，与times等长
+    """
+    if sys.byteorder != 'little':
+        times, states = array('d', times), array('Q', states)
+        times.byteswap()
+        states.byteswap()
+    with open(path, 'wb') as f:
+        f.write(RECORDING_HEADER.pack(RECORDING_MAGIC, RECORDING_VERSION, 0, len(times)))
+        times.tofile(f)
+        states.tofile(f)
+
+def load_recording(path):
+    """
+    读取触摸记录
+
+    返回: (时间戳array('d'), 状态位掩码array('Q'))
+    文件格式不符时抛出ValueError
+    """
+    with open(path, 'rb') as f:
+        header = f.read(RECORDING_HEADER.size)
+        if len(header) != RECORDING_HEADER.size:
+            raise ValueError(f"{path}: 不是触摸记录文件")
+        magic, version, reserved, count = RECORDING_HEADER.unpack(header)
+        if magic != RECORDING_MAGIC or version != RECORDING_VERSION:
+            raise ValueError(f"{path}: 不是触摸记录文件或版本不支持")
+        times = array('d')
+        states = array('Q')
+        try:
+            times.fromfile(f, count)
+            states.fromfile(f, count)
+        except EOFError:
+            raise ValueError(f"{path}: 记录文件不完整")
+    if sys.byteorder != 'little':
+        times.byteswap()
+        states.byteswap()
+    return times, states
+
+class GestureRecording:
+    """
+    手势记录：按时间顺序保存原始触摸事件，每个字段一个array
+
+    坐标保存为基于600x600画布的坐标，回放时按目标尺寸缩放
+    """
+    FIELDS = (('times', 'd'), ('touch_ids', 'i'), ('kinds', 'B'),
+              ('xs', 'f'), ('ys', 'f'), ('widths', 'f'), ('heights', 'f'))
+
+    def __init__(self):
+        for name, typecode in self.FIELDS:
+            setattr(self, name, array(typecode))
+
+    def __len__(self):
+        return len(self.times)
+
+    def append(self, timestamp, touch_id, kind, x=0.0, y=0.0, width=0.0, height=0.0):
+        self.times.append(timestamp)
+        self.touch_ids.append(touch_id)
+        self.kinds.append(kind)
+        self.xs.append(x)
+        self.ys.append(y)
+        self.widths.append(width)
+        self.heights.append(height)
+
+    def clear(self):
+        for name, typecode in self.FIELDS:
+            setattr(self, name, array(typecode))
+
+    def events(self):
+        """按顺序迭代(时间戳, 触摸点ID, 类型, x, y, 接触宽, 接触高)"""
+        return zip(self.times, self.touch_ids, self.kinds, self.xs, self.ys, self.widths, self.heights)
+
+    def save(self, path):
+        with open(path, 'wb') as f:
+            f.write(GESTURE_HEADER.pack(GESTURE_MAGIC, GESTURE_VERSION, 0, len(self)))
+            for name, typecode in self.FIELDS:
+                values = getattr(self, name)
+                if sys.byteorder != 'little':
+                    values = array(typecode, values)
+                    values.byteswap()
+                values.tofile(f)
+
+    @classmethod
+    def load(cls, path):
+        """读取手势记录文件，格式不符时抛出ValueError"""
+        recording = cls()
+        with open(path, 'rb') as f:
+            header = f.read(GESTURE_HEADER.size)
+            if len(header) != GESTURE_HEADER.size:
+                raise ValueError(f"{path}: 不是手势记录文件")
+            magic, version, reserved, count = GESTURE_HEADER.unpack(header)
+            if magic != GESTURE_MAGIC or version != GESTURE_VERSION:
+                raise ValueError(f"{path}: 不是手势记录文件或版本不支持")
+            try:
+                for name, typecode in cls.FIELDS:
+                    getattr(recording, name).fromfile(f, count)
+            except EOFError:
+                raise ValueError(f"{path}: 记录文件不完整")
+        if sys.byteorder != 'little':
+            for name, typecode in cls.FIELDS:
+                getattr(recording, name).byteswap()
+        return recording
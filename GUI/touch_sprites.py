@@ -0,0 +1,661 @@
+import os
+import sys
+import json
+import zlib
+from array import array
+from itertools import accumulate
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from PyQt6.QtWidgets import QWidget, QSizePolicy
+from PyQt6.QtGui import QPainter, QColor, QFont, QPixmap, QImage
+from PyQt6.QtCore import Qt, QRect, QRectF, QSize, QTimer, pyqtSignal
+from PyQt6.QtSvg import QSvgRenderer
+
+# mai2触摸区域 (区域ID: (中心x, 中心y, 标签))，基于600x600画布
+MAI2_TOUCH_POINTS = {
+    1: (404, 73, 'A1'), 2: (528, 193, 'A2'), 3: (528, 404, 'A3'), 4: (403, 526, 'A4'),
+    5: (197, 528, 'A5'), 6: (72, 404, 'A6'), 7: (72, 193, 'A7'), 8: (197, 73, 'A8'),
+    11: (347, 184, 'B1'), 12: (418, 254, 'B2'), 13: (418, 346, 'B3'), 14: (347, 417, 'B4'),
+    15: (254, 417, 'B5'), 16: (186, 346, 'B6'), 17: (186, 254, 'B7'), 18: (254, 184, 'B8'),
+    21: (330, 300, 'C1'), 22: (271, 300, 'C2'),
+    31: (300, 50, 'D1'), 32: (481, 119, 'D2'), 33: (550, 300, 'D3'), 34: (477, 477, 'D4'),
+    35: (300, 550, 'D5'), 36: (118, 482, 'D6'), 37: (50, 300, 'D7'), 38: (123, 123, 'D8'),
+    41: (300, 130, 'E1'), 42: (421, 178, 'E2'), 43: (471, 300, 'E3'), 44: (421, 421, 'E4'),
+    45: (300, 471, 'E5'), 46: (178, 421, 'E6'), 47: (129, 300, 'E7'), 48: (179, 179, 'E8')
+}
+
+# 旧框触摸区域 (区域ID: (中心x, 中心y, 标签, 标签偏移x, 标签偏移y))，基于600x600画布
+MAI_TOUCH_POINTS = {
+    1: (407, 74, 'A1', -20, 10),
+    2: (525, 191, 'A2', -10, 20),
+    3: (525, 409, 'A3', -10, -15),
+    4: (407, 526, 'A4', -20, -5),
+    5: (193, 526, 'A5', 15, -5),
+    6: (75, 409, 'A6', 5, -15),
+    7: (75, 191, 'A7', 5, 20),
+    8: (193, 74, 'A8', 15, 10),
+    11: (350, 188, 'B1', -5, 0),
+    12: (412, 249, 'B2', 0, 5),
+    13: (412, 351, 'B3', 0, 0),
+    14: (350, 412, 'B4', -5, 5),
+    15: (250, 412, 'B5', 0, 5),
+    16: (188, 351, 'B6', -5, 0),
+    17: (188, 251, 'B7', -5, 5),
+    18: (250, 188, 'B8', 0, 0),
+    21: (300, 300, 'C', 2, 5)
+}
+
+# 基础画布尺寸，尺寸因子 = 画布尺寸 / 基础画布尺寸
+BASE_CANVAS_SIZE = 600
+
+# 自由缩放时画布尺寸按此步长向下取整，避免每个像素都重新生成精灵
+CANVAS_STEP = 20
+# 取整后的尺寸与图集中的某个尺寸相差不超过此值时直接使用图集尺寸
+CANVAS_SNAP = 40
+
+# 各区域SVG的缩放比例，乘以尺寸因子后为实际缩放
+MAI2_SPRITE_SCALE = 0.3
+MAI_SPRITE_SCALE = 0.85
+
+# 缩放到未生成过的尺寸时，尺寸停止变化此时间（毫秒）后才在后台生成布局，
+# 拖动调整窗口大小期间不会为每个中间尺寸生成精灵和命中检测栅格
+RESIZE_SETTLE_MS = 150
+
+# 接触面积命中检测中候选区域网格的单元格尺寸（像素）
+HIT_CELL_SIZE = 16
+
+# 预渲染图集所在目录(相对SVG目录)和清单文件名，由touch/build_atlas.py生成
+ATLAS_DIR = "atlas"
+ATLAS_MANIFEST = "manifest.json"
+ATLAS_VERSION = 2
+
+# SVG渲染器缓存: 文件路径 -> QSvgRenderer，每个文件只解析一次
+_svg_renderers = {}
+
+# 布局缓存: (精灵组, 尺寸因子, 设备像素比) -> ZoneLayout，按最近使用顺序淘汰
+# 同一尺寸的多个控件共用同一份精灵，缩放回已生成过的尺寸时无需重新生成
+_layout_cache = OrderedDict()
+LAYOUT_CACHE_SIZE = 8
+
+# 后台生成布局的线程，单线程按请求顺序处理
+_layout_executor = None
+
+# 图集索引缓存: SVG目录 -> {'sprites': {(文件名, 宽, 高): (图集文件, 图集宽, 图集高, x, y)},
+#                          'view_boxes': {文件名: [宽, 高]}, 'canvases': [画布尺寸]}
+_atlas_indexes = {}
+
+# 已读取的图集: 图集文件路径 -> (像素数据, QImage)，QImage直接引用像素数据
+_atlas_images = {}
+
+def scale_touch_points(points, size_factor):
+    """按尺寸因子缩放区域表中的坐标和偏移并取整，标签保持不变"""
+    return {k: tuple(v if isinstance(v, str) else round(v * size_factor) for v in values)
+            for k, values in points.items()}
+
+def zone_rect(center_x, center_y, view_box, sprite_scale, size_factor):
+    """计算区域精灵在画布上的矩形 (x, y, 宽, 高)"""
+    # 缩放因子取整处理，保留两位小数
+    scale_factor = round(sprite_scale * size_factor * 100) / 100
+    # 尺寸和位置取整
+    scaled_width = round(view_box[0] * scale_factor)
+    scaled_height = round(view_box[1] * scale_factor)
+    top_left_x = round(center_x - scaled_width / 2)
+    top_left_y = round(center_y - scaled_height / 2)
+    return top_left_x, top_left_y, scaled_width, scaled_height
+
+def get_svg_renderer(path, renderers=None):
+    """
+    获取SVG渲染器
+
+    参数:
+        renderers: 渲染器缓存字典，默认使用全局缓存；QSvgRenderer不能跨线程共用，
+                   后台线程需传入自己的字典
+    """
+    if renderers is None:
+        renderers = _svg_renderers
+    renderer = renderers.get(path)
+    if renderer is None:
+        renderer = QSvgRenderer(path)
+        renderers[path] = renderer
+    return renderer
+
+def _atlas_index(svg_dir):
+    """读取SVG目录对应的图集清单，没有图集时返回空索引"""
+    index = _atlas_indexes.get(svg_dir)
+    if index is not None:
+        return index
+    index = {'sprites': {}, 'view_boxes': {}, 'canvases': []}
+    manifest_path = os.path.join(svg_dir, ATLAS_DIR, ATLAS_MANIFEST)
+    try:
+        with open(manifest_path, 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        manifest = None
+    if manifest and manifest.get('version') == ATLAS_VERSION:
+        for atlas in manifest['atlases']:
+            index['canvases'].append(atlas['canvas'])
+            image_path = os.path.join(svg_dir, ATLAS_DIR, atlas['image'])
+            for sprite in atlas['sprites']:
+                key = (sprite['file'], sprite['width'], sprite['height'])
+                index['sprites'][key] = (image_path, atlas['width'], atlas['height'], sprite['x'], sprite['y'])
+        index['view_boxes'] = manifest['view_boxes']
+    _atlas_indexes[svg_dir] = index
+    return index
+
+def snap_canvas_size(available, svg_dir):
+    """将可用空间换算为画布尺寸：按CANVAS_STEP向下取整，接近图集中的尺寸时使用图集尺寸"""
+    canvas = max(CANVAS_STEP, available // CANVAS_STEP * CANVAS_STEP)
+    for size in sorted(_atlas_index(svg_dir)['canvases'], reverse=True):
+        if canvas - CANVAS_SNAP <= size <= available:
+            return size
+    return canvas
+
+def svg_view_box(path, renderers=None):
+    """获取SVG的viewBox尺寸 (宽, 高)，图集清单中有记录时不解析SVG"""
+    svg_dir, name = os.path.split(path)
+    view_box = _atlas_index(svg_dir)['view_boxes'].get(name)
+    if view_box is not None:
+        return view_box[0], view_box[1]
+    rect = get_svg_renderer(path, renderers).viewBoxF()
+    return rect.width(), rect.height()
+
+def _load_atlas_sprite(path, width, height):
+    """从预渲染图集中取出精灵，图集中没有该尺寸时返回None"""
+    svg_dir, name = os.path.split(path)
+    entry = _atlas_index(svg_dir)['sprites'].get((name, width, height))
+    if entry is None:
+        return None
+    image_path, atlas_width, atlas_height, x, y = entry
+    loaded = _atlas_images.get(image_path)
+    if loaded is None:
+        # 每张图集只读取一次，之后所有精灵都从内存中切出
+        try:
+            with open(image_path, 'rb') as f:
+                data = zlib.decompress(f.read())
+        except (OSError, zlib.error):
+            return None
+        if len(data) != atlas_width * atlas_height * 4:
+            return None
+        atlas = QImage(data, atlas_width, atlas_height, atlas_width * 4,
+                       QImage.Format.Format_ARGB32_Premultiplied)
+        loaded = (data, atlas)
+        _atlas_images[image_path] = loaded
+    return loaded[1].copy(x, y, width, height)
+
+def render_svg_image(path, width, height, device_pixel_ratio=1.0, renderers=None):
+    """将SVG渲染为指定逻辑尺寸的透明QImage"""
+    image = QImage(round(width * device_pixel_ratio), round(height * device_pixel_ratio),
+                   QImage.Format.Format_ARGB32_Premultiplied)
+    image.fill(Qt.GlobalColor.transparent)
+    image.setDevicePixelRatio(device_pixel_ratio)
+    painter = QPainter(image)
+    painter.setRenderHint(QPainter.RenderHint.Antialiasing)
+    get_svg_renderer(path, renderers).render(painter, QRectF(0, 0, width, height))
+    painter.end()
+    return image
+
+def load_sprite_image(path, width, height, device_pixel_ratio=1.0, renderers=None):
+    """
+    获取SVG在指定尺寸下的QImage，可在后台线程中调用
+
+    优先从预渲染图集中读取，图集中没有对应尺寸或设备像素比不为1时再渲染SVG
+    """
+    image = None
+    if device_pixel_ratio == 1.0:
+        image = _load_atlas_sprite(path, width, height)
+    if image is None:
+        image = render_svg_image(path, width, height, device_pixel_ratio, renderers)
+    return image
+
+class ZoneLayout:
+    """
+    一个尺寸下各区域的坐标、矩形和精灵
+
+    图片以QImage生成，可以在后台线程中完成；QPixmap只能在GUI线程创建，
+    由create_pixmaps()在应用布局时转换
+    """
+
+    def __init__(self, size_factor, touch_points, sprite_rects, default_images, touch_images):
+        self.size_factor = size_factor
+        self.touch_points = touch_points
+        self.sprite_rects = sprite_rects
+        self.default_images = default_images
+        self.touch_images = touch_images
+        self.default_sprites = None
+        self.touch_sprites = None
+        # 命中检测栅格，见build_hit_raster
+        self.hit_mask = None
+        self.hit_width = 0
+        self.hit_height = 0
+        self.hit_points = []
+        self.mask_zones = {}
+        self.coverage_tables = []
+        self.cell_masks = None
+        self.cell_columns = 0
+
+    def create_pixmaps(self):
+        if self.default_sprites is None:
+            self.default_sprites = {point: QPixmap.fromImage(image) for point, image in self.default_images.items()}
+            self.touch_sprites = {point: QPixmap.fromImage(image) for point, image in self.touch_images.items()}
+
+    def build_hit_raster(self):
+        """
+        生成命中检测栅格：画布上每个像素一个位掩码，第i位表示第i个区域的精灵在该像素不透明
+
+        与逐区域检查精灵像素的判断一致（alpha > 10），之后每次命中检测只需一次数组下标，
+        与区域数量无关。同时为每个区域生成不透明像素的积分图（summed-area table），
+        以及按HIT_CELL_SIZE划分的候选区域网格，供zones_in_area使用。
+        可以在后台线程调用，已生成时直接返回
+        """
+        if self.hit_mask is not None:
+            return
+        points = list(self.sprite_rects)
+        width = max(0, max(rect.x() + rect.width() for rect in self.sprite_rects.values()))
+        height = max(0, max(rect.y() + rect.height() for rect in self.sprite_rects.values()))
+        # 先按位分成若干字节平面，每行用整数按位或合并，再交错成64位掩码
+        planes = [bytearray(width * height) for _ in range((len(points) + 7) // 8)]
+        opaque = bytes(1 if a > 10 else 0 for a in range(256))
+        coverage_tables = []
+        cell_columns = (width + HIT_CELL_SIZE - 1) // HIT_CELL_SIZE
+        cell_rows = (height + HIT_CELL_SIZE - 1) // HIT_CELL_SIZE
+        cell_masks = array('Q', bytes(8 * cell_columns * cell_rows))
+        for bit, point in enumerate(points):
+            rect = self.sprite_rects[point]
+            alpha = self.default_images[point].convertToFormat(QImage.Format.Format_Alpha8)
+            if alpha.width() != rect.width() or alpha.height() != rect.height():
+                # 高分屏下精灵按设备像素存储，按逻辑像素取样
+                alpha = alpha.scaled(rect.width(), rect.height(), Qt.AspectRatioMode.IgnoreAspectRatio,
+                                     Qt.TransformationMode.FastTransformation)
+            raw = alpha.constBits().asstring(alpha.sizeInBytes())
+            stride = alpha.bytesPerLine()
+            coverage_tables.append(self._summed_area_table(raw, stride, rect.width(), rect.height(), opaque))
+            for cell_y in range(max(0, rect.y() // HIT_CELL_SIZE),
+                                min(cell_rows, (rect.y() + rect.height() - 1) // HIT_CELL_SIZE + 1)):
+                for cell_x in range(max(0, rect.x() // HIT_CELL_SIZE),
+                                    min(cell_columns, (rect.x() + rect.width() - 1) // HIT_CELL_SIZE + 1)):
+                    cell_masks[cell_y * cell_columns + cell_x] |= 1 << bit
+            value = 1 << (bit % 8)
+            table = bytes(value if a > 10 else 0 for a in range(256))
+            plane = planes[bit // 8]
+            x0, x1 = max(0, rect.x()), min(width, rect.x() + rect.width())
+            if x0 >= x1:
+                continue
+            for row in range(max(0, -rect.y()), min(rect.height(), height - rect.y())):
+                offset = row * stride - rect.x()
+                src = raw[offset + x0:offset + x1].translate(table)
+                start = (rect.y() + row) * width + x0
+                end = start + len(src)
+                merged = int.from_bytes(plane[start:end], 'little') | int.from_bytes(src, 'little')
+                plane[start:end] = merged.to_bytes(end - start, 'little')
+        interleaved = bytearray(8 * width * height)
+        for i, plane in enumerate(planes):
+            interleaved[i::8] = plane
+        mask = array('Q')
+        mask.frombytes(interleaved)
+        if sys.byteorder == 'big':
+            mask.byteswap()
+        self.mask_zones = {}
+        self.hit_width = width
+        self.hit_height = height
+        self.hit_points = points
+        self.coverage_tables = coverage_tables
+        self.cell_masks = cell_masks
+        self.cell_columns = cell_columns
+        self.hit_mask = mask
+
+    @staticmethod
+    def _summed_area_table(raw, stride, width, height, opaque):
+        """
+        不透明像素的积分图，(width + 1) * (height + 1)个元素，
+        table[y * (width + 1) + x] 为左上角(0, 0)到(x, y)（不含）矩形内的不透明像素数
+
+        每行的横向前缀和按32位打包为一个整数，与上一行累加时一次完成整行的加法，
+        各列之和不超过像素总数，不会进位到相邻列
+        """
+        row_bytes = 4 * (width + 1)
+        data = bytearray(row_bytes * (height + 1))
+        above = 0
+        for y in range(height):
+            row = raw[y * stride:y * stride + width].translate(opaque)
+            above += int.from_bytes(array('I', accumulate(row, initial=0)), sys.byteorder)
+            data[(y + 1) * row_bytes:(y + 2) * row_bytes] = above.to_bytes(row_bytes, sys.byteorder)
+        table = array('I')
+        table.frombytes(data)
+        return table
+
+    def zones_at(self, x, y):
+        """返回覆盖画布坐标(x, y)的区域ID元组，需先调用build_hit_raster"""
+        return self._mask_zones(self._mask_at(x, y))
+
+    def _mask_at(self, x, y):
+        if not (0 <= x < self.hit_width and 0 <= y < self.hit_height):
+            return 0
+        return self.hit_mask[int(y) * self.hit_width + int(x)]
+
+    def _mask_zones(self, mask):
+        zones = self.mask_zones.get(mask)
+        if zones is None:
+            zones = tuple(point for bit, point in enumerate(self.hit_points) if mask >> bit & 1)
+            self.mask_zones[mask] = zones
+        return zones
+
+    def zones_in_area(self, x, y, width, height, coverage):
+        """
+        按接触面积检测：返回接触矩形内不透明部分占矩形面积比例不低于coverage的区域，
+        以及中心点所在的区域
+
+        参数:
+            x, y: 接触中心的画布坐标
+            width, height: 接触范围（椭圆直径），不超过1像素时等同于zones_at
+        """
+        mask = self._mask_at(x, y)
+        if width <= 1 and height <= 1:
+            return self._mask_zones(mask)
+        left, top = int(x - width / 2), int(y - height / 2)
+        right, bottom = int(x + width / 2) + 1, int(y + height / 2) + 1
+        required = max(1, coverage * (right - left) * (bottom - top))
+        left, top = max(0, left), max(0, top)
+        right, bottom = min(self.hit_width, right), min(self.hit_height, bottom)
+        if left >= right or top >= bottom:
+            return self._mask_zones(mask)
+        # 候选区域：接触矩形覆盖的网格单元中出现过的区域
+        candidates = 0
+        for cell_y in range(top // HIT_CELL_SIZE, (bottom - 1) // HIT_CELL_SIZE + 1):
+            row = cell_y * self.cell_columns
+            for cell_x in range(left // HIT_CELL_SIZE, (right - 1) // HIT_CELL_SIZE + 1):
+                candidates |= self.cell_masks[row + cell_x]
+        candidates &= ~mask
+        while candidates:
+            low = candidates & -candidates
+            candidates ^= low
+            bit = low.bit_length() - 1
+            # 积分图中四个角相减得到接触矩形与精灵重叠部分的不透明像素数
+            rect = self.sprite_rects[self.hit_points[bit]]
+            x0, y0 = max(left, rect.x()) - rect.x(), max(top, rect.y()) - rect.y()
+            x1 = min(right, rect.x() + rect.width()) - rect.x()
+            y1 = min(bottom, rect.y() + rect.height()) - rect.y()
+            if x0 < x1 and y0 < y1:
+                table = self.coverage_tables[bit]
+                row_width = rect.width() + 1
+                covered = (table[y1 * row_width + x1] - table[y0 * row_width + x1]
+                           - table[y1 * row_width + x0] + table[y0 * row_width + x0])
+                if covered >= required:
+                    mask |= low
+        return self._mask_zones(mask)
+
+def build_zone_layout(base_points, svg_path, sprite_scale, size_factor, device_pixel_ratio=1.0, renderers=None):
+    """
+    计算各区域在指定尺寸下的位置并加载精灵
+
+    参数:
+        base_points: 基于600x600画布的区域表
+        svg_path: (标签, 是否触摸) -> SVG路径
+        renderers: 见get_svg_renderer，后台线程调用时传入新的字典
+    """
+    touch_points = scale_touch_points(base_points, size_factor)
+    sprite_rects = {}
+    default_images = {}
+    touch_images = {}
+    for point, (center_x, center_y, label, *_) in touch_points.items():
+        view_box = svg_view_box(svg_path(label, False), renderers)
+        top_left_x, top_left_y, scaled_width, scaled_height = zone_rect(
+            center_x, center_y, view_box, sprite_scale, size_factor)
+        sprite_rects[point] = QRect(top_left_x, top_left_y, scaled_width, scaled_height)
+        default_images[point] = load_sprite_image(svg_path(label, False), scaled_width, scaled_height,
+                                                  device_pixel_ratio, renderers)
+        touch_images[point] = load_sprite_image(svg_path(label, True), scaled_width, scaled_height,
+                                                device_pixel_ratio, renderers)
+    return ZoneLayout(size_factor, touch_points, sprite_rects, default_images, touch_images)
+
+def _cached_layout(key):
+    layout = _layout_cache.get(key)
+    if layout is not None:
+        _layout_cache.move_to_end(key)
+    return layout
+
+def _cache_layout(key, layout):
+    _layout_cache[key] = layout
+    _layout_cache.move_to_end(key)
+    while len(_layout_cache) > LAYOUT_CACHE_SIZE:
+        _layout_cache.popitem(last=False)
+
+def clear_caches():
+    """清空SVG渲染器、图集和布局缓存，之后创建的控件相当于冷启动"""
+    _svg_renderers.clear()
+    _atlas_indexes.clear()
+    _atlas_images.clear()
+    _layout_cache.clear()
+
+def _submit_layout_job(job, *args):
+    global _layout_executor
+    if _layout_executor is None:
+        _layout_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='touch-layout')
+    _layout_executor.submit(job, *args)
+
+
+class SpriteTouchWidget(QWidget):
+    """
+    使用预渲染精灵显示触摸区域的控件
+
+    每个区域的未触摸/触摸两种状态在当前尺寸下预先渲染为QPixmap，
+    文字标签只绘制一次到透明图层上。状态变化时只重绘变化区域的矩形。
+
+    控件可以自由缩放，画布取控件宽高中较小者并靠左上角绘制。新尺寸的
+    布局在后台线程生成，完成后在GUI线程一次性替换，生成期间继续使用旧布局
+    显示和处理输入；生成过的尺寸会被缓存。
+
+    子类需要设置 base_points (区域ID: (中心x, 中心y, 标签, ...)，基于600x600画布)，
+    然后调用 load_sprites()。SVG路径和标签位置默认按mai2的命名和区域表，
+    其他格式可设置 svg_name_prefix 或覆盖 svg_path(label, touched)、label_position(point)。布局替换后会调用 layout_changed()。
+    """
+    # SVG缩放比例，乘以尺寸因子后为实际缩放
+    sprite_scale = MAI2_SPRITE_SCALE
+    # SVG文件名前缀，SVG路径为 {svg_prefix}touch/{svg_name_prefix}{标签}[_touch].svg
+    svg_name_prefix = ""
+    # 为True时布局生成后同时生成命中检测栅格，见ZoneLayout.zones_at
+    hit_testing = False
+
+    # 后台生成的布局通过信号交回GUI线程
+    _layout_ready = pyqtSignal(object)
+
+    def __init__(self, parent=None, svg_prefix="", size_factor=1.0):
+        super().__init__(parent)
+        self.size_factor = size_factor
+        self.svg_prefix = svg_prefix
+        self.base_points = None
+        self.touch_points = {}
+        self.sprite_rects = {}
+        self.default_sprites = {}
+        self.touch_sprites = {}
+        self.layout = None
+        self.touched = set()
+        self.label_layer = None
+        self.requested_factor = size_factor
+        # 每次绘制完成后调用的回调，用于统计实际重绘
+        self.paint_listener = None
+        self.setSizePolicy(QSizePolicy.Policy.Expanding, QSizePolicy.Policy.Expanding)
+        self.setMinimumSize(CANVAS_STEP * 5, CANVAS_STEP * 5)
+        self._layout_ready.connect(self._on_layout_ready)
+        self._resize_timer = QTimer(self)
+        self._resize_timer.setSingleShot(True)
+        self._resize_timer.setInterval(RESIZE_SETTLE_MS)
+        self._resize_timer.timeout.connect(self._start_layout_job)
+
+    def svg_path(self, label, touched):
+        suffix = "_touch" if touched else ""
+        return f"{self.svg_prefix}touch/{self.svg_name_prefix}{label}{suffix}.svg"
+
+    def label_position(self, point):
+        # 文本位置取整
+        center_x, center_y = self.touch_points[point][:2]
+        return round(center_x - 10 * self.size_factor), round(center_y + 5 * self.size_factor)
+
+    def layout_changed(self):
+        """布局替换后调用，子类可覆盖以更新依赖尺寸的数据"""
+        pass
+
+    def canvas_size(self):
+        return round(BASE_CANVAS_SIZE * self.size_factor)
+
+    def sizeHint(self):
+        canvas = self.canvas_size()
+        return QSize(canvas, canvas)
+
+    def _layout_key(self, size_factor, device_pixel_ratio):
+        # 同一精灵组（相同的区域表、SVG和缩放比例）在同一尺寸下共用布局
+        return (id(self.base_points), self.svg_path('{label}', False), self.sprite_scale,
+                size_factor, device_pixel_ratio)
+
+    def load_sprites(self):
+        """同步生成并应用当前尺寸的布局，用于控件创建时"""
+        dpr = self.devicePixelRatioF()
+        key = self._layout_key(self.size_factor, dpr)
+        layout = _cached_layout(key)
+        if layout is None:
+            layout = build_zone_layout(self.base_points, self.svg_path, self.sprite_scale, self.size_factor, dpr)
+            _cache_layout(key, layout)
+        self.requested_factor = self.size_factor
+        self._apply_layout(layout)
+
+    def set_canvas_size(self, canvas_size):
+        """
+        切换到指定画布尺寸
+
+        已缓存的尺寸立即切换，否则等尺寸稳定RESIZE_SETTLE_MS后在后台生成，完成后再切换；
+        期间再次请求其他尺寸时，只生成最后请求的尺寸
+        """
+        factor = canvas_size / BASE_CANVAS_SIZE
+        if factor == self.requested_factor:
+            return
+        self.requested_factor = factor
+        layout = _cached_layout(self._layout_key(factor, self.devicePixelRatioF()))
+        if layout is not None:
+            self._resize_timer.stop()
+            self._apply_layout(layout)
+        else:
+            self._resize_timer.start()
+
+    def _start_layout_job(self):
+        _submit_layout_job(self._build_layout_job, self.requested_factor, self.devicePixelRatioF())
+
+    def _build_layout_job(self, factor, dpr):
+        """后台线程：生成布局后发回GUI线程"""
+        if factor != self.requested_factor:
+            return
+        layout = build_zone_layout(self.base_points, self.svg_path, self.sprite_scale, factor, dpr, renderers={})
+        if self.hit_testing:
+            layout.build_hit_raster()
+        try:
+            self._layout_ready.emit((self._layout_key(factor, dpr), layout))
+        except RuntimeError:
+            # 控件已被销毁
+            pass
+
+    def _on_layout_ready(self, result):
+        key, layout = result
+        _cache_layout(key, layout)
+        if layout.size_factor == self.requested_factor:
+            self._apply_layout(layout)
+
+    def _apply_layout(self, layout):
+        """在GUI线程中一次性替换布局"""
+        layout.create_pixmaps()
+        if self.hit_testing:
+            layout.build_hit_raster()
+        self.layout = layout
+        self.size_factor = layout.size_factor
+        self.touch_points = layout.touch_points
+        self.sprite_rects = layout.sprite_rects
+        self.default_sprites = layout.default_sprites
+        self.touch_sprites = layout.touch_sprites
+        # 字体大小取整
+        self.label_font = QFont("SEGA-Humming v2 B", max(8, round(12 * self.size_factor)))
+        self.label_layer = None
+        self.layout_changed()
+        self.update()
+
+    def resizeEvent(self, event):
+        svg_dir = os.path.dirname(self.svg_path('', False))
+        self.set_canvas_size(snap_canvas_size(min(self.width(), self.height()), svg_dir))
+        super().resizeEvent(event)
+
+    def _render_label_layer(self):
+        dpr = self.devicePixelRatioF()
+        canvas = self.canvas_size()
+        image = QImage(round(canvas * dpr), round(canvas * dpr), QImage.Format.Format_ARGB32_Premultiplied)
+        image.fill(Qt.GlobalColor.transparent)
+        image.setDevicePixelRatio(dpr)
+        painter = QPainter(image)
+        painter.setRenderHint(QPainter.RenderHint.Antialiasing)
+        painter.setFont(self.label_font)
+        painter.setPen(QColor(255, 255, 255))
+        for point, (center_x, center_y, label, *_) in self.touch_points.items():
+            text_x, text_y = self.label_position(point)
+            painter.drawText(text_x, text_y, label)
+        painter.end()
+        self.label_layer = QPixmap.fromImage(image)
+
+    def zone_touched(self, point, touched_points):
+        """判断区域在给定的触摸点列表中是否被触摸，子类可覆盖"""
+        return point in touched_points
+
+    def set_touched(self, touched_points):
+        """更新触摸状态，只重绘状态变化的区域；返回是否有区域变化"""
+        touched = {point for point in self.touch_points if self.zone_touched(point, touched_points)}
+        changed = touched ^ self.touched
+        if not changed:
+            return False
+        self.touched = touched
+        for point in changed:
+            self.update(self.sprite_rects[point])
+        return True
+
+    def update_zones(self, points, touched_points):
+        """只重新判断给定区域的触摸状态，用于已知哪些区域可能变化的增量更新；返回是否有区域变化"""
+        changed = False
+        for point in points:
+            rect = self.sprite_rects.get(point)
+            if rect is None:
+                continue
+            touched = self.zone_touched(point, touched_points)
+            if touched == (point in self.touched):
+                continue
+            if touched:
+                self.touched.add(point)
+            else:
+                self.touched.discard(point)
+            self.update(rect)
+            changed = True
+        return changed
+
+    def paintEvent(self, event):
+        painter = QPainter(self)
+        self.draw(painter, event.region(), event.rect())
+        painter.end()
+        if self.paint_listener is not None:
+            self.paint_listener()
+
+    def draw(self, painter, region, dirty):
+        """
+        绘制当前状态，也可用于把控件画到其他绘图设备上
+
+        参数:
+            region: 需要重绘的区域，区域外的精灵直接跳过
+            dirty: region的外接矩形
+        """
+        painter.fillRect(dirty, self.palette().window())
+        # 按原有顺序绘制与重绘区域相交的精灵，保持重叠部分的覆盖关系
+        for point, rect in self.sprite_rects.items():
+            if region.intersects(rect):
+                sprites = self.touch_sprites if point in self.touched else self.default_sprites
+                painter.drawPixmap(rect.topLeft(), sprites[point])
+        if self.label_layer is None:
+            self._render_label_layer()
+        canvas = self.canvas_size()
+        label_rect = dirty.intersected(QRect(0, 0, canvas, canvas))
+        if not label_rect.isEmpty():
+            painter.drawPixmap(QRectF(label_rect), self.label_layer, self._layer_source_rect(label_rect))
+
+    def _layer_source_rect(self, rect):
+        dpr = self.label_layer.devicePixelRatio()
+        return QRectF(rect.x() * dpr, rect.y() * dpr, rect.width() * dpr, rect.height() * dpr)
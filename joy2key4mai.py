@@ -1,51 +1,59 @@
-import pygame
+import math
 import time
-from pynput.keyboard import Controller
+import serial
+import threading
 from collections import deque
 
-# 初始化pygame
-pygame.init()
-
-# 创建键盘控制器
-keyboard = Controller()
+# 手柄按钮到键盘按键的映射配置 (按钮ID: 键盘按键)
+# 每个手柄按连接顺序分配一个映射方案，1P/2P可以各用一个手柄
+# 默认按钮布局为SEGA I/O 4及兼容协议的默认映射
+# 整数表示Windows虚拟键码，在创建键盘输出时转换为按键
+mapping_profiles = {
+    '1P': {
+        2: 'w',        # 1P 1号键
+        3: 'e',        # 1P 2号键
+        0: 'd',        # 1P 3号键
+        15: 'c',       # 1P 4号键
+        14: 'x',       # 1P 5号键
+        13: 'z',       # 1P 6号键
+        12: 'a',       # 1P 7号键
+        11: 'q',       # 1P 8号键
+    },
+    '2P': {
+        # 小键盘按键 (VK_NUMPAD0 = 0x60)
+        2: 0x68,       # 2P 1号键 num 8
+        3: 0x69,       # 2P 2号键 num 9
+        0: 0x66,       # 2P 3号键 num 6
+        15: 0x63,      # 2P 4号键 num 3
+        14: 0x62,      # 2P 5号键 num 2
+        13: 0x61,      # 2P 6号键 num 1
+        12: 0x64,      # 2P 7号键 num 4
+        11: 0x67,      # 2P 8号键 num 7
+    },
+}
 
-# 初始化游戏手柄
-pygame.joystick.init()
-joystick_count = pygame.joystick.get_count()
+# 映射方案分配顺序，第一个连接的手柄为1P，第二个为2P
+# 超出数量的手柄会被忽略
+profile_order = ['1P', '2P']
 
-# 检查是否有连接的手柄设备
-if joystick_count == 0:
-    print("未检测到设备")
-    exit()
+# 输出方式
+# 'keyboard': 通过系统键盘输入模拟按键
+# 'serial': 按钮状态直接编码为触摸串口数据帧写入串口，绕过系统输入，延迟更低
+output_mode = 'keyboard'
 
-# 获取第一个手柄并初始化
-joystick = pygame.joystick.Joystick(0)
-joystick.init()
+# 串口输出格式
+# 'mai2': 9字节mai2触摸帧，每个映射方案使用各自的串口
+# 'mai': 14字节旧框触摸帧，1P/2P写入同一帧的P1/P2字段，只使用1P的串口
+serial_format = 'mai2'
 
-print(f"检测到设备: {joystick.get_name()}")
+# 各映射方案对应的串口，可以是COM口或pty路径(如/dev/pts/3)
+serial_ports = {'1P': 'COM33', '2P': 'COM34'}
+BAUD_RATE = 9600
 
-# 手柄按钮到键盘按键的映射配置 (按钮ID: 键盘按键)
-# 默认为SEGA I/O 4及兼容协议的默认映射
-button_mapping = {
-    2: 'w',        # 1P 1号键
-    3: 'e',        # 1P 2号键
-    0: 'd',        # 1P 3号键
-    15: 'c',       # 1P 4号键
-    14: 'x',       # 1P 5号键
-    13: 'z',       # 1P 6号键
-    12: 'a',       # 1P 7号键
-    11: 'q'       # 1P 8号键
-    ''',
-    #可根据需要添加
-    19: 'num 8',   # 2P 1号键
-    20: 'num 9',   # 2P 2号键
-    17: 'num 6',   # 2P 3号键
-    32: 'num 3',   # 2P 4号键
-    31: 'num 2',   # 2P 5号键
-    30: 'num 1',   # 2P 6号键
-    29: 'num 4',   # 2P 7号键
-    28: 'num 7',   # 2P 8号键
-    '''
+# 串口输出时手柄按钮对应的触摸区域 (按钮ID: 区域)
+zone_mapping = {
+    2: 'A1', 3: 'A2', 0: 'A3', 15: 'A4',
+    14: 'A5', 13: 'A6', 12: 'A7', 11: 'A8',
 }
 
 # 输入延迟设置（毫秒）
@@ -53,80 +61,543 @@ button_mapping = {
 # 由于旧框尾判特性，不建议高于25ms
 delay_ms = 0
 
-# 延迟事件缓冲区
-delayed_buffer = deque()
+# 无事件时的最长等待时间（毫秒）
+# 线程阻塞在输入源的等待中，空闲时几乎不占用CPU
+wait_timeout_ms = 100
+
+# A区在各格式中的(字节位置, 位位置)
+MAI2_ZONE_BITS = {
+    'A1': (1, 0), 'A2': (1, 1), 'A3': (1, 2), 'A4': (1, 3),
+    'A5': (1, 4), 'A6': (2, 0), 'A7': (2, 1), 'A8': (2, 2),
+}
+MAI_ZONE_BITS = {
+    'A1': (1, 0), 'A2': (1, 2), 'A3': (2, 0), 'A4': (2, 2),
+    'A5': (3, 0), 'A6': (3, 2), 'A7': (4, 0), 'A8': (4, 2),
+}
+# 旧框帧中P2字段相对P1字段的字节偏移
+MAI_P2_OFFSET = 6
+
+
+# ---------------------------------------------------------------------------
+# 输入源
+#
+# 输入源把设备事件转换为统一的元组 (事件类型, 设备ID, 参数):
+#   ('added', 设备ID, 设备名称)    设备连接
+#   ('removed', 设备ID, None)      设备断开
+#   ('press', 设备ID, 按钮ID)      按钮按下
+#   ('release', 设备ID, 按钮ID)    按钮释放
+#   ('quit', None, None)           退出
+# 需要实现 wait(timeout_ms) 阻塞等待并返回事件列表，poll() 不阻塞返回已到达的事件，
+# 以及 close()。
+# ---------------------------------------------------------------------------
+
+class PygameJoystickSource:
+    """通过pygame读取手柄事件的输入源"""
+    def __init__(self):
+        # 只在使用手柄时才需要pygame，无头测试不依赖它
+        import pygame
+        self.pygame = pygame
+        pygame.init()
+        pygame.joystick.init()
+
+        # 只关心手柄按钮和热插拔事件，其余事件不会唤醒等待
+        pygame.event.set_blocked(None)
+        pygame.event.set_allowed([
+            pygame.JOYBUTTONDOWN, pygame.JOYBUTTONUP,
+            pygame.JOYDEVICEADDED, pygame.JOYDEVICEREMOVED, pygame.QUIT
+        ])
+
+        # 已打开的手柄: instance_id -> 手柄对象
+        self.joysticks = {}
+        # 事件过滤设置前已连接的设备先主动打开，之后的插拔通过事件处理
+        self.pending = []
+        for device_index in range(pygame.joystick.get_count()):
+            self.pending.extend(self._open(device_index))
 
-# 上次处理时间
-last_process_time = 0
+    def _open(self, device_index):
+        joystick = self.pygame.joystick.Joystick(device_index)
+        instance_id = joystick.get_instance_id()
+        # 启动时已打开的设备之后还会收到JOYDEVICEADDED，直接忽略
+        if instance_id in self.joysticks:
+            return []
+        joystick.init()
+        self.joysticks[instance_id] = joystick
+        return [('added', instance_id, joystick.get_name())]
 
-def handle_button(button_id, pressed):
+    def _convert(self, events):
+        pygame = self.pygame
+        result = self.pending
+        self.pending = []
+        for event in events:
+            if event.type == pygame.JOYBUTTONDOWN:
+                result.append(('press', event.instance_id, event.button))
+            elif event.type == pygame.JOYBUTTONUP:
+                result.append(('release', event.instance_id, event.button))
+            elif event.type == pygame.JOYDEVICEADDED:
+                result.extend(self._open(event.device_index))
+            elif event.type == pygame.JOYDEVICEREMOVED:
+                self.joysticks.pop(event.instance_id, None)
+                result.append(('removed', event.instance_id, None))
+            elif event.type == pygame.QUIT:
+                result.append(('quit', None, None))
+        return result
+
+    def wait(self, timeout_ms):
+        """
+        阻塞等待手柄事件，返回本次唤醒时队列中的全部事件
+
+        参数:
+            timeout_ms: 最长等待时间（毫秒），超时返回空列表
+        """
+        if self.pending:
+            return self.poll()
+        # pygame.event.wait的超时为0时会无限等待，至少等待1ms
+        event = self.pygame.event.wait(max(1, timeout_ms))
+        if event.type == self.pygame.NOEVENT:
+            return []
+        # 一次唤醒处理完已到达的所有事件，保持原有顺序
+        return self._convert([event] + self.pygame.event.get())
+
+    def poll(self):
+        return self._convert(self.pygame.event.get())
+
+    def close(self):
+        self.pygame.quit()
+
+
+class ScriptedInputSource:
     """
-    处理按钮事件，映射到键盘按键
-    
-    参数:
-        button_id: 手柄按钮ID
-        pressed: 按钮是否被按下
+    按脚本回放事件的输入源，用于在没有手柄的机器上测试和测量延迟
+
+    脚本为 (相对开始时间(秒), 事件类型, 设备ID, 参数) 的列表，按时间排序。
+    realtime为False时不等待，事件逐个立即返回，用于测量吞吐量。
+    每个事件实际计划发生的单调时钟时间记录在event_times中。
     """
-    if button_id in button_mapping:
-        # 获取映射的键盘按键
-        key = button_mapping[button_id]
-        
+    def __init__(self, script, realtime=True):
+        self.script = script
+        self.realtime = realtime
+        self.index = 0
+        self.start_time = None
+        self.event_times = []
+
+    def _take_due(self, now):
+        events = []
+        while self.index < len(self.script):
+            offset, kind, device_id, detail = self.script[self.index]
+            due = self.start_time + offset if self.realtime else now
+            if due > now:
+                break
+            events.append((kind, device_id, detail))
+            if kind in ('press', 'release'):
+                self.event_times.append(due)
+            self.index += 1
+            if not self.realtime:
+                break
+        return events
+
+    def wait(self, timeout_ms):
+        now = time.monotonic()
+        if self.start_time is None:
+            self.start_time = now
+        if self.index >= len(self.script):
+            return [('quit', None, None)]
+        if self.realtime:
+            due = self.start_time + self.script[self.index][0]
+            sleep_time = min(due - now, timeout_ms / 1000)
+            if sleep_time > 0:
+                time.sleep(sleep_time)
+                now = time.monotonic()
+        return self._take_due(now)
+
+    def poll(self):
+        if self.start_time is None or self.index >= len(self.script):
+            return []
+        return self._take_due(time.monotonic())
+
+    def close(self):
+        pass
+
+
+# ---------------------------------------------------------------------------
+# 输出端
+#
+# 需要实现:
+#   resolve(profile, button_id)  查找按钮的输出目标，未映射时返回None
+#   apply(target, pressed)       执行按下/释放动作
+#   flush()                      一批动作处理完后调用
+#   close()
+# ---------------------------------------------------------------------------
+
+class KeyboardSink:
+    """通过pynput模拟系统键盘按键"""
+    def __init__(self, profiles):
+        # pynput在没有图形环境的机器上无法导入，只在使用键盘输出时导入
+        from pynput.keyboard import Controller, KeyCode
+        self.keyboard = Controller()
+        self.profiles = {
+            name: {button_id: KeyCode.from_vk(key) if isinstance(key, int) else key
+                   for button_id, key in mapping.items()}
+            for name, mapping in profiles.items()
+        }
+
+    def resolve(self, profile, button_id):
+        return self.profiles[profile].get(button_id)
+
+    def apply(self, target, pressed):
         # 处理按键逻辑 (按下或释放)
         if pressed:
-            keyboard.press(key)
-            # print(f"按下: 按钮{button_id} -> 键盘'{key}'")
+            self.keyboard.press(target)
+            # print(f"按下: 键盘'{target}'")
         else:
-            keyboard.release(key)
-            # print(f"释放: 按钮{button_id} -> 键盘'{key}'")
+            self.keyboard.release(target)
+            # print(f"释放: 键盘'{target}'")
 
+    def flush(self):
+        pass
 
-# 加载完配置后主程序开始
-print("手柄按键监听已启动，按Ctrl+C退出")
+    def close(self):
+        pass
 
-try:
-    while delay_ms == 0:
-        # 处理所有pygame事件
-        for event in pygame.event.get():
-            # 根据事件类型处理按键
-            if event.type == pygame.JOYBUTTONDOWN:
-                handle_button(event.button, True)
-            elif event.type == pygame.JOYBUTTONUP:
-                handle_button(event.button, False)
-
-    while delay_ms > 0:
-        # 获取当前时间（毫秒）
-        current_time = time.time() * 1000  
-        
-        # 处理所有pygame事件
-        for event in pygame.event.get():
-            # 处理按钮按下事件
-            if event.type == pygame.JOYBUTTONDOWN:
-                release_time = current_time + delay_ms
-                delayed_buffer.append(('press', event.button, release_time))
-            
-            # 处理按钮释放事件
-            elif event.type == pygame.JOYBUTTONUP:
-                release_time = current_time + delay_ms
-                delayed_buffer.append(('release', event.button, release_time))
-        
-        # 处理延迟缓冲区中到期的事件
-        while delayed_buffer and current_time >= delayed_buffer[0][2]:
-            event_type, button_id, _ = delayed_buffer.popleft()
-
-            # 根据事件类型处理按键
-            if event_type == 'press':
-                handle_button(button_id, True)
-            elif event_type == 'release':
-                handle_button(button_id, False)
-        
-        # 短暂休眠以减少CPU占用
-        time.sleep(0.001)  
-
-# 捕获Ctrl+C中断信号
-except KeyboardInterrupt:
-    print("\n程序被用户中断")
-
-# 确保资源被正确释放
-finally:
-    pygame.quit()
-    print("\n程序已退出")
+
+class SerialTouchOutput:
+    """
+    将按钮状态编码为触摸数据帧写入串口
+
+    帧只在状态变化时发送；收到{STAT}前不发送，收到后立即补发当前状态。
+    同时应答游戏发来的命令，行为与触摸控制器一致。
+    """
+    def __init__(self, port, frame_format):
+        self.frame_format = frame_format
+        if frame_format == 'mai2':
+            self.zone_bits = MAI2_ZONE_BITS
+            self.frame = bytearray([0x28] + [0x00] * 7 + [0x29])
+        else:
+            self.zone_bits = MAI_ZONE_BITS
+            self.frame = bytearray([0x28] + [0x40] * 12 + [0x29])
+        self.last_sent = None
+        self.active = False
+        self.key_mappings = {}
+        self.lock = threading.Lock()
+        self.serial = serial.Serial(port, BAUD_RATE, timeout=0.1)
+        self.running = True
+        self.receive_thread = threading.Thread(target=self._receive_loop, daemon=True)
+        self.receive_thread.start()
+        print(f"串口输出已启动: {self.serial.name} ({frame_format})")
+
+    def set_zone(self, player, zone, pressed):
+        """
+        更新一个区域的状态，不立即发送
+
+        参数:
+            player: 玩家序号，1或2，仅旧框格式使用
+            zone: 区域名称
+            pressed: 是否按下
+        """
+        byte_pos, bit_pos = self.zone_bits[zone]
+        if self.frame_format == 'mai' and player == 2:
+            byte_pos += MAI_P2_OFFSET
+        with self.lock:
+            if pressed:
+                self.frame[byte_pos] |= (1 << bit_pos)
+            else:
+                self.frame[byte_pos] &= ~(1 << bit_pos)
+
+    def flush(self):
+        """状态与上次发送的不同时发送当前帧"""
+        with self.lock:
+            if not self.active or self.frame == self.last_sent:
+                return
+            frame = bytes(self.frame)
+            self.serial.write(frame)
+            self.last_sent = frame
+
+    def _receive_loop(self):
+        """读取并应答游戏命令，读取带超时阻塞，不空转"""
+        buffer = b''
+        while self.running:
+            try:
+                data = self.serial.read(max(1, self.serial.in_waiting))
+                if not data:
+                    continue
+                # 按'}'切分命令，超时前只收到一部分的命令留到下次读取
+                buffer += data
+                end = buffer.find(b'}')
+                while end >= 0:
+                    start = buffer.rfind(b'{', 0, end)
+                    self._process_command(buffer[max(0, start):end + 1])
+                    buffer = buffer[end + 1:]
+                    end = buffer.find(b'}')
+                buffer = buffer[-64:]
+            except Exception as e:
+                if self.running:
+                    print(f"串口读取错误: {e}")
+                    time.sleep(0.1)
+
+    def _process_command(self, data):
+        if len(data) == 6 and data.startswith(b'{') and data.endswith(b'}'):
+            if self.frame_format == 'mai2' and data[3] in (ord('k'), ord('r')):
+                # 灵敏度设置{XXkY}/{XXrY}，原样应答(XXkY)
+                response = b'(' + data[1:5] + b')'
+                with self.lock:
+                    self.serial.write(response)
+                return
+            if self.frame_format == 'mai' and data[3] == ord('k'):
+                # 旧框映射设置{XXkY}，应答(XX  )
+                self.key_mappings[data[1:3]] = data[4:5]
+                with self.lock:
+                    self.serial.write(b'(' + data[1:3] + b'  )')
+                return
+            if self.frame_format == 'mai' and data[3:5] == b'th':
+                # 旧框映射查询{XXth}，应答(XX Y)
+                if data[1:3] in self.key_mappings:
+                    with self.lock:
+                        self.serial.write(b'(' + data[1:3] + b' ' + self.key_mappings[data[1:3]] + b')')
+                return
+
+        if b'{STAT}' in data:
+            with self.lock:
+                self.active = True
+                self.last_sent = None
+            self.flush()
+        elif b'{HALT}' in data:
+            with self.lock:
+                self.active = False
+
+    def close(self):
+        self.running = False
+        self.serial.close()
+
+
+class SerialTouchSink:
+    """将按钮直接输出为串口触摸帧，目标为(输出对象, 玩家序号, 区域)"""
+    def __init__(self, frame_format, ports, profiles):
+        # 串口输出对象: 映射方案名 -> (输出对象, 玩家序号)
+        # 串口打不开的映射方案不输出，不影响其他方案（如单人时不存在2P的串口）
+        self.outputs = {}
+        if frame_format == 'mai2':
+            for name in profiles:
+                output = self._open(ports[name], 'mai2', name)
+                if output is not None:
+                    self.outputs[name] = (output, 1)
+        else:
+            shared_output = self._open(ports[profiles[0]], 'mai', profiles[0])
+            if shared_output is not None:
+                for player, name in enumerate(profiles, start=1):
+                    self.outputs[name] = (shared_output, player)
+        self.unique_outputs = list({output: None for output, player in self.outputs.values()})
+
+    @staticmethod
+    def _open(port, frame_format, profile):
+        try:
+            return SerialTouchOutput(port, frame_format)
+        except serial.SerialException as e:
+            print(f"无法打开{profile}的串口 {port}，该方案不输出: {e}")
+            return None
+
+    def resolve(self, profile, button_id):
+        if button_id not in zone_mapping or profile not in self.outputs:
+            return None
+        output, player = self.outputs[profile]
+        return (output, player, zone_mapping[button_id])
+
+    def apply(self, target, pressed):
+        # 只更新帧内容，一批动作处理完后由flush统一发送
+        output, player, zone = target
+        output.set_zone(player, zone, pressed)
+
+    def flush(self):
+        # 同一批次的多个按钮合并为一帧
+        for output in self.unique_outputs:
+            output.flush()
+
+    def close(self):
+        for output in self.unique_outputs:
+            output.close()
+
+
+class RecordingSink:
+    """
+    记录所有按键动作的输出端，用于测试和测量延迟
+
+    actions中每个元素为(输出目标, 是否按下, 执行时的单调时钟时间)
+    """
+    def __init__(self, profiles):
+        self.profiles = profiles
+        self.actions = []
+
+    def resolve(self, profile, button_id):
+        return self.profiles[profile].get(button_id)
+
+    def apply(self, target, pressed):
+        self.actions.append((target, pressed, time.monotonic()))
+
+    def flush(self):
+        pass
+
+    def close(self):
+        pass
+
+
+# ---------------------------------------------------------------------------
+# 映射主循环
+# ---------------------------------------------------------------------------
+
+class Joy2Key:
+    """
+    从输入源读取事件，按映射方案转换后交给输出端
+
+    参数:
+        source: 输入源
+        sink: 输出端
+        delay_ms: 输入延迟（毫秒），0为立即输出
+        profiles: 映射方案分配顺序
+        wait_timeout_ms: 无事件时的最长等待时间（毫秒）
+    """
+    def __init__(self, source, sink, delay_ms=0, profiles=None, wait_timeout_ms=100):
+        self.source = source
+        self.sink = sink
+        self.delay_ms = delay_ms
+        self.profiles = profiles or profile_order
+        self.wait_timeout_ms = wait_timeout_ms
+        # 已连接的设备: 设备ID -> {'name': 设备名称, 'profile': 映射方案名, 'pressed': 按下中的按钮}
+        self.devices = {}
+        # 延迟事件缓冲区，元素为(事件类型, 输出目标, 到期时间)
+        # 延迟固定，按到达顺序入队即按到期时间排序
+        self.delayed_buffer = deque()
+
+    def attach_device(self, device_id, name):
+        """为新连接的设备分配映射方案"""
+        used_profiles = {device['profile'] for device in self.devices.values()}
+        free_profiles = [profile for profile in self.profiles if profile not in used_profiles]
+        if not free_profiles:
+            print(f"忽略设备: {name}（已无可用的映射方案）")
+            return
+        self.devices[device_id] = {'name': name, 'profile': free_profiles[0], 'pressed': set()}
+        print(f"检测到设备: {name} -> {free_profiles[0]}")
+
+    def detach_device(self, device_id):
+        """移除断开的设备，返回需要补发的按键释放动作"""
+        device = self.devices.pop(device_id, None)
+        if device is None:
+            return []
+        print(f"设备已断开: {device['name']} ({device['profile']})")
+        # 断开时仍按下的按钮需要释放，避免按键卡住
+        return [('release', self.sink.resolve(device['profile'], button_id))
+                for button_id in sorted(device['pressed'])]
+
+    def translate_event(self, event):
+        """
+        将输入事件转换为按键动作列表，元素为(事件类型, 输出目标)
+
+        输出目标在事件到达时就确定，延迟执行期间设备断开也不会影响已排队的动作
+        """
+        kind, device_id, detail = event
+        if kind == 'added':
+            self.attach_device(device_id, detail)
+            return []
+        if kind == 'removed':
+            return self.detach_device(device_id)
+
+        device = self.devices.get(device_id)
+        if device is None:
+            return []
+        target = self.sink.resolve(device['profile'], detail)
+        if target is None:
+            return []
+
+        if kind == 'press':
+            device['pressed'].add(detail)
+        else:
+            device['pressed'].discard(detail)
+        return [(kind, target)]
+
+    def run(self):
+        if self.delay_ms > 0:
+            self.run_delayed()
+        else:
+            self.run_immediate()
+
+    def run_immediate(self):
+        """无延迟模式：事件到达立即映射为按键"""
+        quitting = False
+        while not quitting:
+            for event in self.source.wait(self.wait_timeout_ms):
+                if event[0] == 'quit':
+                    quitting = True
+                    break
+                for event_type, target in self.translate_event(event):
+                    self.sink.apply(target, event_type == 'press')
+            # 退出前同样写出本批已应用的动作
+            self.sink.flush()
+
+    def run_delayed(self):
+        """
+        延迟模式：事件按到达时间加上delay_ms后依次执行
+
+        等待时间按缓冲区队首的到期时间计算，到期前线程一直阻塞，
+        不再每1ms轮询一次。所有时间均基于单调时钟，不受系统时间调整影响。
+        输入源退出时先执行完缓冲区中剩余的动作。
+        """
+        delay = self.delay_ms / 1000
+        delayed_buffer = self.delayed_buffer
+        quitting = False
+        while not quitting or delayed_buffer:
+            # 计算距离下一个到期事件的时间，没有待执行事件时按默认超时等待
+            if delayed_buffer:
+                remaining = delayed_buffer[0][2] - time.monotonic()
+                timeout_ms = min(self.wait_timeout_ms, math.ceil(remaining * 1000))
+            else:
+                timeout_ms = self.wait_timeout_ms
+
+            if quitting:
+                if timeout_ms > 0:
+                    time.sleep(timeout_ms / 1000)
+                events = []
+            elif timeout_ms > 0:
+                events = self.source.wait(timeout_ms)
+            else:
+                events = self.source.poll()
+
+            # 新事件以到达时刻为基准加入缓冲区
+            current_time = time.monotonic()
+            for event in events:
+                if event[0] == 'quit':
+                    quitting = True
+                    break
+                for event_type, target in self.translate_event(event):
+                    delayed_buffer.append((event_type, target, current_time + delay))
+
+            # 处理延迟缓冲区中到期的事件
+            current_time = time.monotonic()
+            while delayed_buffer and current_time >= delayed_buffer[0][2]:
+                event_type, target, _ = delayed_buffer.popleft()
+                self.sink.apply(target, event_type == 'press')
+            self.sink.flush()
+
+
+if __name__ == "__main__":
+    source = PygameJoystickSource()
+    if output_mode == 'serial':
+        sink = SerialTouchSink(serial_format, serial_ports, profile_order)
+    else:
+        sink = KeyboardSink(mapping_profiles)
+    joy2key = Joy2Key(source, sink, delay_ms=delay_ms, profiles=profile_order,
+                      wait_timeout_ms=wait_timeout_ms)
+
+    # 加载完配置后主程序开始
+    if not source.joysticks:
+        print("未检测到设备，等待手柄连接...")
+    print("手柄按键监听已启动，按Ctrl+C退出")
+
+    try:
+        joy2key.run()
+
+    # 捕获Ctrl+C中断信号
+    except KeyboardInterrupt:
+        print("\n程序被用户中断")
+
+    # 确保资源被正确释放
+    finally:
+        sink.close()
+        source.close()
+        print("\n程序已退出")
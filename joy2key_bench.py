@@ -0,0 +1,91 @@
+import random
+import argparse
+from joy2key4mai import Joy2Key, ScriptedInputSource, RecordingSink, mapping_profiles
+
+def generate_script(count, rate, seed=0):
+    """
+    生成随机的按钮按下/释放脚本
+
+    参数:
+        count: 按下/释放事件总数
+        rate: 平均每秒事件数，事件间隔服从指数分布
+        seed: 随机种子
+    """
+    rng = random.Random(seed)
+    buttons = list(mapping_profiles['1P'].keys())
+    script = [(0.0, 'added', 0, 'scripted pad')]
+    pressed = set()
+    offset = 0.01
+    for _ in range(count):
+        offset += rng.expovariate(rate)
+        # 已按下的按钮释放，其余按钮按下
+        button = rng.choice(buttons)
+        if button in pressed:
+            pressed.discard(button)
+            script.append((offset, 'release', 0, button))
+        else:
+            pressed.add(button)
+            script.append((offset, 'press', 0, button))
+    return script
+
+def percentile(sorted_values, p):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(p / 100 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+def run_once(script, delay_ms, realtime):
+    """运行一次脚本，返回(事件计划时间列表, 动作列表)"""
+    source = ScriptedInputSource(script, realtime=realtime)
+    sink = RecordingSink(mapping_profiles)
+    Joy2Key(source, sink, delay_ms=delay_ms).run()
+    return source.event_times, sink.actions
+
+def report_latency(script, delay_ms):
+    """按实时节奏回放脚本，统计事件到按键动作的延迟分布"""
+    event_times, actions = run_once(script, delay_ms, realtime=True)
+    if len(event_times) != len(actions):
+        print(f"  事件数{len(event_times)}与动作数{len(actions)}不一致")
+        return
+    # 减去设定的延迟，得到调度本身带来的额外延迟
+    latencies = sorted((t_action - t_event) * 1000 - delay_ms
+                       for t_event, (_, _, t_action) in zip(event_times, actions))
+    print(f"  事件数: {len(latencies)}")
+    print(f"  额外延迟(ms): min={latencies[0]:.3f} p50={percentile(latencies, 50):.3f} "
+          f"p90={percentile(latencies, 90):.3f} p99={percentile(latencies, 99):.3f} "
+          f"max={latencies[-1]:.3f}")
+
+def report_throughput(script, delay_ms):
+    """不等待直接回放脚本，统计每秒可处理的事件数"""
+    event_times, actions = run_once(script, delay_ms, realtime=False)
+    if not actions:
+        print("  没有产生按键动作")
+        return
+    elapsed = actions[-1][2] - event_times[0]
+    print(f"  动作数: {len(actions)}  耗时: {elapsed * 1000:.1f}ms  "
+          f"吞吐量: {len(actions) / elapsed:.0f} 事件/秒")
+
+def main():
+    parser = argparse.ArgumentParser(description='joy2key4mai 无头延迟与吞吐量测试')
+    parser.add_argument('-n', '--count', type=int, default=500,
+                        help='延迟测试的事件数（默认：500）')
+    parser.add_argument('-r', '--rate', type=float, default=100,
+                        help='延迟测试中平均每秒事件数（默认：100）')
+    parser.add_argument('-t', '--throughput-count', type=int, default=100000,
+                        help='吞吐量测试的事件数（默认：100000）')
+    parser.add_argument('-d', '--delay', type=int, default=16,
+                        help='延迟模式使用的输入延迟，毫秒（默认：16）')
+    args = parser.parse_args()
+
+    latency_script = generate_script(args.count, args.rate)
+    throughput_script = generate_script(args.throughput_count, 1000)
+
+    for name, delay_ms in (("立即模式", 0), (f"延迟模式 ({args.delay}ms)", args.delay)):
+        print(f"\n{name}")
+        print("- 延迟")
+        report_latency(latency_script, delay_ms)
+        print("- 吞吐量")
+        report_throughput(throughput_script, delay_ms)
+
+if __name__ == '__main__':
+    main()
@@ -9,6 +9,14 @@ GOPI = 'COM33'  # Game out Python in
 CIPO = 'COM13'  # Controller in Python out
 BAUD_RATE = 9600
 
+# 透传模式：两个串口之间原样转发mai2数据和指令，不转换、不延迟、不处理映射指令，
+# 用于测量桥接本身的传输开销，或作为控制器与新版游戏之间的串口监听
+PASSTHROUGH = False
+# 透传模式下是否把控制器发往游戏的数据也写入日志
+LOG_CONTROLLER_DATA = False
+# 每隔多少秒输出一次收发统计，0为不输出
+STATS_INTERVAL = 0
+
 # Default all-zero state for the game (14 bytes including start/end markers)
 ALL_ZERO_STATE = bytes([
     0x28,       # Start byte '('
@@ -19,12 +27,59 @@ ALL_ZERO_STATE = bytes([
     0x29         # End byte ')'
 ])
 
+class LinkStats:
+    """
+    一个方向的收发统计
+
+    frames: 由收到的数据产生的写出次数，latency为从读到数据（延迟发送的数据从预定的发送时刻）
+            到写出完成的耗时，work为其中转换等处理的耗时；resent: 重发上一状态的次数
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.frames = 0
+        self.bytes = 0
+        self.resent = 0
+        self.latency_total = 0.0
+        self.latency_max = 0.0
+        self.work_total = 0.0
+
+    def record(self, size, received_at=None, work=0.0):
+        with self.lock:
+            self.bytes += size
+            if received_at is None:
+                self.resent += 1
+                return
+            latency = time.perf_counter() - received_at
+            self.frames += 1
+            self.latency_total += latency
+            self.latency_max = max(self.latency_max, latency)
+            self.work_total += work
+
+    def report(self, interval):
+        """返回统计文本并清零"""
+        with self.lock:
+            frames = self.frames
+            text = f"{self.name}: {frames} frames ({frames / interval:.1f}/s), {self.bytes} bytes"
+            if frames:
+                text += (f", latency avg {self.latency_total / frames * 1000:.3f}ms"
+                         f" max {self.latency_max * 1000:.3f}ms, work avg {self.work_total / frames * 1e6:.1f}us")
+            if self.resent:
+                text += f", resent {self.resent}"
+            self.reset()
+        return text
+
 class TouchBridge:
-    def __init__(self):
+    def __init__(self, passthrough=False):
         self.active = False
+        self.passthrough = passthrough
         self.GOPI = None
         self.CIPO = None
-        self.lock = threading.Lock()
+        self.lock = threading.RLock()
         self.received_commands = []
         self.command_log_file = "GOPI_commands.log"
         # 存储XXkY映射关系的字典
@@ -34,10 +89,14 @@ class TouchBridge:
         self.delayed_buffer = deque()  
         self.last_state = ALL_ZERO_STATE  
 
-    def log_command(self, data):
+        # 两个方向的收发统计，两种模式共用
+        self.to_game = LinkStats("CIPO->GOPI")
+        self.to_controller = LinkStats("GOPI->CIPO")
+
+    def log_command(self, data, label="Received"):
         """记录所有接收到的COM3指令"""
         timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S.%f")[:-3]
-        log_entry = f"[{timestamp}] Received: {data}\n"
+        log_entry = f"[{timestamp}] {label}: {data}\n"
         self.received_commands.append(log_entry)
         
         with open(self.command_log_file, "a", encoding="utf-8") as f:
@@ -96,115 +155,147 @@ class TouchBridge:
     
         return bytes(mai_data)
     
-    def handle_GOPI_to_CIPO(self):
-        """Handle communication from game to touch controller"""
+    def send(self, port, data, stats, received_at=None, work=0.0):
+        """写出数据并计入统计，received_at为None时记为重发"""
+        with self.lock:
+            port.write(data)
+        stats.record(len(data), received_at, work)
+
+    def io_loop(self, name, port, on_data, on_idle=None):
+        """
+        两种模式共用的串口读取循环
+        读出port上所有可用的数据，连同读到的时刻交给on_data；每轮之后执行on_idle
+        """
         while True:
             try:
-                if self.GOPI.in_waiting > 0:
-                    data = self.GOPI.read(self.GOPI.in_waiting)
-                    self.log_command(data)
-                    
-                    # 处理特殊格式{XXkY}的命令（建立映射关系）
-                    if len(data) == 6 and data.startswith(b'{') and data.endswith(b'}'):
-                        if data[3] == ord('k'):  # 第三位是k
-                            prefix = data[1:3].decode('ascii')  # 提取XX
-                            suffix = data[4:5]  # 提取Y
-                            # 存储映射关系
-                            self.key_mappings[prefix] = suffix
-                            # 响应(xx  )
-                            response = b'(' + data[1:3] + b'  )'
-                            with self.lock:
-                                self.GOPI.write(response)
-                            print(f"Registered mapping: {prefix} -> {suffix}")
-                            print(f"Responded to mapping command: {data} -> {response}")
-                            continue
-                    
-                    # 处理查询格式{XXth}的命令
-                    if len(data) == 6 and data.startswith(b'{') and data.endswith(b'}'):
-                        if data[3:5] == b'th':  # 第4-5位是th
-                            prefix = data[1:3].decode('ascii')  # 提取XX
-                            # 查找映射关系
-                            if prefix in self.key_mappings:
-                                y_value = self.key_mappings[prefix]
-                                # 响应(xx Y)
-                                response = b'(' + data[1:3] + b' ' + y_value + b')'
-                                with self.lock:
-                                    self.GOPI.write(response)
-                                print(f"Responded to query: {data} -> {response}")
-                            else:
-                                print(f"No mapping found for prefix: {prefix}")
-                            continue
-                    
-                    # 处理标准命令
-                    if b'{STAT}' in data:
-                        with self.lock:
-                            self.active = True
-                            self.GOPI.write(ALL_ZERO_STATE)
-                            self.CIPO.write(b'{STAT}')
-                            self.last_state = ALL_ZERO_STATE
-                            print("Handled STAT command")
-                    elif b'{HALT}' in data:
-                        with self.lock:
-                            self.active = False
-                            self.CIPO.write(b'{HALT}')
-                            print("Handled HALT command")
-                            
+                received = False
+                if port.in_waiting > 0:
+                    data = port.read(port.in_waiting)
+                    received = True
+                    on_data(data, time.perf_counter())
+                if on_idle is not None:
+                    on_idle()
+                if not received or on_idle is not None:
+                    time.sleep(0.001)
             except Exception as e:
-                print(f"Error in GOPI handler: {e}")
+                print(f"Error in {name} handler: {e}")
                 time.sleep(1)
 
-    def handle_CIPO_to_GOPI(self):
+    def handle_game_data(self, data, received_at):
+        """Handle communication from game to touch controller"""
+        self.log_command(data)
+        
+        # 处理特殊格式{XXkY}的命令（建立映射关系）
+        if len(data) == 6 and data.startswith(b'{') and data.endswith(b'}'):
+            if data[3] == ord('k'):  # 第三位是k
+                prefix = data[1:3].decode('ascii')  # 提取XX
+                suffix = data[4:5]  # 提取Y
+                # 存储映射关系
+                self.key_mappings[prefix] = suffix
+                # 响应(xx  )
+                response = b'(' + data[1:3] + b'  )'
+                self.send(self.GOPI, response, self.to_game, received_at)
+                print(f"Registered mapping: {prefix} -> {suffix}")
+                print(f"Responded to mapping command: {data} -> {response}")
+                return
+        
+        # 处理查询格式{XXth}的命令
+        if len(data) == 6 and data.startswith(b'{') and data.endswith(b'}'):
+            if data[3:5] == b'th':  # 第4-5位是th
+                prefix = data[1:3].decode('ascii')  # 提取XX
+                # 查找映射关系
+                if prefix in self.key_mappings:
+                    y_value = self.key_mappings[prefix]
+                    # 响应(xx Y)
+                    response = b'(' + data[1:3] + b' ' + y_value + b')'
+                    self.send(self.GOPI, response, self.to_game, received_at)
+                    print(f"Responded to query: {data} -> {response}")
+                else:
+                    print(f"No mapping found for prefix: {prefix}")
+                return
+        
+        # 处理标准命令
+        if b'{STAT}' in data:
+            with self.lock:
+                self.active = True
+                self.send(self.GOPI, ALL_ZERO_STATE, self.to_game, received_at)
+                self.send(self.CIPO, b'{STAT}', self.to_controller, received_at)
+                self.last_state = ALL_ZERO_STATE
+                print("Handled STAT command")
+        elif b'{HALT}' in data:
+            with self.lock:
+                self.active = False
+                self.send(self.CIPO, b'{HALT}', self.to_controller, received_at)
+                print("Handled HALT command")
+
+    def handle_controller_data(self, data, received_at):
         """Handle communication from touch controller to game"""
-        while True:
-            try:
-                if self.CIPO.in_waiting > 0:
-                    data = self.CIPO.read(self.CIPO.in_waiting)
-                    
-                    if data.startswith(b'\x28') and data.endswith(b'\x29'):
-                        if len(data) == 9:  
-                            release_time = time.time() + (self.delay_ms / 1000)
+        if data.startswith(b'\x28') and data.endswith(b'\x29'):
+            if len(data) == 9:  
+                release_time = received_at + (self.delay_ms / 1000)
+                with self.lock:
+                    self.delayed_buffer.append((data, release_time))
+            elif len(data) > 9:  
+                packets = data.split(b'\x29')
+                for packet in packets:
+                    if len(packet) >= 8:
+                        full_packet = packet + b'\x29'
+                        if len(full_packet) == 9:
+                            release_time = received_at + (self.delay_ms / 1000)
                             with self.lock:
-                                self.delayed_buffer.append((data, release_time))
-                        elif len(data) > 9:  
-                            packets = data.split(b'\x29')
-                            for packet in packets:
-                                if len(packet) >= 8:
-                                    full_packet = packet + b'\x29'
-                                    if len(full_packet) == 9:
-                                        release_time = time.time() + (self.delay_ms / 1000)
-                                        with self.lock:
-                                            self.delayed_buffer.append((full_packet, release_time))
-                    
-                    elif data in (b'{STAT}', b'{HALT}'):
-                        with self.lock:
-                            self.GOPI.write(data)
-                
-                current_time = time.time()
-                while True:
-                    with self.lock:
-                        if not self.delayed_buffer or current_time < self.delayed_buffer[0][1]:
-                            break
-                        
-                        delayed_data, _ = self.delayed_buffer.popleft()
-                        if self.active:
-                            try:
-                                transformed = self.transform_touch_data(delayed_data)
-                                self.GOPI.write(transformed)
-                                self.last_state = transformed
-                                timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S.%f")[:-3]
-                                print(f"[{timestamp}] Delayed({self.delay_ms}ms) Data Sent: {transformed}")
-                            except Exception as e:
-                                print(f"Error transforming data: {e}")
-                
-                if not self.delayed_buffer and self.active:
-                    with self.lock:
-                        self.GOPI.write(self.last_state)
-                
-                time.sleep(0.001)
+                                self.delayed_buffer.append((full_packet, release_time))
+        
+        elif data in (b'{STAT}', b'{HALT}'):
+            self.send(self.GOPI, data, self.to_game, received_at)
+
+    def flush_delayed(self):
+        """发送延迟缓冲区中到期的触摸数据，没有待发送的数据时重发上一状态"""
+        current_time = time.perf_counter()
+        while True:
+            with self.lock:
+                if not self.delayed_buffer or current_time < self.delayed_buffer[0][1]:
+                    break
                 
-            except Exception as e:
-                print(f"Error in CIPO handler: {e}")
-                time.sleep(1)
+                delayed_data, release_time = self.delayed_buffer.popleft()
+                if self.active:
+                    try:
+                        start = time.perf_counter()
+                        transformed = self.transform_touch_data(delayed_data)
+                        work = time.perf_counter() - start
+                        self.send(self.GOPI, transformed, self.to_game, release_time, work)
+                        self.last_state = transformed
+                        timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S.%f")[:-3]
+                        print(f"[{timestamp}] Delayed({self.delay_ms}ms) Data Sent: {transformed}")
+                    except Exception as e:
+                        print(f"Error transforming data: {e}")
+        
+        if not self.delayed_buffer and self.active:
+            self.send(self.GOPI, self.last_state, self.to_game)
+
+    def passthrough_game_data(self, data, received_at):
+        """透传模式：游戏发来的指令原样转发给控制器"""
+        self.send(self.CIPO, data, self.to_controller, received_at)
+        self.log_command(data)
+
+    def passthrough_controller_data(self, data, received_at):
+        """透传模式：控制器发来的数据原样转发给游戏"""
+        self.send(self.GOPI, data, self.to_game, received_at)
+        if LOG_CONTROLLER_DATA:
+            self.log_command(data, "Controller")
+
+    def handle_GOPI_to_CIPO(self):
+        """Handle communication from game to touch controller"""
+        if self.passthrough:
+            self.io_loop("GOPI", self.GOPI, self.passthrough_game_data)
+        else:
+            self.io_loop("GOPI", self.GOPI, self.handle_game_data)
+
+    def handle_CIPO_to_GOPI(self):
+        """Handle communication from touch controller to game"""
+        if self.passthrough:
+            self.io_loop("CIPO", self.CIPO, self.passthrough_controller_data)
+        else:
+            self.io_loop("CIPO", self.CIPO, self.handle_controller_data, self.flush_delayed)
 
     def run(self):
         try:
@@ -213,17 +304,24 @@ class TouchBridge:
             
             print(f"Touch bridge started at {datetime.now()}")
             print(f"GOPI: {self.GOPI.name}, CIPO: {self.CIPO.name}")
-            print(f"Input delay set to {self.delay_ms}ms")
+            if self.passthrough:
+                print("Passthrough mode: forwarding mai2 data and commands unchanged")
+            else:
+                print(f"Input delay set to {self.delay_ms}ms")
             print("All received GOPI commands will be logged to GOPI_commands.log")
-            print("Monitoring for commands:")
-            print("- {STAT}: Activate bridge and send zero state")
-            print("- {HALT}: Deactivate bridge")
-            print("- {XXkY}: Register mapping (XX -> Y), respond with (XX  )")
-            print("- {XXth}: Query mapping for XX, respond with (XX Y) if found")
+            if not self.passthrough:
+                print("Monitoring for commands:")
+                print("- {STAT}: Activate bridge and send zero state")
+                print("- {HALT}: Deactivate bridge")
+                print("- {XXkY}: Register mapping (XX -> Y), respond with (XX  )")
+                print("- {XXth}: Query mapping for XX, respond with (XX Y) if found")
             
             with open(self.command_log_file, "a", encoding="utf-8") as f:
                 f.write(f"\n\n===== Session started at {datetime.now()} =====\n")
-                f.write(f"Input delay: {self.delay_ms}ms\n")
+                if self.passthrough:
+                    f.write("Passthrough mode\n")
+                else:
+                    f.write(f"Input delay: {self.delay_ms}ms\n")
             
             # 启动处理线程
             GOPI_thread = threading.Thread(target=self.handle_GOPI_to_CIPO, daemon=True)
@@ -233,7 +331,12 @@ class TouchBridge:
             CIPO_thread.start()
             
             while True:
-                time.sleep(1)
+                if STATS_INTERVAL > 0:
+                    time.sleep(STATS_INTERVAL)
+                    print(self.to_game.report(STATS_INTERVAL))
+                    print(self.to_controller.report(STATS_INTERVAL))
+                else:
+                    time.sleep(1)
                 
         except KeyboardInterrupt:
             print("\nStopping touch bridge...")
@@ -252,5 +355,5 @@ class TouchBridge:
                 self.CIPO.close()
 
 if __name__ == "__main__":
-    bridge = TouchBridge()
+    bridge = TouchBridge(passthrough=PASSTHROUGH)
     bridge.run()
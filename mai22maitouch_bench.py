@@ -0,0 +1,186 @@
+import os
+import sys
+import time
+import random
+import argparse
+import importlib
+from concurrent.futures import ProcessPoolExecutor
+
+# mai2格式中的区域顺序：第i个区域位于字节 1 + i // 5 的第 i % 5 位
+MAI2_ZONES = ([f'A{i}' for i in range(1, 9)] + [f'B{i}' for i in range(1, 9)] + ['C1', 'C2'] +
+              [f'D{i}' for i in range(1, 9)] + [f'E{i}' for i in range(1, 9)])
+# A/B/C区占低18位，穷举；D/E区占高16位，抽样
+ABC_BITS = 18
+DE_BITS = 16
+
+# 每个区域字节中未使用的高3位
+UNUSED_BITS = 0xE0
+
+_translate = None
+
+def load_translator(spec):
+    """
+    按 "模块:属性路径" 加载转换函数，路径中遇到类时先创建实例，
+    如 mai22maitouch:TouchBridge.transform_touch_data、mai22maitest:transform_touch_data
+    """
+    module_name, _, path = spec.partition(':')
+    target = importlib.import_module(module_name)
+    for name in path.split('.'):
+        target = getattr(target, name)
+        if isinstance(target, type):
+            target = target()
+    return target
+
+def mai2_frame(mask, junk=0):
+    """将34位区域掩码编码为9字节的mai2帧，junk为各字节未使用位的填充"""
+    frame = bytearray(9)
+    frame[0] = 0x28
+    frame[8] = 0x29
+    for j in range(7):
+        frame[1 + j] = ((mask >> (5 * j)) & 0x1F) | (junk & UNUSED_BITS)
+    return bytes(frame)
+
+def reference_transform(mask):
+    """
+    参考模型：按mai格式的位定义直接由区域掩码计算14字节的mai帧
+
+    P1的第k个字节(k=1~4)依次为 A(2k-1) B(2k-1) A(2k) B(2k)，C1或C2对应字节4的第4位；
+    D/E区和P2在mai格式中没有对应，保持为'@'
+    """
+    frame = bytearray(b'(' + b'@' * 12 + b')')
+    for k in range(8):
+        a = (mask >> k) & 1
+        b = (mask >> (8 + k)) & 1
+        frame[1 + k // 2] |= (a | b << 1) << (2 * (k % 2))
+    if (mask >> 16) & 3:
+        frame[4] |= 0x10
+    return bytes(frame)
+
+def _init_worker(spec):
+    global _translate
+    _translate = load_translator(spec)
+
+def check_chunk(start, stop, samples, seed, junk, max_mismatches):
+    """
+    检查A/B/C掩码 start~stop 的所有组合，每个组合搭配D/E全松开和samples个随机的D/E状态；
+    start为-1时改为穷举D/E、A/B/C全松开
+
+    返回: (帧数, 转换耗时（秒）, 不一致数, 不一致示例列表)
+    """
+    rng = random.Random(seed * 1000003 + start)
+    if start < 0:
+        masks = [de << ABC_BITS for de in range(1 << DE_BITS)]
+    else:
+        masks = []
+        for abc in range(start, stop):
+            masks.append(abc)
+            for _ in range(samples):
+                masks.append(abc | rng.getrandbits(DE_BITS) << ABC_BITS)
+    junks = [rng.getrandbits(8) if junk else 0 for _ in masks]
+    frames = [mai2_frame(mask, j) for mask, j in zip(masks, junks)]
+
+    # 只计时转换本身，帧的生成与比较不计入
+    translate = _translate
+    outputs = []
+    begin = time.perf_counter()
+    for frame in frames:
+        try:
+            outputs.append(translate(frame))
+        except Exception as e:
+            outputs.append(e)
+    elapsed = time.perf_counter() - begin
+
+    mismatches = 0
+    examples = []
+    for mask, frame, output in zip(masks, frames, outputs):
+        expected = reference_transform(mask)
+        if output != expected:
+            mismatches += 1
+            if len(examples) < max_mismatches:
+                examples.append((frame, expected, output))
+    return len(frames), elapsed, mismatches, examples
+
+def check_invalid(translate):
+    """格式错误的帧应当抛出ValueError，返回不符合的帧列表"""
+    frames = [b'', b'(\x00\x00\x00\x00\x00\x00\x00', b'(\x00\x00\x00\x00\x00\x00\x00\x00)',
+              b')\x00\x00\x00\x00\x00\x00\x00(', b'(\x00\x00\x00\x00\x00\x00\x00\x00']
+    failures = []
+    for frame in frames:
+        try:
+            translate(frame)
+        except ValueError:
+            continue
+        except Exception:
+            pass
+        failures.append(frame)
+    return failures
+
+def hex_bytes(data):
+    return ' '.join(f'{b:02X}' for b in data)
+
+def zone_names(frame):
+    return ' '.join(zone for i, zone in enumerate(MAI2_ZONES) if frame[1 + i // 5] >> (i % 5) & 1) or '无'
+
+def main():
+    parser = argparse.ArgumentParser(description='mai2到mai触摸数据转换的等价性与吞吐量测试：'
+                                                 'A/B/C区穷举、D/E区抽样，与参考模型逐帧比较')
+    parser.add_argument('-t', '--translator', default='mai22maitouch:TouchBridge.transform_touch_data',
+                        help='被测转换函数，模块:属性路径（默认：mai22maitouch:TouchBridge.transform_touch_data）')
+    parser.add_argument('-s', '--samples', type=int, default=3,
+                        help='每个A/B/C组合额外搭配的随机D/E状态数（默认：3）')
+    parser.add_argument('--junk', action='store_true',
+                        help='在各字节未使用的高3位填入随机值，检查转换是否忽略它们')
+    parser.add_argument('--seed', type=int, default=0, help='随机种子（默认：0）')
+    parser.add_argument('-j', '--jobs', type=int, default=None,
+                        help='并行进程数（默认：CPU核心数）')
+    parser.add_argument('-m', '--max-mismatches', type=int, default=10,
+                        help='最多输出的不一致示例数（默认：10）')
+    args = parser.parse_args()
+
+    try:
+        translate = load_translator(args.translator)
+    except (ImportError, AttributeError, ValueError) as e:
+        print(f"无法加载转换函数 {args.translator}: {e}")
+        return 1
+    invalid = check_invalid(translate)
+
+    jobs = args.jobs or os.cpu_count() or 1
+    total = 1 << ABC_BITS
+    chunk_size = max(1, -(-total // (jobs * 8)))
+    chunks = [(-1, 0)] + [(start, min(total, start + chunk_size)) for start in range(0, total, chunk_size)]
+
+    frames = mismatches = 0
+    translate_time = 0.0
+    examples = []
+    begin = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=jobs, initializer=_init_worker, initargs=(args.translator,)) as pool:
+        futures = [pool.submit(check_chunk, start, stop, args.samples, args.seed, args.junk, args.max_mismatches)
+                   for start, stop in chunks]
+        for future in futures:
+            count, elapsed, bad, bad_examples = future.result()
+            frames += count
+            translate_time += elapsed
+            mismatches += bad
+            examples.extend(bad_examples[:args.max_mismatches - len(examples)])
+    wall = time.perf_counter() - begin
+
+    print(f"被测: {args.translator}")
+    print(f"检查 {frames} 帧 (A/B/C穷举 {total} 种 x {1 + args.samples}, D/E穷举 {1 << DE_BITS} 种), "
+          f"{jobs} 个进程, 耗时 {wall:.1f}s")
+    print(f"转换吞吐量: 单进程 {frames / translate_time if translate_time > 0 else 0:.0f} 帧/秒, "
+          f"合计 {frames / wall if wall > 0 else 0:.0f} 帧/秒(含生成与比较)")
+    for frame, expected, output in examples:
+        got = hex_bytes(output) if isinstance(output, bytes) else repr(output)
+        print(f"  不一致: 输入 {hex_bytes(frame)} ({zone_names(frame)})")
+        print(f"          期望 {hex_bytes(expected)}")
+        print(f"          实际 {got}")
+    for frame in invalid:
+        print(f"  格式错误的帧未抛出ValueError: {hex_bytes(frame) or '(空)'}")
+    if mismatches or invalid:
+        print(f"失败: {mismatches} 帧不一致, {len(invalid)} 个格式错误的帧未被拒绝")
+        return 1
+    print("全部一致")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())